@@ -1,97 +1,268 @@
 import os
 import re
+import uuid
+import secrets
+import hashlib
 import datetime
+from urllib.parse import quote
 import jwt
-from flask import Flask, request, jsonify, redirect
-from flask_sqlalchemy import SQLAlchemy
-import bcrypt
-from google_auth_oauthlib.flow import Flow as GoogleFlow
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import requests # For fetching userinfo if needed, though id_token is preferred
+from flask import Flask, Response, request, jsonify, g
+from sqlalchemy.exc import IntegrityError
+from werkzeug.http import dump_cookie
+from werkzeug.middleware.proxy_fix import ProxyFix
+from backend.db_pool import engine_options_for
+from backend.models import db, User, RefreshToken, RevokedToken, normalize_email
+from backend.hashing import BcryptHasher, HashingPoolSaturated, get_hashing_executor, hashing_cli
+from backend.json_provider import json_provider_class
+from backend.metrics import init_metrics, timed
+from backend.migrations import migrations_cli
+from backend.query_stats import init_query_stats
+from backend.rate_limit import get_login_limiter
+from backend import schemas
+from backend.auth_events import LOGIN, LOGIN_FAILED, REGISTER, record_auth_event
+from backend.user_import import users_cli
+from backend.user_listing import register_admin_routes
+from backend.user_cache import init_user_cache, user_by_email, user_by_id
+from backend.signing_keys import get_key_set, keys_cli
+from backend.tokens import (RevocationList, introspect_tokens, require_auth, require_introspection_client,
+                            sign_access_token)
+from backend.providers import register_provider_routes
 
 app = Flask(__name__)
 app.config.from_object('backend.config.Config')
-
-db = SQLAlchemy(app)
-
-# Ensure os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1' is set for development if not using HTTPS for callback
-# This is typically set when running the Flask app for local development.
-# For production, HTTPS is required.
-if app.debug:
-    os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
-
-# --- Database Model ---
-class User(db.Model):
-    __tablename__ = 'users'
-
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    username = db.Column(db.String(255), unique=True, nullable=True)
-    email = db.Column(db.String(255), unique=True, nullable=False)
-    password_hash = db.Column(db.String(255), nullable=True)
-    google_id = db.Column(db.String(255), unique=True, nullable=True)
-    github_id = db.Column(db.String(255), unique=True, nullable=True)
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
-    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
-
-    def set_password(self, password):
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-    def check_password(self, password):
-        if self.password_hash is None:
-            return False
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
-
-    def __repr__(self):
-        return f'<User {self.email}>'
-
-# --- Utility Functions ---
-def is_valid_email(email):
-    """Basic email validation."""
-    if not email:
-        return False
-    # Basic regex for email validation
-    if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-        return False
-    return True
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS',
+                      engine_options_for(app.config, app.config['SQLALCHEMY_DATABASE_URI']))
+app.json = json_provider_class(app.config['JSON_PROVIDER'])(app)
+if app.config['TRUSTED_PROXY_HOPS']:
+    hops = app.config['TRUSTED_PROXY_HOPS']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+db.init_app(app)
+init_metrics(app, db)
+init_query_stats(app, db)
+init_user_cache(app, db)
+
+app.cli.add_command(hashing_cli)
+app.cli.add_command(migrations_cli)
+app.cli.add_command(users_cli)
+app.cli.add_command(keys_cli)
+
+# --- Tokens ---
+def access_token_ttl():
+    return datetime.timedelta(minutes=app.config['ACCESS_TOKEN_TTL_MINUTES'])
+
+def create_access_token(user, session_id):
+    """Issue a short-lived access JWT for ``user`` within refresh token family ``session_id``."""
+    now = datetime.datetime.utcnow()
+    token_payload = {
+        'user_id': user.id,
+        'email': user.email,
+        'sid': session_id,
+        'jti': uuid.uuid4().hex,
+        'iat': now,
+        'exp': now + access_token_ttl()
+    }
+    with timed('jwt_encode', 'access'):
+        return sign_access_token(token_payload)
+
+def hash_refresh_token(refresh_token):
+    return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+
+def new_refresh_token(user_id, family_id):
+    """Return ``(refresh_token, RefreshToken row)``; the caller adds the row and commits."""
+    refresh_token = secrets.token_urlsafe(32)
+    row = RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(refresh_token),
+        family_id=family_id,
+        expires_at=datetime.datetime.utcnow() + datetime.timedelta(days=app.config['REFRESH_TOKEN_TTL_DAYS'])
+    )
+    return refresh_token, row
+
+def issue_tokens(user):
+    """Start a new session for ``user``; returns ``(access_token, refresh_token)``."""
+    family_id = uuid.uuid4().hex
+    refresh_token, row = new_refresh_token(user.id, family_id)
+    db.session.add(row)
+    # Signed before the commit expires ``user``, which would cost a SELECT
+    access_token = create_access_token(user, family_id)
+    db.session.commit()
+    return access_token, refresh_token
+
+def revoke_session(family_id):
+    """Revoke every refresh token in a family and deny its outstanding access tokens."""
+    now = datetime.datetime.utcnow()
+    # Access tokens of the family outlive their last refresh by at most one TTL
+    expires_at = now + access_token_ttl()
+    revoked = RefreshToken.query.filter_by(family_id=family_id, revoked_at=None).update({'revoked_at': now})
+    if not revoked:
+        # Already revoked, and no access token has been issued since: replaying a
+        # rotated-out token must not add a row each time. The conditional update
+        # also lets only one of several concurrent revocations through.
+        db.session.rollback()
+        return
+    db.session.add(RevokedToken(token_id=family_id, expires_at=expires_at))
+    db.session.commit()
+    revocation_list.add(family_id, expires_at.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+def load_revoked_tokens(since):
+    query = RevokedToken.query.filter(RevokedToken.expires_at > datetime.datetime.utcnow())
+    if since is not None:
+        query = query.filter(RevokedToken.revoked_at >= since)
+    try:
+        rows = query.all()
+    except Exception:
+        db.session.rollback() # Leave the request's session usable
+        raise
+    return [(row.revoked_at, row.token_id, row.expires_at.replace(tzinfo=datetime.timezone.utc).timestamp())
+            for row in rows]
+
+revocation_list = RevocationList(loader=load_revoked_tokens, sync_interval=app.config['REVOCATION_SYNC_SECONDS'],
+                                 overlap=app.config['REVOCATION_SYNC_OVERLAP_SECONDS'], logger=app.logger)
+app.extensions['revocation_list'] = revocation_list
+
+# OAuth sign-ins hand the browser its refresh token in this cookie, not in the
+# redirect URL where history, logs and Referer headers could keep it. Only the
+# /api/token endpoints ever receive it, and never from another site.
+REFRESH_COOKIE = 'refresh_token'
+REFRESH_COOKIE_PATH = '/api/token'
+
+def refresh_cookie_header(refresh_token):
+    """The Set-Cookie value that stores ``refresh_token``, or clears the cookie if it is None."""
+    max_age = app.config['REFRESH_TOKEN_TTL_DAYS'] * 24 * 60 * 60 if refresh_token else 0
+    return dump_cookie(REFRESH_COOKIE, refresh_token or '', max_age=max_age, path=REFRESH_COOKIE_PATH,
+                       secure=True, httponly=True, samesite='Strict')
+
+def set_refresh_cookie(response, refresh_token):
+    response.headers.add('Set-Cookie', refresh_cookie_header(refresh_token))
+    return response
+
+def presented_refresh_token():
+    """Return ``(refresh_token, from_cookie, None)``, or ``(None, None, 400 response)``.
+
+    Clients that signed in with a password post the token in the body; browsers
+    that signed in through OAuth post no body and send the refresh cookie.
+    """
+    if not request.get_data() and request.cookies.get(REFRESH_COOKIE):
+        return request.cookies[REFRESH_COOKIE], True, None
+    data, invalid = validated_body(schemas.REFRESH_TOKEN)
+    if invalid:
+        return None, None, invalid
+    return data['refresh_token'], False, None
+
+def frontend_token_redirect_url(app_access_token, return_to=None):
+    # Redirect to frontend with the access token in the URL hash/fragment; the
+    # refresh token goes in the refresh cookie (see set_refresh_cookie).
+    # The frontend (handle_token.html) will pick it up, then go to ``return_to``
+    # (a path checked by oauth_state.is_safe_return_path) or the dashboard.
+    frontend_base_url = os.environ.get('FRONTEND_BASE_URL', 'http://localhost:5000')
+    url = f"{frontend_base_url}/frontend/handle_token.html#token={app_access_token}"
+    return f"{url}&next={quote(return_to, safe='/')}" if return_to else url
+
+def frontend_error_redirect_url(error_message):
+    frontend_base_url = os.environ.get('FRONTEND_BASE_URL', 'http://localhost:5000')
+    return f"{frontend_base_url}/frontend/signin.html?error={jwt.utils.base64url_encode(error_message.encode()).decode()}"
+
+# Unique constraint name -> users column. Postgres names unnamed UNIQUE
+# constraints <table>_<column>_key, which is what schema.sql relies on.
+USER_UNIQUE_CONSTRAINTS = {
+    'users_email_key': 'email',
+    'ix_users_email_lower': 'email',
+    'users_username_key': 'username',
+    'users_google_id_key': 'google_id',
+    'users_github_id_key': 'github_id',
+}
+USER_CONFLICT_MESSAGES = {
+    'email': 'Email already registered',
+    'username': 'Username already taken',
+}
+_SQLITE_UNIQUE_RE = re.compile(r"UNIQUE constraint failed: (?:users\.(\w+)|index '(\w+)')")
+
+def unique_violation_column(error):
+    """Return the users column whose unique constraint ``error`` violated, if known."""
+    diag = getattr(error.orig, 'diag', None) # psycopg2 / psycopg
+    constraint_name = getattr(diag, 'constraint_name', None)
+    if constraint_name:
+        return USER_UNIQUE_CONSTRAINTS.get(constraint_name)
+    match = _SQLITE_UNIQUE_RE.search(str(error.orig))
+    if not match:
+        return None
+    return match.group(1) or USER_UNIQUE_CONSTRAINTS.get(match.group(2))
+
+def hashing_busy_response():
+    response = jsonify({'message': 'Server is busy. Please try again shortly.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+def login_throttled_response(retry_after):
+    response = jsonify({'message': 'Too many login attempts. Please try again later.'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+def check_login_rate(email):
+    """Count a login attempt; returns a 429 response if it is throttled, else None."""
+    if not app.config['LOGIN_RATE_LIMIT']:
+        return None
+    try:
+        decision = get_login_limiter().hit(ip=request.remote_addr, email=normalize_email(email))
+    except Exception as e:
+        # Fail open: an unavailable counter store must not lock everyone out
+        app.logger.error(f"Login rate limiter unavailable: {e}")
+        return None
+    return None if decision.allowed else login_throttled_response(decision.retry_after)
+
+def validated_body(schema):
+    """Return ``(values, None)`` for a valid JSON body, else ``(None, 400 response)``."""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data, dict):
+        return None, (jsonify({'message': 'Request body must be JSON'}), 400)
+    values, errors = schema.validate(data)
+    if errors:
+        # ``message`` is the first error, as before; ``errors`` has one entry per failing field
+        return None, (jsonify({'message': errors[0]['message'], 'errors': errors}), 400)
+    return values, None
+
+def password_schema(schema, bcrypt_schema):
+    """The schema for the configured hasher; bcrypt's also caps the password's bytes."""
+    return bcrypt_schema if app.config['PASSWORD_HASHER'] == BcryptHasher.name else schema
 
 # --- API Endpoints ---
 @app.route('/api/register', methods=['POST'])
 def register():
-    data = request.get_json()
-
-    if not data:
-        return jsonify({'message': 'Request body must be JSON'}), 400
+    data, invalid = validated_body(password_schema(schemas.REGISTER, schemas.REGISTER_BCRYPT))
+    if invalid:
+        return invalid
 
-    email = data.get('email')
-    password = data.get('password')
-    username = data.get('username') # Optional
-
-    # Input Validation
-    if not email:
-        return jsonify({'message': 'Email is required'}), 400
-    if not is_valid_email(email):
-        return jsonify({'message': 'Invalid email format'}), 400
-    if not password:
-        return jsonify({'message': 'Password is required'}), 400
-    if len(password) < 8:
-        return jsonify({'message': 'Password must be at least 8 characters long'}), 400
+    email = data['email']
+    password = data['password']
+    username = data['username'] # Optional; None when absent
 
     try:
-        # Check if email or username already exists
-        if User.query.filter_by(email=email).first():
-            return jsonify({'message': 'Email already registered'}), 409
-        if username and User.query.filter_by(username=username).first():
-            return jsonify({'message': 'Username already taken'}), 409
-
         new_user = User(email=email, username=username)
-        new_user.set_password(password)
+        new_user.password_hash = get_hashing_executor().hash_password(password)
 
+        # A single INSERT; the users unique constraints reject duplicate emails
+        # and usernames atomically, including between concurrent signups.
         db.session.add(new_user)
+        db.session.flush()
+        user_id = new_user.id # Read before commit expires it, which would cost a SELECT
         db.session.commit()
+        record_auth_event(REGISTER, user_id=user_id, email=email)
 
-        return jsonify({'message': 'User registered successfully', 'user_id': new_user.id}), 201
+        return jsonify({'message': 'User registered successfully', 'user_id': user_id}), 201
 
+    except IntegrityError as ie:
+        db.session.rollback()
+        column = unique_violation_column(ie)
+        if column in USER_CONFLICT_MESSAGES:
+            return jsonify({'message': USER_CONFLICT_MESSAGES[column]}), 409
+        app.logger.error(f"Registration failed: {ie}")
+        return jsonify({'message': 'An error occurred during registration. Please try again.'}), 500
+    except HashingPoolSaturated:
+        db.session.rollback()
+        return hashing_busy_response()
     except Exception as e:
         db.session.rollback()
         # Log the error for debugging: print(e) or use a proper logger
@@ -100,308 +271,176 @@ def register():
 
 @app.route('/api/login', methods=['POST'])
 def login():
-    data = request.get_json()
+    data, invalid = validated_body(schemas.LOGIN)
+    if invalid:
+        return invalid
 
-    if not data:
-        return jsonify({'message': 'Request body must be JSON'}), 400
+    email = data['email']
+    password = data['password']
 
-    email = data.get('email')
-    password = data.get('password')
-
-    # Input Validation
-    if not email:
-        return jsonify({'message': 'Email is required'}), 400
-    if not is_valid_email(email): # Assuming you have this utility function from register
-        return jsonify({'message': 'Invalid email format'}), 400
-    if not password:
-        return jsonify({'message': 'Password is required'}), 400
+    # Throttled attempts stop here, before the user lookup and the password hash
+    throttled = check_login_rate(email)
+    if throttled:
+        return throttled
 
     try:
-        user = User.query.filter_by(email=email).first()
-
-        if user and user.check_password(password):
-            # Password is correct, generate JWT
-            token_payload = {
-                'user_id': user.id,
-                'email': user.email,
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24) # Token expires in 24 hours
-            }
-            access_token = jwt.encode(token_payload, app.config['SECRET_KEY'], algorithm='HS256')
-
-            return jsonify({'access_token': access_token}), 200
+        # id, email and password hash only, usually from the user cache
+        user = user_by_email(email)
+
+        executor = get_hashing_executor()
+        if user and executor.check_password(password, user.password_hash):
+            # Transparently upgrade hashes made with an outdated algorithm or cost
+            if executor.needs_rehash(user.password_hash):
+                try:
+                    new_hash = executor.hash_password(password)
+                    # Through the ORM, so the commit invalidates the cached row
+                    db.session.get(User, user.id).password_hash = new_hash
+                    db.session.commit()
+                except HashingPoolSaturated:
+                    pass # Not worth failing the login over; retry on the next one
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f"Password rehash failed for user {user.id}: {e}")
+
+            # Password is correct, start a session
+            access_token, refresh_token = issue_tokens(user)
+            record_auth_event(LOGIN, user_id=user.id, email=user.email)
+
+            return jsonify({
+                'access_token': access_token,
+                'refresh_token': refresh_token,
+                'expires_in': int(access_token_ttl().total_seconds())
+            }), 200
         else:
             # Invalid credentials
+            record_auth_event(LOGIN_FAILED, user_id=user.id if user else None, email=email)
             return jsonify({'message': 'Invalid email or password'}), 401
 
+    except HashingPoolSaturated:
+        return hashing_busy_response()
     except Exception as e:
         # Log the error for debugging: print(e) or use a proper logger
         return jsonify({'message': 'An error occurred during login. Please try again.'}), 500
 
 
-# --- Google OAuth Endpoints ---
-def get_google_flow():
-    client_config = {
-        "web": {
-            "client_id": app.config['GOOGLE_CLIENT_ID'],
-            "client_secret": app.config['GOOGLE_CLIENT_SECRET'],
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "redirect_uris": [app.config['GOOGLE_REDIRECT_URI']],
-            "javascript_origins": ["http://localhost:5000", "http://localhost:5001"] # Adjust as needed
-        }
-    }
-    scopes = [
-        "openid",
-        "https://www.googleapis.com/auth/userinfo.email",
-        "https://www.googleapis.com/auth/userinfo.profile"
-    ]
-    flow = GoogleFlow.from_client_config(
-        client_config,
-        scopes=scopes,
-        redirect_uri=app.config['GOOGLE_REDIRECT_URI']
-    )
-    return flow
-
-@app.route('/api/auth/google', methods=['GET'])
-def auth_google():
-    flow = get_google_flow()
-    authorization_url, state = flow.authorization_url(
-        access_type='offline',
-        include_granted_scopes='true'
-    )
-    # Store the state in session or a temporary store if you need to verify it later
-    # For simplicity, we're not storing it here, but it's recommended for security.
-    # session['oauth_state'] = state 
-    return redirect(authorization_url)
+@app.route('/api/me', methods=['GET'])
+@require_auth
+def me():
+    # Answered from the verified token claims; no database round trip
+    claims = g.token_claims
+    return jsonify({'user_id': claims['user_id'], 'email': claims['email']}), 200
+
 
-@app.route('/api/auth/google/callback', methods=['GET'])
-def auth_google_callback():
-    flow = get_google_flow()
-    code = request.args.get('code')
+@app.route('/.well-known/jwks.json', methods=['GET'])
+def jwks():
+    # Public keys for verifying access tokens; empty while tokens are HS256
+    key_set = get_key_set()
+    response = Response(key_set.jwks_body, mimetype='application/json')
+    response.set_etag(key_set.jwks_etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['JWKS_MAX_AGE']
+    return response.make_conditional(request)
 
-    if not code:
-        return jsonify({'message': 'Authorization code not found.'}), 400
+
+@app.route('/api/token/refresh', methods=['POST'])
+def refresh_access_token():
+    refresh_token, from_cookie, invalid = presented_refresh_token()
+    if invalid:
+        return invalid
 
     try:
-        # Exchange code for token
-        flow.fetch_token(code=code)
-        credentials = flow.credentials
-
-        # Verify ID token and get user info
-        id_info = id_token.verify_oauth2_token(
-            credentials.id_token,
-            google_requests.Request(),
-            app.config['GOOGLE_CLIENT_ID']
-        )
-
-        google_id = id_info.get('sub')
-        email = id_info.get('email')
-        # name = id_info.get('name') # Full name
-        # first_name = id_info.get('given_name')
-        # last_name = id_info.get('family_name')
-        
-        if not email:
-            return jsonify({'message': 'Email not provided by Google.'}), 400
-
-        user = User.query.filter_by(google_id=google_id).first()
-
-        if not user:
-            # No user with this google_id, check by email
-            user = User.query.filter_by(email=email).first()
-            if not user:
-                # New user: create one
-                # Decide on username: use email prefix, or name if available, or prompt user later
-                username_candidate = email.split('@')[0] # Simple username from email
-                # check if username_candidate is already taken
-                existing_username = User.query.filter_by(username=username_candidate).first()
-                if existing_username:
-                    username_candidate = f"{username_candidate}_{google_id[:6]}" # make it more unique
-
-                user = User(
-                    email=email,
-                    google_id=google_id,
-                    username=username_candidate # Or use 'name' if you prefer and handle uniqueness
-                    # password_hash remains None for social logins initially
-                )
-                db.session.add(user)
-            else:
-                # Existing user by email, link Google ID
-                user.google_id = google_id
-            db.session.commit()
-        
-        # At this point, 'user' is the authenticated user (either found or created)
-        # Generate your application's JWT for this user
-        token_payload = {
-            'user_id': user.id,
-            'email': user.email,
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-        }
-        app_access_token = jwt.encode(token_payload, app.config['SECRET_KEY'], algorithm='HS256')
-
-        # For SPAs, returning JSON is common.
-        # You might redirect to a frontend URL with the token as a query parameter,
-        # but that can expose the token in browser history.
-        # A common pattern is for the frontend to open a popup for Google login,
-        # and the callback sets the token in localStorage/sessionStorage of the parent window
-        # or communicates back via window.postMessage.
-        # Redirect to frontend with the token in the URL hash/fragment
-        # The frontend (handle_token.html) will pick this up.
-        # A more robust way to determine frontend URL might be needed if not always localhost:5000
-        # For example, use an environment variable for FRONTEND_BASE_URL
-        # if 'localhost:5001' in request.host_url or '0.0.0.0:5001' in request.host_url : # common dev server
-        #      frontend_redirect_url = f"http://localhost:5000/frontend/handle_token.html#token={app_access_token}"
-        frontend_base_url = os.environ.get('FRONTEND_BASE_URL', 'http://localhost:5000')
-        frontend_redirect_url = f"{frontend_base_url}/frontend/handle_token.html#token={app_access_token}"
-
-        return redirect(frontend_redirect_url)
-        # Old: return jsonify({'access_token': app_access_token, 'user_id': user.id, 'email': user.email}), 200
-
-    except ValueError as ve: # Catches specific id_token.verify_oauth2_token errors
-        app.logger.error(f"Google ID token verification failed: {ve}")
-        return jsonify({'message': f'Google authentication failed: {str(ve)}'}), 401
+        stored = RefreshToken.query.filter_by(token_hash=hash_refresh_token(refresh_token)).first()
+        if not stored:
+            return jsonify({'message': 'Invalid refresh token'}), 401
+        if stored.expires_at <= datetime.datetime.utcnow():
+            return jsonify({'message': 'Refresh token has expired'}), 401
+
+        # Rotate: the presented token is used up. The conditional update makes
+        # concurrent refreshes with the same token race for a single winner.
+        rotated = RefreshToken.query.filter_by(id=stored.id, revoked_at=None).update(
+            {'revoked_at': datetime.datetime.utcnow()})
+        if not rotated:
+            # A rotated-out token was presented again, so it has leaked: end the whole session
+            db.session.rollback()
+            revoke_session(stored.family_id)
+            return jsonify({'message': 'Refresh token has been revoked'}), 401
+
+        user = user_by_id(stored.user_id)
+        if user is None:
+            # The account was deleted (where its tokens were not deleted with it)
+            db.session.rollback()
+            revoke_session(stored.family_id)
+            return jsonify({'message': 'Invalid refresh token'}), 401
+        new_token, row = new_refresh_token(user.id, stored.family_id)
+        db.session.add(row)
+        # Signed before the commit expires ``stored``, which would cost a SELECT
+        access_token = create_access_token(user, stored.family_id)
+        db.session.commit()
+
+        if from_cookie:
+            # The successor stays out of reach of scripts too
+            return set_refresh_cookie(jsonify({
+                'access_token': access_token,
+                'expires_in': int(access_token_ttl().total_seconds())
+            }), new_token), 200
+        return jsonify({
+            'access_token': access_token,
+            'refresh_token': new_token,
+            'expires_in': int(access_token_ttl().total_seconds())
+        }), 200
+
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error during Google OAuth callback: {e}")
-        # Be careful not to expose too much error detail to the client
-        error_message = 'An error occurred during Google authentication.'
-        if app.debug:
-            error_message = f'An error occurred during Google authentication: {str(e)}'
-        
-        frontend_base_url = os.environ.get('FRONTEND_BASE_URL', 'http://localhost:5000')
-        frontend_error_redirect_url = f"{frontend_base_url}/frontend/signin.html?error={jwt.utils.base64url_encode(error_message.encode()).decode()}"
-        return redirect(frontend_error_redirect_url)
-        # Old: return jsonify({'message': 'An error occurred during Google authentication.'}), 500
-
-
-# --- GitHub OAuth Endpoints ---
-@app.route('/api/auth/github', methods=['GET'])
-def auth_github():
-    # For simplicity, state is not implemented here, but it's recommended for CSRF protection.
-    # You would typically generate a random string, store it in session, and verify it in the callback.
-    # session['oauth_state_github'] = generated_state_string
-    github_authorize_url = (
-        f"https://github.com/login/oauth/authorize?"
-        f"client_id={app.config['GITHUB_CLIENT_ID']}&"
-        f"redirect_uri={app.config['GITHUB_REDIRECT_URI']}&"
-        f"scope=user:email read:user" # user:email for private emails, read:user for profile
-        # f"&state={generated_state_string}" # If using state
-    )
-    return redirect(github_authorize_url)
+        app.logger.error(f"Token refresh failed: {e}")
+        return jsonify({'message': 'An error occurred while refreshing the token. Please try again.'}), 500
 
-@app.route('/api/auth/github/callback', methods=['GET'])
-def auth_github_callback():
-    code = request.args.get('code')
-    # state = request.args.get('state') # If using state, verify it here against session['oauth_state_github']
 
-    if not code:
-        return jsonify({'message': 'Authorization code not found.'}), 400
+@app.route('/api/token/revoke', methods=['POST'])
+def revoke_token():
+    refresh_token, from_cookie, invalid = presented_refresh_token()
+    if invalid:
+        return invalid
 
     try:
-        # Exchange code for access token
-        token_response = requests.post(
-            'https://github.com/login/oauth/access_token',
-            data={
-                'client_id': app.config['GITHUB_CLIENT_ID'],
-                'client_secret': app.config['GITHUB_CLIENT_SECRET'],
-                'code': code,
-                'redirect_uri': app.config['GITHUB_REDIRECT_URI']
-            },
-            headers={'Accept': 'application/json'}
-        )
-        token_response.raise_for_status() # Raise an exception for bad status codes
-        token_json = token_response.json()
-        access_token = token_json.get('access_token')
-
-        if not access_token:
-            error_description = token_json.get('error_description', 'GitHub token exchange failed.')
-            return jsonify({'message': error_description}), 500
-
-        # Fetch user info from GitHub API
-        user_info_headers = {
-            'Authorization': f'token {access_token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        user_info_response = requests.get('https://api.github.com/user', headers=user_info_headers)
-        user_info_response.raise_for_status()
-        user_info = user_info_response.json()
-
-        github_id = str(user_info.get('id')) # Ensure github_id is stored as string
-        email = user_info.get('email')
-        github_login = user_info.get('login') # GitHub username
-        name = user_info.get('name') # User's full name (can be null)
-
-        # If primary email is not public, fetch from /user/emails
-        if not email:
-            emails_response = requests.get('https://api.github.com/user/emails', headers=user_info_headers)
-            emails_response.raise_for_status()
-            emails_data = emails_response.json()
-            
-            if emails_data and isinstance(emails_data, list):
-                primary_email_obj = next((e for e in emails_data if e.get('primary') and e.get('verified')), None)
-                if primary_email_obj:
-                    email = primary_email_obj['email']
-                else: # Fallback to first verified email
-                    verified_email_obj = next((e for e in emails_data if e.get('verified')), None)
-                    if verified_email_obj:
-                        email = verified_email_obj['email']
-        
-        if not email:
-            # If still no email, this means the user has no public/primary verified email.
-            # You might redirect them to a page to set an email or deny login.
-            return jsonify({'message': 'Could not retrieve a verified email from GitHub. Please ensure you have a primary, verified email set on GitHub.'}), 400
-
-        user = User.query.filter_by(github_id=github_id).first()
-
-        if not user:
-            user = User.query.filter_by(email=email).first()
-            if not user:
-                # New user: create one
-                username_candidate = github_login or email.split('@')[0]
-                # Ensure username uniqueness
-                existing_username = User.query.filter_by(username=username_candidate).first()
-                if existing_username:
-                    username_candidate = f"{username_candidate}_{github_id[:6]}"
-
-                user = User(
-                    email=email,
-                    github_id=github_id,
-                    username=username_candidate,
-                    # password_hash remains None for social logins
-                )
-                db.session.add(user)
-            else:
-                # Existing user by email, link GitHub ID
-                user.github_id = github_id
-            db.session.commit()
-
-        # Generate application JWT
-        token_payload = {
-            'user_id': user.id,
-            'email': user.email,
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-        }
-        app_access_token = jwt.encode(token_payload, app.config['SECRET_KEY'], algorithm='HS256')
-
-        # Redirect to frontend with the token in the URL hash/fragment
-        frontend_base_url = os.environ.get('FRONTEND_BASE_URL', 'http://localhost:5000')
-        frontend_redirect_url = f"{frontend_base_url}/frontend/handle_token.html#token={app_access_token}"
-        return redirect(frontend_redirect_url)
-        # Old: return jsonify({'access_token': app_access_token, 'user_id': user.id, 'email': user.email}), 200
-
-    except requests.exceptions.RequestException as re:
-        app.logger.error(f"GitHub OAuth request failed: {re}")
-        return jsonify({'message': f'Communication error with GitHub: {str(re)}'}), 502 # Bad Gateway
+        stored = RefreshToken.query.filter_by(token_hash=hash_refresh_token(refresh_token)).first()
+        # Unknown tokens are not an error: the end state (not usable) is the same
+        if stored:
+            revoke_session(stored.family_id)
+        response = jsonify({'message': 'Token revoked'})
+        return (set_refresh_cookie(response, None) if from_cookie else response), 200
+
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error during GitHub OAuth callback: {e}")
-        error_message = 'An error occurred during GitHub authentication.'
-        if app.debug:
-            error_message = f'An error occurred during GitHub authentication: {str(e)}'
-
-        frontend_base_url = os.environ.get('FRONTEND_BASE_URL', 'http://localhost:5000')
-        frontend_error_redirect_url = f"{frontend_base_url}/frontend/signin.html?error={jwt.utils.base64url_encode(error_message.encode()).decode()}"
-        return redirect(frontend_error_redirect_url)
-        # Old: return jsonify({'message': 'An error occurred during GitHub authentication.'}), 500
+        app.logger.error(f"Token revocation failed: {e}")
+        return jsonify({'message': 'An error occurred while revoking the token. Please try again.'}), 500
+
+
+@app.route('/api/token/introspect', methods=['POST'])
+@require_introspection_client
+def introspect():
+    # For API gateways: many access tokens per call, answered in order
+    data = request.get_json(silent=True)
+
+    if not data:
+        return jsonify({'message': 'Request body must be JSON'}), 400
+
+    tokens = data.get('tokens')
+    if not isinstance(tokens, list) or not tokens:
+        return jsonify({'message': 'tokens must be a non-empty list'}), 400
+    if len(tokens) > app.config['INTROSPECT_MAX_TOKENS']:
+        return jsonify({'message': f"At most {app.config['INTROSPECT_MAX_TOKENS']} tokens per call"}), 400
+
+    return jsonify({'results': introspect_tokens(tokens)}), 200
+
+
+# --- OAuth Endpoints ---
+# Provider views live in backend/providers/ and are imported on first use, so
+# a cold start serving /api/login never loads the Google/GitHub client libraries.
+register_provider_routes(app)
+
+# --- Admin Endpoints ---
+# Keyset-paginated listing and streaming export of users, see backend/user_listing.py
+register_admin_routes(app)
 
 
 # --- Main Execution ---
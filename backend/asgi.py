@@ -0,0 +1,292 @@
+"""Async (ASGI) serving mode for the OAuth callbacks.
+
+The Google and GitHub callbacks spend nearly all their time waiting on the
+provider. Under the sync Flask app every one of those waits occupies a whole
+worker; here they are served on an event loop with an async HTTP client and an
+async DB session, so one process can hold hundreds of handshakes in flight.
+Every other route is handed to the Flask app unchanged.
+
+    pip install -r backend/requirements-async.txt
+    uvicorn backend.asgi:application --port 5001
+"""
+import asyncio
+import time
+import uuid
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from google.auth import jwt as google_jwt
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.app import (
+    app as flask_app, create_access_token, new_refresh_token,
+    frontend_error_redirect_url, frontend_token_redirect_url, refresh_cookie_header,
+)
+from backend.auth_events import OAUTH_EVENTS, record_auth_event
+from backend.db_pool import engine_options_for
+from backend.google_certs import cache_max_age
+from backend.oauth_state import NONCE_COOKIE, InvalidOAuthState, OAuthStateSigner, cookie_path
+from backend.services import resolve_oauth_user_async
+from backend.user_cache import invalidate_resolved_user
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_database_url(database_url):
+    """Swap a sync database URL onto its async driver."""
+    url = make_url(database_url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=drivername)
+
+
+class AsyncCertCache:
+    """Async counterpart of ``google_certs.CachingRequest`` for the Google certs."""
+
+    def __init__(self, http, certs_url, refresh_margin=300):
+        self.http = http
+        self.certs_url = certs_url
+        self.refresh_margin = refresh_margin
+        self._certs = None
+        self._refresh_at = 0
+        self._expires_at = 0
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    async def get(self):
+        now = time.monotonic()
+        if self._certs is not None and now < self._expires_at:
+            if now >= self._refresh_at and self._refresh_task is None:
+                self._refresh_task = asyncio.ensure_future(self._background_refresh())
+            return self._certs
+        async with self._lock:
+            # Another request may have fetched while we waited for the lock
+            if self._certs is None or time.monotonic() >= self._expires_at:
+                await self._fetch()
+            return self._certs
+
+    async def _fetch(self):
+        response = await self.http.get(self.certs_url)
+        response.raise_for_status()
+        certs = response.json()
+        max_age = cache_max_age(response.headers)
+        now = time.monotonic()
+        self._certs = certs
+        self._refresh_at = now + max_age - min(self.refresh_margin, max_age / 2)
+        self._expires_at = now + max_age
+
+    async def _background_refresh(self):
+        try:
+            await self._fetch()
+        except Exception:
+            pass # Keep serving the cached copy; a request past expiry fetches inline
+        finally:
+            self._refresh_task = None
+
+
+# --- ASGI responses ---
+async def send_response(send, status, body=b'', headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-length', str(len(body)).encode())] + [
+            (name.encode('latin-1'), value.encode('latin-1')) for name, value in headers
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def json_response(send, payload, status):
+    body = flask_app.json.dumps(payload).encode('utf-8')
+    await send_response(send, status, body, [('content-type', 'application/json')])
+
+
+async def redirect_response(send, location, headers=()):
+    await send_response(send, 302, b'', [('location', location), *headers])
+
+
+def request_cookies(scope):
+    cookies = SimpleCookie()
+    for name, value in scope.get('headers', ()):
+        if name == b'cookie':
+            cookies.load(value.decode('latin-1'))
+    return {name: morsel.value for name, morsel in cookies.items()}
+
+
+class AsyncAuthApp:
+    """ASGI app serving the OAuth callbacks natively and everything else via Flask."""
+
+    def __init__(self, wsgi_app=flask_app, database_url=None, http=None):
+        self.config = wsgi_app.config
+        self.wsgi = WsgiToAsgi(wsgi_app)
+        database_url = (database_url or self.config.get('ASYNC_DATABASE_URL')
+                        or async_database_url(self.config['SQLALCHEMY_DATABASE_URI']))
+        self.engine = create_async_engine(database_url, **engine_options_for(self.config, database_url))
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.http = http or httpx.AsyncClient(
+            timeout=httpx.Timeout(self.config['OAUTH_READ_TIMEOUT'], connect=self.config['OAUTH_CONNECT_TIMEOUT']),
+            limits=httpx.Limits(max_connections=self.config['ASYNC_HTTP_MAX_CONNECTIONS']),
+        )
+        self.google_certs = AsyncCertCache(self.http, self.config['GOOGLE_CERTS_URL'])
+        # Verifies states issued by any node sharing SECRET_KEY, Flask's included
+        self.state_signer = OAuthStateSigner.from_config(self.config)
+        self.routes = {
+            '/api/auth/google/callback': self.google_callback,
+            '/api/auth/github/callback': self.github_callback,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        handler = self.routes.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        if handler is None:
+            return await self.wsgi(scope, receive, send)
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        code = query.get('code', [None])[0]
+        if not code:
+            return await json_response(send, {'message': 'Authorization code not found.'}, 400)
+        provider = scope['path'].split('/')[3]
+        try:
+            return_to = self.state_signer.verify(query.get('state', [None])[0], provider,
+                                                 request_cookies(scope).get(NONCE_COOKIE))
+        except InvalidOAuthState as e:
+            flask_app.logger.warning(f"Rejected {provider} OAuth callback: {e}")
+            return await json_response(send, {'message': 'Invalid or expired sign-in attempt. Please sign in again.'}, 400)
+        await handler(scope, code, return_to, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def aclose(self):
+        await self.http.aclose()
+        await self.engine.dispose()
+
+    async def sign_in(self, scope, send, provider, provider_id, email, username_candidate, return_to):
+        """Resolve the user, start a session and redirect to the frontend with its tokens."""
+        async with self.sessions() as session:
+            user = await resolve_oauth_user_async(session, provider, provider_id, email, username_candidate)
+            family_id = uuid.uuid4().hex
+            refresh_token, row = new_refresh_token(user.id, family_id)
+            session.add(row)
+            await session.commit()
+            with flask_app.app_context(): # The signing keys, user cache and event writer are per app
+                invalidate_resolved_user(provider, provider_id, user)
+                access_token = create_access_token(user, family_id)
+                request_headers = dict(scope.get('headers', ()))
+                record_auth_event(OAUTH_EVENTS[user.outcome], user_id=user.id, email=user.email, provider=provider,
+                                  ip_address=(scope.get('client') or (None,))[0],
+                                  user_agent=request_headers.get(b'user-agent', b'').decode('latin-1'))
+        headers = [('set-cookie', refresh_cookie_header(refresh_token))]
+        if self.config['OAUTH_STATE_COOKIE']:
+            # Drop the nonce cookie; it has been used
+            headers.append(('set-cookie', f'{NONCE_COOKIE}=; Expires=Thu, 01 Jan 1970 00:00:00 GMT; Max-Age=0; '
+                                          f'HttpOnly; Path={cookie_path(provider)}; SameSite=Lax'))
+        await redirect_response(send, frontend_token_redirect_url(access_token, return_to), headers)
+
+    async def google_callback(self, scope, code, return_to, send):
+        try:
+            # Exchange code for token
+            token_response = await self.http.post(self.config['GOOGLE_TOKEN_URI'], data={
+                'code': code,
+                'client_id': self.config['GOOGLE_CLIENT_ID'],
+                'client_secret': self.config['GOOGLE_CLIENT_SECRET'],
+                'redirect_uri': self.config['GOOGLE_REDIRECT_URI'],
+                'grant_type': 'authorization_code',
+            })
+            token_response.raise_for_status()
+            google_id_token = token_response.json().get('id_token')
+            if not google_id_token:
+                raise ValueError('No ID token in the Google token response.')
+
+            # Verify ID token against the cached certs: local crypto only
+            certs = await self.google_certs.get()
+            id_info = google_jwt.decode(google_id_token, certs=certs, audience=self.config['GOOGLE_CLIENT_ID'])
+            if id_info.get('iss') not in GOOGLE_ISSUERS:
+                raise ValueError(f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}")
+
+            google_id = id_info.get('sub')
+            email = id_info.get('email')
+            if not email:
+                return await json_response(send, {'message': 'Email not provided by Google.'}, 400)
+
+            await self.sign_in(scope, send, 'google', google_id, email, email.split('@')[0], return_to)
+
+        except httpx.HTTPError as he:
+            flask_app.logger.error(f"Google OAuth request failed: {he}")
+            await json_response(send, {'message': f'Communication error with Google: {str(he)}'}, 502)
+        except ValueError as ve:
+            flask_app.logger.error(f"Google ID token verification failed: {ve}")
+            await json_response(send, {'message': f'Google authentication failed: {str(ve)}'}, 401)
+        except Exception as e:
+            flask_app.logger.error(f"Error during Google OAuth callback: {e}")
+            error_message = 'An error occurred during Google authentication.'
+            if flask_app.debug:
+                error_message = f'An error occurred during Google authentication: {str(e)}'
+            await redirect_response(send, frontend_error_redirect_url(error_message))
+
+    async def github_callback(self, scope, code, return_to, send):
+        try:
+            # Exchange code for access token
+            token_response = await self.http.post(self.config['GITHUB_TOKEN_URL'], data={
+                'client_id': self.config['GITHUB_CLIENT_ID'],
+                'client_secret': self.config['GITHUB_CLIENT_SECRET'],
+                'code': code,
+                'redirect_uri': self.config['GITHUB_REDIRECT_URI'],
+            }, headers={'Accept': 'application/json'})
+            token_response.raise_for_status()
+            token_json = token_response.json()
+            access_token = token_json.get('access_token')
+            if not access_token:
+                error_description = token_json.get('error_description', 'GitHub token exchange failed.')
+                return await json_response(send, {'message': error_description}, 500)
+
+            # Fetch user info and emails concurrently
+            headers = {'Authorization': f'token {access_token}', 'Accept': 'application/vnd.github.v3+json'}
+            api_url = self.config['GITHUB_API_URL']
+            user_response, emails_response = await asyncio.gather(
+                self.http.get(f'{api_url}/user', headers=headers),
+                self.http.get(f'{api_url}/user/emails', headers=headers),
+            )
+            user_response.raise_for_status()
+            user_info = user_response.json()
+
+            github_id = str(user_info.get('id'))
+            email = user_info.get('email')
+            github_login = user_info.get('login')
+
+            if not email:
+                emails_response.raise_for_status()
+                emails_data = emails_response.json()
+                if emails_data and isinstance(emails_data, list):
+                    email_obj = (next((e for e in emails_data if e.get('primary') and e.get('verified')), None)
+                                 or next((e for e in emails_data if e.get('verified')), None))
+                    if email_obj:
+                        email = email_obj['email']
+
+            if not email:
+                return await json_response(send, {'message': 'Could not retrieve a verified email from GitHub. Please ensure you have a primary, verified email set on GitHub.'}, 400)
+
+            await self.sign_in(scope, send, 'github', github_id, email, github_login or email.split('@')[0], return_to)
+
+        except httpx.HTTPError as he:
+            flask_app.logger.error(f"GitHub OAuth request failed: {he}")
+            await json_response(send, {'message': f'Communication error with GitHub: {str(he)}'}, 502)
+        except Exception as e:
+            flask_app.logger.error(f"Error during GitHub OAuth callback: {e}")
+            error_message = 'An error occurred during GitHub authentication.'
+            if flask_app.debug:
+                error_message = f'An error occurred during GitHub authentication: {str(e)}'
+            await redirect_response(send, frontend_error_redirect_url(error_message))
+
+
+application = AsyncAuthApp()
@@ -0,0 +1,261 @@
+"""Write-behind audit log of sign-ins, in the ``auth_events`` table.
+
+``record_auth_event`` only appends the event to an in-process buffer, so a
+login never waits on the insert. A background thread, started on the first
+event, writes the buffer in batches: with COPY on Postgres (psycopg or
+psycopg2) and an executemany INSERT elsewhere. It writes a batch once
+AUTH_EVENTS_BATCH_SIZE events are waiting, or once the oldest has waited
+AUTH_EVENTS_FLUSH_SECONDS.
+
+The log is best effort. What can be lost:
+
+- Buffered events, up to AUTH_EVENTS_FLUSH_SECONDS' worth, when the process
+  is killed (SIGKILL, the OOM killer, a gunicorn worker timeout). A normal
+  exit writes what is left, waiting at most AUTH_EVENTS_SHUTDOWN_SECONDS.
+  On serverless platforms that freeze the process between requests, events
+  wait for the next invocation and are lost if the instance is reclaimed.
+- New events while AUTH_EVENTS_MAX_PENDING are already waiting. They are
+  dropped rather than slowing sign-ins down or growing memory without bound.
+- A batch that fails to write ``MAX_ATTEMPTS`` times in a row, one flush
+  interval apart (e.g. while the database is down).
+
+A batch whose commit succeeded but went unacknowledged is retried, so an
+event can rarely be written twice. Dropped events are counted in ``dropped``
+and ``auth_events_total{result="dropped"}``, and logged.
+"""
+import atexit
+import csv
+import datetime
+import functools
+import io
+import logging
+import threading
+import time
+from collections import deque
+
+from flask import current_app, has_request_context, request
+
+from backend.metrics import count_auth_events
+from backend.models import AuthEvent, db, normalize_email
+
+LOGIN = 'login'
+LOGIN_FAILED = 'login_failed'
+REGISTER = 'register'
+# resolve_oauth_user outcome -> event
+OAUTH_EVENTS = {
+    'existing': 'oauth_login',
+    'linked': 'oauth_link',
+    'created': 'oauth_register',
+}
+
+COLUMNS = ('event_type', 'user_id', 'email', 'provider', 'ip_address', 'user_agent', 'created_at')
+_COPY_SQL = f"COPY auth_events ({', '.join(COLUMNS)}) FROM STDIN"
+
+# Consecutive failed writes of a batch before it is dropped
+MAX_ATTEMPTS = 3
+
+
+def write_events(engine, events):
+    """Insert a batch of event rows in one transaction."""
+    with engine.begin() as conn:
+        driver = conn.dialect.driver
+        if conn.dialect.name != 'postgresql' or driver not in ('psycopg', 'psycopg2'):
+            conn.execute(AuthEvent.__table__.insert(), events)
+            return
+        raw = conn.connection.driver_connection
+        rows = ([event[column] for column in COLUMNS] for event in events)
+        with raw.cursor() as cursor:
+            if driver == 'psycopg':
+                with cursor.copy(_COPY_SQL) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+            else:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows) # None -> unquoted empty -> NULL
+                buffer.seek(0)
+                cursor.copy_expert(f'{_COPY_SQL} WITH (FORMAT csv)', buffer)
+
+
+class AuthEventWriter:
+    """Bounded buffer of events that a background thread hands to ``sink`` in batches."""
+
+    def __init__(self, sink, batch_size=500, flush_interval=1.0, max_pending=10000, logger=None,
+                 clock=time.monotonic):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.logger = logger or logging.getLogger(__name__)
+        self.clock = clock
+        self.written = 0
+        self.dropped = 0
+        self.failed_writes = 0
+        self._pending = deque()
+        self._oldest_at = None
+        self._retry_at = None
+        self._attempts = 0
+        self._unlogged_drops = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock() # One batch in flight, so a failed one is retried first
+        self._thread = None
+
+    def record(self, event):
+        """Buffer ``event``; False if it was dropped because the buffer is full or closed."""
+        with self._cond:
+            if self._closed or len(self._pending) >= self.max_pending:
+                self._drop(1)
+                return False
+            if not self._pending:
+                self._oldest_at = self.clock()
+            self._pending.append(event)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        if self._thread is None:
+            self._start()
+        return True
+
+    def _start(self):
+        # Started on first use, so it runs in the serving process (e.g. a
+        # gunicorn worker) rather than in whatever imported this module
+        with self._cond:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='auth-event-writer', daemon=True)
+                self._thread.start()
+
+    def _drop(self, count):
+        # Called with self._cond held
+        self.dropped += count
+        self._unlogged_drops += count
+        count_auth_events('dropped', count)
+
+    def _due(self, now):
+        if not self._pending or (self._retry_at is not None and now < self._retry_at):
+            return False
+        return len(self._pending) >= self.batch_size or now - self._oldest_at >= self.flush_interval
+
+    def _wait_time(self, now):
+        if not self._pending:
+            return None # Until record() or close() wakes us
+        due_at = self._oldest_at + self.flush_interval
+        if self._retry_at is not None:
+            due_at = max(due_at, self._retry_at)
+        return max(0.0, due_at - now)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._due(self.clock()):
+                    self._cond.wait(self._wait_time(self.clock()))
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def _write_batch(self):
+        """Write the oldest batch; returns its size, 0 when there is nothing to write, None if it failed."""
+        with self._write_lock:
+            with self._cond:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return 0
+                self._oldest_at = self.clock() if self._pending else None
+            try:
+                self.sink(batch)
+            except Exception as e:
+                with self._cond:
+                    self.failed_writes += 1
+                    self._attempts += 1
+                    if self._attempts >= MAX_ATTEMPTS:
+                        self._attempts = 0
+                        self._retry_at = None
+                        self._drop(len(batch))
+                    else:
+                        # Back to the front, to be retried one flush interval from now
+                        self._pending.extendleft(reversed(batch))
+                        self._oldest_at = self.clock()
+                        self._retry_at = self._oldest_at + self.flush_interval
+                self.logger.error(f"Writing {len(batch)} auth event(s) failed: {e}")
+                return None
+            with self._cond:
+                self._attempts = 0
+                self._retry_at = None
+                self.written += len(batch)
+            count_auth_events('written', len(batch))
+            return len(batch)
+
+    def flush(self):
+        """Write everything buffered, on the calling thread; stops at the first failed batch.
+
+        Returns the number of events written.
+        """
+        written = 0
+        while True:
+            count = self._write_batch()
+            if not count:
+                break
+            written += count
+        with self._cond:
+            drops, self._unlogged_drops = self._unlogged_drops, 0
+        if drops:
+            self.logger.warning(f"Dropped {drops} auth event(s); see AUTH_EVENTS_MAX_PENDING")
+        return written
+
+    def close(self, timeout=5.0):
+        """Write what is buffered and stop; events recorded afterwards are dropped."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        else:
+            self.flush()
+        with self._cond:
+            # Left over: the final write failed or did not finish in time
+            lost = len(self._pending)
+            self._pending.clear()
+            self._drop(lost)
+        if lost:
+            self.logger.error(f"{lost} auth event(s) were not written before shutdown")
+
+    def __len__(self):
+        return len(self._pending)
+
+
+def get_auth_event_writer():
+    """Return the event writer for the current app, creating it on first use; None when disabled."""
+    config = current_app.config
+    if not config['AUTH_EVENTS_ENABLED']:
+        return None
+    writer = current_app.extensions.get('auth_events')
+    if writer is None:
+        writer = AuthEventWriter(
+            functools.partial(write_events, db.engine),
+            batch_size=config['AUTH_EVENTS_BATCH_SIZE'],
+            flush_interval=config['AUTH_EVENTS_FLUSH_SECONDS'],
+            max_pending=config['AUTH_EVENTS_MAX_PENDING'],
+            logger=current_app.logger,
+        )
+        atexit.register(writer.close, config['AUTH_EVENTS_SHUTDOWN_SECONDS'])
+        current_app.extensions['auth_events'] = writer
+    return writer
+
+
+def record_auth_event(event_type, user_id=None, email=None, provider=None, ip_address=None, user_agent=None):
+    """Queue an event for the audit log. The client's address and user agent default to the current request's."""
+    writer = get_auth_event_writer()
+    if writer is None:
+        return
+    if has_request_context():
+        ip_address = ip_address or request.remote_addr
+        user_agent = user_agent or request.user_agent.string
+    writer.record({
+        'event_type': event_type,
+        'user_id': user_id,
+        'email': normalize_email(email)[:255] if email else None,
+        'provider': provider,
+        'ip_address': ip_address[:45] if ip_address else None,
+        'user_agent': user_agent[:255] if user_agent else None,
+        'created_at': datetime.datetime.utcnow(),
+    })
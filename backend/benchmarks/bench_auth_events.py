@@ -0,0 +1,84 @@
+"""Audit log write benchmark: what recording an auth event costs a request.
+
+Compares one INSERT and commit per event, on the request thread, with
+``AuthEventWriter.record`` (backend/auth_events.py), which only buffers the
+event. It also reports how fast the background thread drains the buffer
+with batched writes: COPY on Postgres, executemany elsewhere.
+
+    python -m backend.benchmarks.bench_auth_events --events 5000
+    python -m backend.benchmarks.bench_auth_events --database-url postgresql://... --batch-size 500
+"""
+import argparse
+import datetime
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from backend.auth_events import AuthEventWriter, write_events
+from backend.models import AuthEvent, db
+
+USER_AGENT = 'bench_auth_events'
+
+
+def make_event(n):
+    return {'event_type': 'login', 'user_id': n, 'email': f'bench-{n}@example.com', 'provider': None,
+            'ip_address': '203.0.113.7', 'user_agent': USER_AGENT, 'created_at': datetime.datetime.utcnow()}
+
+
+def per_event_us(record, events):
+    timings = []
+    for n in range(events):
+        started = time.perf_counter()
+        record(make_event(n))
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=None, help='default: a temporary SQLite file')
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    path = None
+    if args.database_url is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+    engine = create_engine(args.database_url or f'sqlite:///{path}')
+    try:
+        db.metadata.create_all(engine, tables=[AuthEvent.__table__])
+
+        def insert_now(event):
+            with engine.begin() as conn:
+                conn.execute(AuthEvent.__table__.insert(), event)
+        p50, p99 = per_event_us(insert_now, args.events)
+        print(f'{"insert per event":>18}: p50={p50:8.1f} us  p99={p99:8.1f} us on the request thread')
+
+        batches = []
+        writer = AuthEventWriter(lambda batch: batches.append(batch), batch_size=args.batch_size, flush_interval=3600)
+        p50, p99 = per_event_us(writer.record, args.events)
+        print(f'{"write-behind":>18}: p50={p50:8.1f} us  p99={p99:8.1f} us on the request thread')
+        writer.flush()
+        writer.close()
+
+        started = time.perf_counter()
+        for batch in batches:
+            write_events(engine, batch)
+        elapsed = time.perf_counter() - started
+        print(f'{"batched writes":>18}: {args.events / elapsed:10.0f} events/s in batches of {args.batch_size} '
+              f'({engine.dialect.name}, {engine.dialect.driver})')
+    finally:
+        with engine.begin() as conn: # This run's rows only
+            conn.execute(AuthEvent.__table__.delete().where(AuthEvent.user_agent == USER_AGENT))
+        engine.dispose()
+        if path:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""Endpoint load benchmark: register, login and the OAuth callbacks under concurrency.
+
+Each endpoint is driven through the Flask test client from --concurrency
+threads (a comma-separated list runs each level in turn). Google and
+GitHub are replaced by the local stand-in servers from the test suite.
+For each endpoint and level it reports p50/p95/p99 latency, throughput
+and database queries per request (see backend/query_stats.py). Register and login
+answer 503 once the hashing pool's backlog is full; the status counts show
+this. Raise HASHING_MAX_PENDING to measure queueing instead.
+
+Runs against a throwaway SQLite file by default, or against any database
+given with --database-url, e.g. a local Postgres. The tables are created if
+missing, and this run's accounts are deleted at the end.
+
+--output saves the results as JSON, tagged with the current commit.
+--compare prints the change against a saved run:
+
+    python -m backend.benchmarks.bench_endpoints --requests 500 --concurrency 1,16 --output before.json
+    python -m backend.benchmarks.bench_endpoints --requests 500 --concurrency 1,16 --compare before.json
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINTS = ['register', 'login', 'google_callback', 'github_callback']
+PASSWORD = 'password123'
+COMPARED = [('p50_ms', 'lower'), ('p99_ms', 'lower'), ('throughput_rps', 'higher'), ('queries_per_request', 'lower')]
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Workload:
+    """Builds the requests for each endpoint, against this run's own accounts."""
+
+    def __init__(self, app, run_id):
+        self.app = app
+        self.run_id = run_id
+        self.login_email = f'bench-{run_id}-login@example.com'
+        self._serial = itertools.count()
+
+    def setup(self, client):
+        client.post('/api/register', json={'email': self.login_email, 'password': PASSWORD}).close()
+
+    def register(self, client):
+        email = f'bench-{self.run_id}-{next(self._serial)}@example.com'
+        return client.post('/api/register', json={'email': email, 'password': PASSWORD})
+
+    def login(self, client):
+        return client.post('/api/login', json={'email': self.login_email, 'password': PASSWORD})
+
+    def _callback(self, client, provider):
+        # A fresh signed state per request, with the nonce cookie its authorize redirect would set
+        from backend.oauth_state import NONCE_COOKIE, get_state_signer
+        with self.app.app_context():
+            state, nonce = get_state_signer().issue(provider)
+        return client.get(f'/api/auth/{provider}/callback?code=bench&state={state}',
+                          headers={'Cookie': f'{NONCE_COOKIE}={nonce}'})
+
+    def google_callback(self, client):
+        return self._callback(client, 'google')
+
+    def github_callback(self, client):
+        return self._callback(client, 'github')
+
+
+def drive(workload, endpoint, total, concurrency):
+    from backend.query_stats import record_queries
+    client = workload.app.test_client(use_cookies=False) # Shared by every thread; cookies are sent explicitly
+    call = getattr(workload, endpoint)
+
+    def one(_):
+        with record_queries() as queries:
+            started = time.perf_counter()
+            response = call(client)
+            elapsed = time.perf_counter() - started
+        return elapsed, queries.count, response.status_code
+
+    for _ in range(min(concurrency, 5)): # Warm connections, caches and lazy imports
+        one(None)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _, _ in samples)
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': total,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'mean_ms': statistics.fmean(latencies),
+        'throughput_rps': total / elapsed,
+        'queries_per_request': statistics.fmean(queries for _, queries, _ in samples),
+        'max_queries': max(queries for _, queries, _ in samples),
+        'statuses': statuses,
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result, baseline=None):
+    line = (f"{result['endpoint']:>16} c={result['concurrency']:<3} p50={result['p50_ms']:8.1f} ms  "
+            f"p95={result['p95_ms']:8.1f} ms  p99={result['p99_ms']:8.1f} ms  "
+            f"{result['throughput_rps']:8.1f} req/s  {result['queries_per_request']:5.1f} queries/req  "
+            f"statuses={result['statuses']}")
+    print(line)
+    if baseline is not None:
+        changes = []
+        for key, better in COMPARED:
+            before, after = baseline[key], result[key]
+            change = (after - before) / before * 100 if before else 0.0
+            improved = change < 0 if better == 'lower' else change > 0
+            changes.append(f"{key}={change:+.1f}%{'' if abs(change) < 5 else (' better' if improved else ' worse')}")
+        print(f"{'':>16} vs baseline: {'  '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=None, help='default: a temporary SQLite file')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint and concurrency level')
+    parser.add_argument('--concurrency', default='1,16', help='comma-separated concurrency levels')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--output', default=None, help='write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='a JSON file from an earlier --output run')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',')]
+    endpoints = args.endpoints.split(',')
+
+    # The engine is created when backend.app is imported (an in-memory SQLite
+    # database would be per-connection, so use a file)
+    db_file = None
+    if args.database_url is None:
+        db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+        args.database_url = f'sqlite:///{db_file}'
+    os.environ['DATABASE_URL'] = args.database_url
+
+    from backend.app import app, db, User
+    from backend.tests.test_asgi import StandInGoogle
+    from backend.tests.test_github_client import StandInGitHub
+
+    run_id = uuid.uuid4().hex[:8]
+    google = StandInGoogle(app.config['GOOGLE_CLIENT_ID'], email=f'bench-{run_id}-google@example.com',
+                           sub=f'bench-{run_id}')
+    github = StandInGitHub(user={'id': f'bench-{run_id}', 'login': f'bench-{run_id}',
+                                 'email': f'bench-{run_id}-github@example.com'})
+    app.config.update(
+        LOGIN_RATE_LIMIT=False, # Every login comes from one client
+        GOOGLE_TOKEN_URI=f'{google.url}/token', GOOGLE_CERTS_URL=f'{google.url}/certs',
+        GITHUB_TOKEN_URL=f'{github.url}/login/oauth/access_token', GITHUB_API_URL=github.url,
+    )
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r['endpoint'], r['concurrency']): r for r in json.load(f)['results']}
+
+    workload = Workload(app, run_id)
+    results = []
+    try:
+        with app.app_context():
+            db.create_all()
+            workload.setup(app.test_client())
+            print(f"database={db.engine.dialect.name} requests={args.requests} concurrency={args.concurrency} "
+                  f"commit={current_commit()}")
+            for endpoint in endpoints:
+                for level in levels:
+                    result = drive(workload, endpoint, args.requests, level)
+                    print_result(result, baseline.get((endpoint, level)))
+                    results.append(result)
+            User.query.filter(User.email.like(f'bench-{run_id}-%')).delete(synchronize_session=False)
+            db.session.commit()
+    finally:
+        google.close()
+        github.close()
+        executor = app.extensions.get('hashing_executor')
+        if executor is not None:
+            executor.shutdown()
+        events = app.extensions.get('auth_events')
+        if events is not None:
+            events.close() # While the database file still exists
+        if db_file is not None:
+            os.unlink(db_file)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'commit': current_commit(),
+                'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'database': args.database_url.split(':', 1)[0],
+                'cores': os.cpu_count(),
+                'results': results,
+            }, f, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
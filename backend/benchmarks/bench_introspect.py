@@ -0,0 +1,88 @@
+"""Token introspection benchmark: tokens verified per second per core, by batch size.
+
+Issues --tokens distinct access tokens per signing algorithm (HS256 with
+SECRET_KEY, EdDSA, RS256). It then introspects them through
+/api/token/introspect in batches of each --batch-sizes, twice: first with
+an empty verification cache (every token decoded) and then warm (every
+token a cache hit). Per core is tokens per CPU-second of this process,
+which serves the requests on one thread.
+
+    python -m backend.benchmarks.bench_introspect --tokens 5000 --batch-sizes 1,100,500
+"""
+import argparse
+import os
+import tempfile
+import time
+import types
+
+# The engine is created when backend.app is imported; the revocation list
+# reads revoked_tokens, so give it a throwaway SQLite file
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_file.name}'
+
+from backend.app import app, db, create_access_token  # noqa: E402
+from backend.signing_keys import generate_private_key, private_key_pem  # noqa: E402
+
+SECRET = 'bench-introspection-secret'
+ALGORITHMS = {
+    'HS256': {},
+    'EdDSA': {'bench-ed25519': private_key_pem(generate_private_key('ed25519')).decode()},
+    'RS256': {'bench-rsa': private_key_pem(generate_private_key('rsa')).decode()},
+}
+
+
+def use_keys(keys):
+    app.config['JWT_PRIVATE_KEYS'] = keys
+    app.extensions.pop('signing_keys', None)
+    app.extensions.pop('token_cache', None)
+
+
+def issue(count):
+    with app.app_context():
+        return [create_access_token(types.SimpleNamespace(id=i, email=f'user{i}@example.com'), f'sid{i}')
+                for i in range(count)]
+
+
+def introspect_all(client, tokens, batch_size):
+    headers = {'Authorization': f'Bearer {SECRET}'}
+    wall, cpu = time.perf_counter(), time.process_time()
+    active = 0
+    for start in range(0, len(tokens), batch_size):
+        response = client.post('/api/token/introspect', json={'tokens': tokens[start:start + batch_size]},
+                               headers=headers)
+        active += sum(result['active'] for result in response.get_json()['results'])
+    return len(tokens) / (time.perf_counter() - wall), len(tokens) / (time.process_time() - cpu), active
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=5000)
+    parser.add_argument('--batch-sizes', default='1,100,500')
+    args = parser.parse_args()
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+
+    app.config.update(INTROSPECTION_SECRETS=[SECRET], INTROSPECT_MAX_TOKENS=max(batch_sizes),
+                      TOKEN_CACHE_SIZE=args.tokens)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    print(f'cores={os.cpu_count()} tokens={args.tokens}')
+    try:
+        for algorithm, keys in ALGORITHMS.items():
+            use_keys(keys)
+            tokens = issue(args.tokens)
+            for batch_size in batch_sizes:
+                for state in ('cold', 'warm'):
+                    if state == 'cold':
+                        app.extensions.pop('token_cache', None)
+                    per_second, per_core, active = introspect_all(client, tokens, batch_size)
+                    print(f'{algorithm:>6} batch={batch_size:<4} {state}: {per_second:9.0f} tokens/s  '
+                          f'{per_core:9.0f} tokens/s/core  active={active}/{len(tokens)}')
+    finally:
+        use_keys({})
+        os.unlink(_db_file.name)
+
+
+if __name__ == '__main__':
+    main()
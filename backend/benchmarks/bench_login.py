@@ -0,0 +1,73 @@
+"""Login throughput benchmark: inline bcrypt vs. the hashing pool.
+
+Drives /api/login through the Flask test client from a thread pool, once with
+HASHING_WORKERS=0 (bcrypt on the request thread, the old behaviour) and once
+with the process pool, and reports requests/second and requests/second/core.
+
+    python -m backend.benchmarks.bench_login --requests 200 --concurrency 16
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The engine is created when backend.app is imported, so point it at a
+# throwaway SQLite file first (an in-memory database is per-thread).
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_file.name}'
+
+from backend.app import app, db  # noqa: E402
+from backend.hashing import HashingExecutor  # noqa: E402
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'password123'
+
+
+def run(label, executor, total, concurrency):
+    app.extensions['hashing_executor'] = executor
+    client = app.test_client()
+    body = json.dumps({'email': EMAIL, 'password': PASSWORD})
+    statuses = {}
+
+    def one(_):
+        response = client.post('/api/login', data=body, content_type='application/json')
+        return response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for status in pool.map(one, range(total)):
+            statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - started
+    executor.shutdown()
+
+    cores = os.cpu_count() or 1
+    throughput = statuses.get(200, 0) / elapsed
+    print(f'{label:>8}: {throughput:8.1f} logins/s  {throughput / cores:7.1f} logins/s/core  '
+          f'{elapsed:6.2f}s  statuses={statuses}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=None, help='pool size (defaults to cpu count)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        client.post('/api/register', data=json.dumps({'email': EMAIL, 'password': PASSWORD}),
+                    content_type='application/json')
+
+    print(f'cores={os.cpu_count()} requests={args.requests} concurrency={args.concurrency}')
+    # A large backlog keeps the benchmark measuring throughput rather than 503s.
+    run('inline', HashingExecutor(max_workers=0, max_pending=args.requests), args.requests, args.concurrency)
+    run('pool', HashingExecutor(max_workers=args.workers, max_pending=args.requests), args.requests, args.concurrency)
+
+    os.unlink(_db_file.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Connection-pool load test: connection counts and latency per DB_POOL_PROFILE.
+
+Simulates app instances as separate engines, each serving requests from its
+own threads. One request is the login lookup: check out a connection, select
+the user by email and return the connection. For every profile it reports
+connections opened, peak open connections (client side, and server side
+from pg_stat_activity) and p50/p95/p99 request latency.
+
+The default scenarios model the deployments: 'pooled' and 'pgbouncer' as 4
+gunicorn workers with 8 threads each, 'serverless' as 16 lambda instances
+serving one request at a time, each instance cold-started (a fresh engine)
+every --cold-start-every requests. Needs Postgres; point --pgbouncer-url at
+PgBouncer to run the pgbouncer scenario against it.
+
+    python -m backend.benchmarks.bench_pool --database-url postgresql://... --requests 2000
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+from backend.db_pool import engine_options
+from backend.models import User
+
+EMAIL = 'pool-bench@example.com'
+LOOKUP = text('SELECT id, password_hash FROM users WHERE lower(email) = :email')
+SERVER_CONNECTIONS = text(
+    "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND application_name = 'bench_pool'"
+)
+
+
+class ConnectionCounter:
+    """Counts DBAPI connections opened and open at once across engines."""
+
+    def __init__(self):
+        self.opened = 0
+        self.open = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def watch(self, engine):
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'close', self._on_close)
+        event.listen(engine, 'close_detached', self._on_close)
+
+    def _on_connect(self, *args):
+        with self._lock:
+            self.opened += 1
+            self.open += 1
+            self.peak = max(self.peak, self.open)
+
+    def _on_close(self, *args):
+        with self._lock:
+            self.open -= 1
+
+
+class ServerSampler(threading.Thread):
+    """Samples the server-side connection count while a scenario runs."""
+
+    def __init__(self, database_url, interval=0.02):
+        super().__init__(daemon=True)
+        self.engine = create_engine(database_url, poolclass=NullPool)
+        self.interval = interval
+        self.peak = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        with self.engine.connect() as conn:
+            while not self._stopped.is_set():
+                self.peak = max(self.peak, conn.execute(SERVER_CONNECTIONS).scalar())
+                conn.rollback()
+                time.sleep(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self.engine.dispose()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def bench_url(database_url):
+    """Tag the benchmark's connections so the sampler can count just them."""
+    url = make_url(database_url)
+    return url.update_query_dict({'application_name': 'bench_pool'})
+
+
+def run_scenario(label, database_url, profile, overrides, instances, threads, total, cold_start_every):
+    url = bench_url(database_url)
+    options = engine_options(profile, url, **overrides)
+    counter = ConnectionCounter()
+    sampler = ServerSampler(database_url)
+    per_instance = total // instances
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def new_engine():
+        engine = create_engine(url, **options)
+        counter.watch(engine)
+        return engine
+
+    def instance(_):
+        engine = new_engine()
+        timings = []
+
+        def one_request(_):
+            started = time.perf_counter()
+            with engine.connect() as conn:
+                conn.execute(LOOKUP, {'email': EMAIL}).first()
+            timings.append(time.perf_counter() - started)
+
+        served = 0
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while served < per_instance:
+                batch = min(per_instance - served, cold_start_every or per_instance)
+                list(pool.map(one_request, range(batch)))
+                served += batch
+                if cold_start_every and served < per_instance:
+                    engine.dispose() # The instance is recycled; the next request is a cold start
+                    engine = new_engine()
+        engine.dispose()
+        with latencies_lock:
+            latencies.extend(timings)
+
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=instances) as pool:
+        list(pool.map(instance, range(instances)))
+    elapsed = time.perf_counter() - started
+    sampler.stop()
+
+    latencies.sort()
+    p50, p95, p99 = (percentile(latencies, pct) * 1000 for pct in (50, 95, 99))
+    print(f'{label:>20}: opened={counter.opened:<5} peak_client={counter.peak:<4} '
+          f'peak_server={sampler.peak:<4} p50={p50:6.2f}ms p95={p95:6.2f}ms p99={p99:6.2f}ms '
+          f'{len(latencies) / elapsed:8.1f} req/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--pgbouncer-url', default=None, help='PgBouncer URL for the pgbouncer scenario')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers (pooled/pgbouncer)')
+    parser.add_argument('--threads', type=int, default=8, help='threads per worker (pooled/pgbouncer)')
+    parser.add_argument('--lambdas', type=int, default=16, help='concurrent lambda instances (serverless)')
+    parser.add_argument('--cold-start-every', type=int, default=50, help='requests per lambda instance lifetime')
+    args = parser.parse_args()
+
+    if not args.database_url or make_url(args.database_url).get_backend_name() != 'postgresql':
+        parser.error('--database-url (or DATABASE_URL) must point at Postgres')
+
+    setup_engine = create_engine(args.database_url, poolclass=NullPool)
+    User.__table__.create(setup_engine, checkfirst=True)
+    with setup_engine.begin() as conn:
+        conn.execute(User.__table__.delete().where(User.email == EMAIL))
+        conn.execute(User.__table__.insert().values(email=EMAIL, password_hash='x'))
+
+    print(f'requests={args.requests} workers={args.workers}x{args.threads} lambdas={args.lambdas} '
+          f'cold_start_every={args.cold_start_every}')
+    scenarios = [
+        ('pooled', args.database_url, 'pooled', {}, args.workers, args.threads, 0),
+        ('pgbouncer', args.pgbouncer_url or args.database_url, 'pgbouncer', {}, args.workers, args.threads, 0),
+        ('serverless', args.database_url, 'serverless', {}, args.lambdas, 1, args.cold_start_every),
+        ('serverless NullPool', args.database_url, 'serverless', {'pool_size': 0}, args.lambdas, 1,
+         args.cold_start_every),
+    ]
+    try:
+        for label, url, profile, overrides, instances, threads, cold_start_every in scenarios:
+            run_scenario(label, url, profile, overrides, instances, threads, args.requests, cold_start_every)
+    finally:
+        with setup_engine.begin() as conn:
+            conn.execute(User.__table__.delete().where(User.email == EMAIL))
+        setup_engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Cold-start benchmark: import time of backend.app and time to first response per route.
+
+Every measurement runs in a fresh interpreter, like a new Vercel instance:
+it imports backend.app, then serves one request to the route under test
+through the Flask test client. Reports the median over --runs of the import
+time, the first-response time and which heavy provider libraries the request
+ended up loading.
+
+    python -m backend.benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# (label, method, path, JSON body)
+ROUTES = [
+    ('login', 'POST', '/api/login', {'email': 'nobody@example.com', 'password': 'password123'}),
+    ('me', 'GET', '/api/me', None),
+    ('google', 'GET', '/api/auth/google', None),
+    ('github', 'GET', '/api/auth/github', None),
+]
+
+# Libraries that only the OAuth routes should pull in
+HEAVY_MODULES = ['google.auth', 'google.oauth2', 'requests']
+
+# Runs in the child interpreter; prints one JSON line
+_CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from backend.app import app, db
+imported = time.perf_counter()
+method, path, body = json.loads(sys.argv[1])
+with app.app_context():
+    db.create_all()
+created = time.perf_counter()
+client = app.test_client()
+response = client.open(path, method=method, json=body)
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_response_ms': (done - created) * 1000,
+    'status': response.status_code,
+    'loaded': [m for m in json.loads(sys.argv[2]) if m in sys.modules],
+}))
+'''
+
+
+def measure(method, path, body, env):
+    output = subprocess.run(
+        [sys.executable, '-c', _CHILD, json.dumps([method, path, body]), json.dumps(HEAVY_MODULES)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{tmp}/startup.db', HASHING_WORKERS='0')
+        print(f'python={sys.version.split()[0]} runs={args.runs}')
+        for label, method, path, body in ROUTES:
+            results = [measure(method, path, body, env) for _ in range(args.runs)]
+            import_ms = statistics.median(r['import_ms'] for r in results)
+            first_ms = statistics.median(r['first_response_ms'] for r in results)
+            loaded = ','.join(results[-1]['loaded']) or '-'
+            print(f'{label:>8}: import={import_ms:7.1f} ms  first_response={first_ms:7.1f} ms  '
+                  f'status={results[-1]["status"]}  heavy_modules={loaded}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Request validation and JSON microbenchmark for /api/login.
+
+Times the parse-validate-respond work of one login request, without the
+password hash. The hand-written ``data.get`` checks with stdlib json are
+compared against backend/schemas.py with each JSON provider. The same is
+then measured end to end through the test client, for a rejected body (400)
+and an unknown user (401, one SELECT):
+
+    python -m backend.benchmarks.bench_validation --iterations 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import timeit
+
+# The engine is created when backend.app is imported; the unknown-user login
+# reads users, so give it a throwaway SQLite file
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_file.name}'
+
+from backend import schemas  # noqa: E402
+from backend.app import app, db  # noqa: E402
+from backend.json_provider import json_provider_class, orjson  # noqa: E402
+from backend.models import is_valid_email  # noqa: E402
+
+BODY = json.dumps({'email': 'someone@example.com', 'password': 'correct horse battery'}).encode('utf-8')
+INVALID_BODY = json.dumps({'email': 'someone@example', 'password': ''}).encode('utf-8')
+
+
+def legacy(provider):
+    # The checks login made before backend/schemas.py
+    def run(body):
+        data = provider.loads(body)
+        email = data.get('email')
+        password = data.get('password')
+        if not email:
+            return provider.dumps({'message': 'Email is required'})
+        if not is_valid_email(email):
+            return provider.dumps({'message': 'Invalid email format'})
+        if not password:
+            return provider.dumps({'message': 'Password is required'})
+        return provider.dumps({'message': 'Invalid email or password'})
+    return run
+
+
+def compiled(provider):
+    def run(body):
+        values, errors = schemas.LOGIN.validate(provider.loads(body))
+        if errors:
+            return provider.dumps({'message': errors[0]['message'], 'errors': errors})
+        return provider.dumps({'message': 'Invalid email or password'})
+    return run
+
+
+def per_call_us(func, body, iterations):
+    return min(timeit.repeat(lambda: func(body), number=iterations, repeat=3)) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    providers = ['stdlib'] + (['orjson'] if orjson is not None else [])
+    print('in process, per call:')
+    for label, body in (('valid', BODY), ('invalid', INVALID_BODY)):
+        func = legacy(json_provider_class('stdlib')(app))
+        print(f'  {label:<7} legacy+stdlib: {per_call_us(func, body, args.iterations):6.2f} us')
+        for name in providers:
+            func = compiled(json_provider_class(name)(app))
+            print(f'  {label:<7} schema+{name:<6}: {per_call_us(func, body, args.iterations):6.2f} us')
+
+    app.config['LOGIN_RATE_LIMIT'] = False
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    print('through the test client, per request:')
+    try:
+        # Rounds alternate between the providers so drift in the machine's speed hits both alike
+        best = {}
+        for _ in range(5):
+            for name in providers:
+                app.json = json_provider_class(name)(app)
+                for label, body in (('400', INVALID_BODY), ('401', BODY)):
+                    seconds = timeit.timeit(
+                        lambda: client.post('/api/login', data=body, content_type='application/json'),
+                        number=args.requests)
+                    best[name, label] = min(best.get((name, label), seconds), seconds)
+        for (name, label), seconds in best.items():
+            print(f'  {name:<6} {label}: {seconds / args.requests * 1e6:7.1f} us')
+    finally:
+        os.unlink(_db_file.name)
+
+
+if __name__ == '__main__':
+    main()
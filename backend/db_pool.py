@@ -0,0 +1,75 @@
+"""Connection-pool profiles for ``SQLALCHEMY_ENGINE_OPTIONS``.
+
+``DB_POOL_PROFILE`` picks one of:
+
+- ``pooled``: long-running gunicorn workers keep a pool of open connections,
+  ping them before use and recycle them before idle timeouts drop them.
+- ``pgbouncer``: the app talks to PgBouncer in transaction mode, where
+  consecutive transactions can land on different server connections, so the
+  driver must not use server-side prepared statements.
+- ``serverless``: each Vercel lambda instance serves one request at a time.
+  It keeps a single connection across warm invocations instead of opening a
+  new one per request; ``DB_POOL_SIZE=0`` switches to ``NullPool`` (connect
+  per request) for databases that cannot hold one idle connection per instance.
+
+``DB_POOL_SIZE``, ``DB_MAX_OVERFLOW``, ``DB_POOL_RECYCLE`` and
+``DB_POOL_TIMEOUT`` override the profile's defaults.
+"""
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+POOL_PROFILES = {
+    'pooled': {
+        'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 10,
+        'pool_recycle': 1800, 'pool_pre_ping': True,
+    },
+    # PgBouncer does the server-side pooling; the local pool only saves the
+    # client handshake with PgBouncer itself
+    'pgbouncer': {
+        'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 10,
+        'pool_recycle': 600, 'pool_pre_ping': True,
+    },
+    # A frozen instance can sit idle for minutes, so ping and recycle eagerly
+    'serverless': {
+        'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 10,
+        'pool_recycle': 300, 'pool_pre_ping': True,
+    },
+}
+
+# Config keys that override a profile's defaults
+POOL_SETTINGS = {
+    'pool_size': 'DB_POOL_SIZE',
+    'max_overflow': 'DB_MAX_OVERFLOW',
+    'pool_recycle': 'DB_POOL_RECYCLE',
+    'pool_timeout': 'DB_POOL_TIMEOUT',
+}
+
+# Per-driver connect args that turn off server-side prepared statements
+# (psycopg2 never uses them)
+NO_PREPARED_STATEMENTS = {
+    'psycopg': {'prepare_threshold': None},
+    'asyncpg': {'statement_cache_size': 0, 'prepared_statement_cache_size': 0},
+}
+
+
+def engine_options(profile, database_url, **overrides):
+    """Return ``create_engine`` keyword arguments for a pool profile."""
+    if profile not in POOL_PROFILES:
+        raise ValueError(f'Unknown DB_POOL_PROFILE: {profile}')
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite':
+        return {} # Local file or memory; Flask-SQLAlchemy picks a suitable pool
+
+    options = dict(POOL_PROFILES[profile])
+    options.update((name, value) for name, value in overrides.items() if value is not None)
+    if options['pool_size'] == 0:
+        options = {'poolclass': NullPool}
+    if profile == 'pgbouncer' and url.get_driver_name() in NO_PREPARED_STATEMENTS:
+        options['connect_args'] = dict(NO_PREPARED_STATEMENTS[url.get_driver_name()])
+    return options
+
+
+def engine_options_for(config, database_url):
+    """``engine_options`` for the profile and overrides set in an app config."""
+    overrides = {name: config.get(key) for name, key in POOL_SETTINGS.items()}
+    return engine_options(config.get('DB_POOL_PROFILE', 'pooled'), database_url, **overrides)
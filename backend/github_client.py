@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from backend.http_client import build_session
+from backend.oauth_client import OAuthClient
+
+GITHUB_TOKEN_URL = 'https://github.com/login/oauth/access_token'
+GITHUB_API_URL = 'https://api.github.com'
+
+
+class GitHubClient(OAuthClient):
+    """GitHub OAuth client: the code exchange plus the ``/user`` lookups.
+
+    ``/user`` and ``/user/emails`` are fetched concurrently.
+    """
+
+    def __init__(self, client_id, client_secret, redirect_uri, session=None,
+                 connect_timeout=3.05, read_timeout=10, api_url=GITHUB_API_URL,
+                 token_url=GITHUB_TOKEN_URL, max_workers=8, on_call=None):
+        super().__init__(client_id, client_secret, redirect_uri, token_url,
+                         session=session or build_session(pool_maxsize=max_workers * 2),
+                         connect_timeout=connect_timeout, read_timeout=read_timeout, on_call=on_call)
+        self.api_url = api_url
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='github')
+
+    def fetch_user(self, access_token):
+        """Fetch ``/user`` and ``/user/emails`` concurrently.
+
+        Returns ``(user_info, email)`` where ``email`` is the public email, or
+        else the primary verified one, or else the first verified one, or None.
+        A failed emails call only matters when ``/user`` has no public email.
+        """
+        headers = {
+            'Authorization': f'token {access_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+        user_future = self._executor.submit(self._call, 'user', 'get', f'{self.api_url}/user', headers=headers)
+        emails_future = self._executor.submit(self._call, 'emails', 'get', f'{self.api_url}/user/emails', headers=headers)
+
+        user_info = user_future.result()
+        email = user_info.get('email')
+        try:
+            emails_data = emails_future.result()
+        except requests.exceptions.RequestException:
+            if email:
+                return user_info, email
+            raise
+
+        if not email and emails_data and isinstance(emails_data, list):
+            primary_email_obj = next((e for e in emails_data if e.get('primary') and e.get('verified')), None)
+            if primary_email_obj:
+                email = primary_email_obj['email']
+            else: # Fallback to first verified email
+                verified_email_obj = next((e for e in emails_data if e.get('verified')), None)
+                if verified_email_obj:
+                    email = verified_email_obj['email']
+        return user_info, email
@@ -0,0 +1,118 @@
+import re
+import threading
+import time
+
+from google.auth import transport
+from google.auth.transport import requests as google_requests
+
+from backend.http_client import build_session
+
+# Google's signing certificates, as fetched by google.oauth2.id_token
+GOOGLE_OAUTH2_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_JWKS_URL = 'https://www.googleapis.com/oauth2/v3/certs'
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+_NO_CACHE_RE = re.compile(r'no-store|no-cache')
+
+
+class CachedResponse(transport.Response):
+    def __init__(self, status, headers, data):
+        self._status = status
+        self._headers = dict(headers)
+        self._data = data
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def headers(self):
+        return self._headers
+
+    @property
+    def data(self):
+        return self._data
+
+
+class _CacheEntry:
+    def __init__(self, response, refresh_at, expires_at):
+        self.response = response
+        self.refresh_at = refresh_at
+        self.expires_at = expires_at
+
+
+def cache_max_age(headers):
+    """Seconds a response may be cached for according to its Cache-Control header."""
+    cache_control = headers.get('Cache-Control') or headers.get('cache-control') or ''
+    if _NO_CACHE_RE.search(cache_control):
+        return 0
+    match = _MAX_AGE_RE.search(cache_control)
+    return int(match.group(1)) if match else 0
+
+
+class CachingRequest(transport.Request):
+    """google-auth transport that caches Google's signing certificates.
+
+    ``id_token.verify_oauth2_token`` downloads the certificate set on every
+    call. Passing this transport instead keeps the certs in memory for as long
+    as the response's Cache-Control max-age allows, refreshes them on a
+    background thread once they are within ``refresh_margin`` seconds (at
+    most half their lifetime) of expiring, and sends every real request over
+    one pooled keep-alive session. Verifying an ID token is then local crypto
+    only. Requests for URLs outside ``cacheable_urls`` pass straight through.
+    """
+
+    def __init__(self, session=None, cacheable_urls=(GOOGLE_OAUTH2_CERTS_URL, GOOGLE_JWKS_URL),
+                 refresh_margin=300, timeout=10):
+        self._request = google_requests.Request(session=session or build_session())
+        self.cacheable_urls = frozenset(cacheable_urls)
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def __call__(self, url, method='GET', body=None, headers=None, timeout=None, **kwargs):
+        if method != 'GET' or url not in self.cacheable_urls:
+            return self._request(url, method=method, body=body, headers=headers,
+                                 timeout=timeout or self.timeout, **kwargs)
+
+        entry = self._cache.get(url)
+        now = time.monotonic()
+        if entry is not None and now < entry.expires_at:
+            if now >= entry.refresh_at:
+                self._refresh_in_background(url)
+            return entry.response
+        return self._fetch(url)
+
+    def _fetch(self, url):
+        response = self._request(url, method='GET', timeout=self.timeout)
+        max_age = cache_max_age(response.headers)
+        cached = CachedResponse(response.status, response.headers, response.data)
+        if response.status == 200 and max_age > 0:
+            now = time.monotonic()
+            refresh_at = now + max_age - min(self.refresh_margin, max_age / 2)
+            with self._lock:
+                self._cache[url] = _CacheEntry(cached, refresh_at, now + max_age)
+        return cached
+
+    def _refresh_in_background(self, url):
+        with self._lock:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+
+        def refresh():
+            try:
+                self._fetch(url)
+            except Exception:
+                pass # Keep serving the cached copy; the next call past expiry fetches inline
+            finally:
+                with self._lock:
+                    self._refreshing.discard(url)
+
+        threading.Thread(target=refresh, name='google-certs-refresh', daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,27 @@
+"""gunicorn settings: ``gunicorn -c backend/gunicorn.conf.py backend.app:app``.
+
+Points prometheus_client at a shared directory so ``/metrics`` reports the
+sum over all workers (see backend/metrics.py).
+"""
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('GUNICORN_WORKERS', os.cpu_count() or 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Must be set before the workers import the app
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'loginauth-metrics'))
+
+
+def on_starting(server):
+    # Values left by a previous run would otherwise be added to this one's
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,299 @@
+import functools
+import os
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from backend.metrics import timed
+
+try:
+    import argon2
+except ImportError: # argon2-cffi is optional; bcrypt is always available
+    argon2 = None
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when the hashing pool has no room for another job."""
+
+
+# --- Password Hashers ---
+class BcryptHasher:
+    """bcrypt, with ``cost`` as the log2 number of rounds."""
+    name = 'bcrypt'
+    prefixes = ('$2a$', '$2b$', '$2y$')
+    default_cost = 12
+    min_cost = 4
+    max_cost = 31
+    max_password_bytes = 72
+    # $2b$12$ then 22 characters of salt and 31 of hash, 60 in all
+    _format = re.compile(r'\$2[aby]\$(\d\d)\$[./A-Za-z0-9]{53}\Z')
+
+    def __init__(self, cost=None):
+        self.cost = cost or self.default_cost
+
+    @classmethod
+    def is_well_formed(cls, password_hash):
+        match = cls._format.match(password_hash)
+        return match is not None and cls.min_cost <= int(match.group(1)) <= cls.max_cost
+
+    def _password_bytes(self, password):
+        # bcrypt only ever used the first 72 bytes; bcrypt 5 raises on more
+        # instead, so truncate as older releases did and their hashes expect
+        return password.encode('utf-8')[:self.max_password_bytes]
+
+    def hash(self, password):
+        return bcrypt.hashpw(self._password_bytes(password), bcrypt.gensalt(rounds=self.cost)).decode('utf-8')
+
+    def verify(self, password, password_hash):
+        if not self.is_well_formed(password_hash):
+            return False # bcrypt raises on it
+        return bcrypt.checkpw(self._password_bytes(password), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash):
+        # $2b$12$<salt+hash>
+        return not self.is_well_formed(password_hash) or int(password_hash.split('$')[2]) != self.cost
+
+
+class Argon2idHasher:
+    """argon2id, with ``cost`` as the time cost (number of passes)."""
+    name = 'argon2id'
+    prefixes = ('$argon2id$',)
+    default_cost = 3
+    min_cost = 1
+    max_cost = 64
+    max_password_bytes = None
+
+    def __init__(self, cost=None):
+        self.cost = cost or self.default_cost
+        self._hasher = argon2.PasswordHasher(time_cost=self.cost)
+
+    @classmethod
+    def is_well_formed(cls, password_hash):
+        try:
+            return argon2.extract_parameters(password_hash).type is argon2.Type.ID
+        except argon2.exceptions.InvalidHashError:
+            return False
+
+    def hash(self, password):
+        return self._hasher.hash(password)
+
+    def verify(self, password, password_hash):
+        try:
+            return self._hasher.verify(password_hash, password)
+        except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHashError):
+            return False # A mismatch, or a hash argon2 cannot decode
+
+    def needs_rehash(self, password_hash):
+        try:
+            return self._hasher.check_needs_rehash(password_hash)
+        except argon2.exceptions.InvalidHashError:
+            return True
+
+
+HASHERS = {BcryptHasher.name: BcryptHasher}
+if argon2 is not None:
+    HASHERS[Argon2idHasher.name] = Argon2idHasher
+
+DEFAULT_SCHEME = BcryptHasher.name
+
+
+@functools.lru_cache(maxsize=32)
+def get_hasher(scheme=DEFAULT_SCHEME, cost=None):
+    if scheme not in HASHERS:
+        raise ValueError(f'Unknown or unavailable password hasher: {scheme}')
+    return HASHERS[scheme](cost)
+
+
+def identify_hasher(password_hash):
+    """Return the default-cost hasher able to verify ``password_hash``, or None.
+
+    None also for a known prefix on a malformed hash, which no password matches.
+    """
+    for hasher_cls in HASHERS.values():
+        if password_hash.startswith(hasher_cls.prefixes):
+            return get_hasher(hasher_cls.name) if hasher_cls.is_well_formed(password_hash) else None
+    return None
+
+
+# These are plain module-level functions so they can be pickled and run in
+# the worker processes of the hashing pool.
+def hash_password(password, scheme=DEFAULT_SCHEME, cost=None):
+    return get_hasher(scheme, cost).hash(password)
+
+
+def check_password(password, password_hash):
+    if password_hash is None:
+        return False
+    hasher = identify_hasher(password_hash)
+    if hasher is None:
+        return False
+    return hasher.verify(password, password_hash)
+
+
+def needs_rehash(password_hash, scheme=DEFAULT_SCHEME, cost=None):
+    """True when ``password_hash`` was made with another algorithm or cost."""
+    if password_hash is None:
+        return False
+    hasher = get_hasher(scheme, cost)
+    if not password_hash.startswith(hasher.prefixes):
+        return True
+    return hasher.needs_rehash(password_hash)
+
+
+# --- Cost Calibration ---
+def measure_verify_ms(hasher, rounds=3):
+    """Median wall time in milliseconds of one verify with ``hasher``."""
+    password = 'calibration-password'
+    password_hash = hasher.hash(password)
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        hasher.verify(password, password_hash)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(scheme=DEFAULT_SCHEME, target_ms=50, rounds=3):
+    """Pick the highest cost whose verify time on this machine fits ``target_ms``.
+
+    Returns ``(cost, measured_ms, timings)`` where ``timings`` maps every cost
+    tried to its measured verify time. Never goes below the scheme's minimum.
+    """
+    hasher_cls = HASHERS[scheme]
+    best_cost, best_ms = hasher_cls.min_cost, None
+    timings = {}
+    for cost in range(hasher_cls.min_cost, hasher_cls.max_cost + 1):
+        elapsed_ms = measure_verify_ms(hasher_cls(cost), rounds=rounds)
+        timings[cost] = elapsed_ms
+        if elapsed_ms > target_ms:
+            break
+        best_cost, best_ms = cost, elapsed_ms
+    if best_ms is None:
+        best_ms = timings[hasher_cls.min_cost]
+    return best_cost, best_ms, timings
+
+
+# --- Hashing Executor ---
+class HashingExecutor:
+    """Runs password hashing in a process pool with a bounded backlog.
+
+    bcrypt and argon2 are deliberately CPU-expensive, so running it on the request thread
+    pins a WSGI worker for the whole hash cost. The executor hands the work to
+    a pool sized to the number of cores and refuses new jobs once
+    ``max_pending`` are queued or running, so callers can fail fast with a 503
+    instead of piling up behind the CPU.
+
+    ``max_workers=0`` runs every job inline on the calling thread, which is
+    what serverless deployments and the test suite want.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, timeout=None, scheme=DEFAULT_SCHEME, cost=None):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_pending is None:
+            max_pending = max(max_workers, 1) * 4
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.scheme = scheme
+        self.cost = cost
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        # Created lazily so the pool is forked from the serving process (e.g.
+        # a gunicorn worker) rather than from whatever imported this module.
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def _submit(self, fn, *args):
+        if self.max_workers == 0:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._get_pool().submit(fn, *args)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated('Hashing pool is saturated')
+        try:
+            future = self._submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job is done, not until the caller gives up
+        # on it: a job that timed out may still be running in a worker.
+        future.add_done_callback(lambda future: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel() # Only stops a job that has not started
+            raise HashingPoolSaturated('Timed out waiting for the hashing pool')
+
+    def hash_password(self, password):
+        with timed('password_hash', self.scheme):
+            return self.run(hash_password, password, self.scheme, self.cost)
+
+    def check_password(self, password, password_hash):
+        if password_hash is None:
+            return False
+        hasher = identify_hasher(password_hash)
+        with timed('password_verify', hasher.name if hasher else 'unknown'):
+            return self.run(check_password, password, password_hash)
+
+    def needs_rehash(self, password_hash):
+        # Only parses the hash, so it stays on the calling thread.
+        return needs_rehash(password_hash, self.scheme, self.cost)
+
+    def shutdown(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+def get_hashing_executor():
+    """Return the hashing executor for the current app, creating it on first use."""
+    executor = current_app.extensions.get('hashing_executor')
+    if executor is None:
+        executor = HashingExecutor(
+            max_workers=current_app.config.get('HASHING_WORKERS'),
+            max_pending=current_app.config.get('HASHING_MAX_PENDING'),
+            timeout=current_app.config.get('HASHING_TIMEOUT'),
+            scheme=current_app.config.get('PASSWORD_HASHER', DEFAULT_SCHEME),
+            cost=current_app.config.get('PASSWORD_HASH_COST'),
+        )
+        current_app.extensions['hashing_executor'] = executor
+    return executor
+
+
+# --- CLI ---
+hashing_cli = AppGroup('hashing', help='Password hashing utilities.')
+
+
+@hashing_cli.command('calibrate')
+@click.option('--scheme', type=click.Choice(sorted(HASHERS)), default=DEFAULT_SCHEME, show_default=True)
+@click.option('--target-ms', type=float, default=50, show_default=True, help='Target latency of one verify.')
+@click.option('--rounds', type=int, default=3, show_default=True, help='Measurements per cost.')
+def calibrate_command(scheme, target_ms, rounds):
+    """Measure this machine and pick the hash cost that fits a target verify latency."""
+    cost, elapsed_ms, timings = calibrate(scheme, target_ms, rounds)
+    for tried_cost, tried_ms in timings.items():
+        click.echo(f'{scheme} cost={tried_cost:<3} verify={tried_ms:8.1f} ms')
+    if elapsed_ms > target_ms:
+        click.echo(f'Warning: even the minimum cost takes {elapsed_ms:.1f} ms on this machine.', err=True)
+    click.echo(f'PASSWORD_HASHER={scheme}')
+    click.echo(f'PASSWORD_HASH_COST={cost}')
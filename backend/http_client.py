@@ -0,0 +1,16 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def build_session(pool_connections=10, pool_maxsize=20):
+    """Return a keep-alive ``requests.Session`` with a sized connection pool.
+
+    Sessions are thread-safe enough for the way we use them (independent
+    requests, no shared cookies) and reusing one avoids a fresh TCP + TLS
+    handshake with the provider on every call.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
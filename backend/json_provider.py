@@ -0,0 +1,56 @@
+"""orjson-backed JSON for request bodies and responses.
+
+``OrjsonProvider`` replaces Flask's stdlib ``json`` provider, so
+``request.get_json()`` and ``jsonify`` both go through orjson. The output
+matches the stdlib provider's compact form: keys are sorted, non-string keys
+are converted, and dates, decimals and the like still go through Flask's
+``default`` handler (dates become HTTP dates, not ISO strings). Only
+non-ASCII text differs, sent as UTF-8 rather than ``\\u`` escapes. Pretty
+printed output (debug mode, ``compact = False``) and calls with json.dumps
+arguments such as ``indent`` or ``cls`` fall back to the stdlib provider.
+
+``JSON_PROVIDER`` selects it: 'auto' (orjson when installed), 'orjson' or
+'stdlib'.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_COMPACT = (',', ':')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        return options | orjson.OPT_SORT_KEYS if self.sort_keys else options
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.pop('separators', _COMPACT) != _COMPACT or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        # orjson.JSONDecodeError is a ValueError, which is what request.get_json() handles
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def json_provider_class(name):
+    if name == 'stdlib' or (name == 'auto' and orjson is None):
+        return DefaultJSONProvider
+    if name in ('auto', 'orjson'):
+        if orjson is None:
+            raise RuntimeError("JSON_PROVIDER='orjson' needs the orjson package")
+        return OrjsonProvider
+    raise ValueError(f'Unknown JSON_PROVIDER: {name}')
@@ -0,0 +1,146 @@
+"""Prometheus metrics, served at ``/metrics``.
+
+Two histograms:
+- ``http_request_duration_seconds{method, route, status}``: whole requests, by URL rule.
+- ``auth_stage_duration_seconds{stage, operation}``: the stages inside a request,
+  so a latency spike can be pinned on one of them:
+  - ``password_hash`` / ``password_verify`` (operation: hasher scheme), timed on
+    the request thread, so it includes any wait for the hashing pool;
+  - ``db_query`` (operation: select/insert/update/delete/other), per statement;
+  - ``provider_http`` (operation: ``<provider>:<call>``, e.g. ``github:user``);
+  - ``jwt_encode`` (operation: token type).
+
+And three counters:
+- ``user_cache_lookups_total{kind, result}``: lookups in the user cache
+  (backend/user_cache.py) by key kind, hit or miss;
+- ``auth_events_total{result}``: audit log events (backend/auth_events.py),
+  written or dropped;
+- ``login_rate_limit_total{result, scope}``: login limiter decisions
+  (backend/rate_limit.py), allowed or throttled, and the scope that
+  throttled them (``none`` when allowed).
+
+With several gunicorn workers, each worker keeps its own values, and a
+scrape lands on any one of them. Set ``PROMETHEUS_MULTIPROC_DIR`` to an empty
+directory before the app is imported: workers then write their values to
+files there, and ``/metrics`` sums them over all workers, live and exited.
+backend/gunicorn.conf.py does this.
+
+Needs prometheus_client. Without it, or with ``METRICS_ENABLED = False``,
+the timers are no-ops and there is no ``/metrics`` route.
+"""
+import contextlib
+import os
+import time
+
+from flask import Response, g, request
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_KINDS = ('select', 'insert', 'update', 'delete')
+
+if prometheus_client is not None:
+    REQUEST_DURATION = prometheus_client.Histogram(
+        'http_request_duration_seconds', 'Request latency by route.', ['method', 'route', 'status'])
+    STAGE_DURATION = prometheus_client.Histogram(
+        'auth_stage_duration_seconds', 'Latency of the stages within a request.', ['stage', 'operation'],
+        buckets=STAGE_BUCKETS)
+    USER_CACHE_LOOKUPS = prometheus_client.Counter(
+        'user_cache_lookups_total', 'User cache lookups by key kind and result.', ['kind', 'result'])
+    AUTH_EVENTS = prometheus_client.Counter(
+        'auth_events_total', 'Audit log events by what became of them.', ['result'])
+    LOGIN_RATE_LIMIT = prometheus_client.Counter(
+        'login_rate_limit_total', 'Login rate limiter decisions by result and throttling scope.',
+        ['result', 'scope'])
+
+
+def observe_stage(stage, operation, seconds):
+    if prometheus_client is not None:
+        STAGE_DURATION.labels(stage, operation).observe(seconds)
+
+
+def count_user_cache_lookup(kind, result):
+    if prometheus_client is not None:
+        USER_CACHE_LOOKUPS.labels(kind, result).inc()
+
+
+def count_auth_events(result, count):
+    if prometheus_client is not None and count:
+        AUTH_EVENTS.labels(result).inc(count)
+
+
+def count_login_rate_limit(result, scope):
+    if prometheus_client is not None:
+        LOGIN_RATE_LIMIT.labels(result, scope).inc()
+
+
+@contextlib.contextmanager
+def timed(stage, operation):
+    """Time the enclosed block as ``stage``/``operation``, whether or not it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, operation, time.perf_counter() - started)
+
+
+def provider_call_observer(provider_name):
+    """An ``on_call`` hook for OAuthClient that times each call to the provider."""
+    def on_call(name, elapsed_ms, ok):
+        observe_stage('provider_http', f'{provider_name}:{name}', elapsed_ms / 1000)
+    return on_call
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is not None:
+        kind = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else 'other'
+        observe_stage('db_query', kind if kind in QUERY_KINDS else 'other', time.perf_counter() - started)
+
+
+def _start_request_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        REQUEST_DURATION.labels(request.method, route, str(response.status_code)).observe(
+            time.perf_counter() - started)
+    return response
+
+
+def metrics_registry():
+    """The registry to expose: every worker's values in multiprocess mode, else this process's."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def metrics_view():
+    return Response(prometheus_client.generate_latest(metrics_registry()),
+                    mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app, db):
+    """Time requests and queries for ``app`` and add the ``/metrics`` route."""
+    if prometheus_client is None or not app.config.get('METRICS_ENABLED', True):
+        return
+    from sqlalchemy import event
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule('/metrics', view_func=metrics_view, methods=['GET'])
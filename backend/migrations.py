@@ -0,0 +1,150 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+from backend.models import db, AuthEvent, User, RefreshToken, RevokedToken
+
+migrations_cli = AppGroup('migrations', help='One-off data migrations.')
+
+# Columns carried over from a duplicate account to the surviving one when the
+# survivor has no value of its own
+MERGED_COLUMNS = ('password_hash', 'username', 'google_id', 'github_id')
+
+_DUPLICATE_EMAILS_SQL = text('''
+SELECT lower(trim(email)) AS normalized FROM users
+GROUP BY lower(trim(email)) HAVING count(*) > 1
+''')
+_BATCH_IDS_SQL = text('SELECT id FROM users WHERE id > :after_id ORDER BY id LIMIT :batch_size')
+_BACKFILL_SQL = text('''
+UPDATE users SET email = lower(trim(email))
+WHERE id BETWEEN :first_id AND :last_id AND email <> lower(trim(email))
+''')
+
+_CREATE_INDEX_SQL = text('CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email_lower ON users (lower(email))')
+# The listing's keyset has no place for a NULL created_at; older tables allowed one
+_BACKFILL_CREATED_AT_SQL = text('UPDATE users SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) '
+                                'WHERE created_at IS NULL')
+_CREATED_AT_NOT_NULL_SQL = text('ALTER TABLE users ALTER COLUMN created_at SET NOT NULL')
+# Mirrors the ix_users_*created_at_id indexes in backend/models.py
+_CREATE_LISTING_INDEXES_SQL = [
+    text('CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)'),
+    text('CREATE INDEX IF NOT EXISTS ix_users_google_created_at_id ON users (created_at, id) '
+         'WHERE google_id IS NOT NULL'),
+    text('CREATE INDEX IF NOT EXISTS ix_users_github_created_at_id ON users (created_at, id) '
+         'WHERE github_id IS NOT NULL'),
+]
+
+
+def merge_duplicate_emails():
+    """Fold accounts whose emails differ only by case/whitespace into the oldest one.
+
+    The oldest account (lowest id) survives; it inherits any sign-in method
+    or username it lacks and the duplicates' refresh tokens. Returns the
+    number of accounts removed.
+    """
+    removed = 0
+    for normalized in db.session.execute(_DUPLICATE_EMAILS_SQL).scalars().all():
+        survivor, *duplicates = (User.query
+                                 .filter(db.func.lower(db.func.trim(User.email)) == normalized)
+                                 .order_by(User.id).all())
+        carried = {}
+        for duplicate in duplicates:
+            for column in MERGED_COLUMNS:
+                if getattr(survivor, column) is None and carried.get(column) is None:
+                    carried[column] = getattr(duplicate, column)
+            RefreshToken.query.filter_by(user_id=duplicate.id).update({'user_id': survivor.id})
+            db.session.delete(duplicate)
+        # Duplicates go first so the carried values are free under the unique constraints
+        db.session.flush()
+        for column, value in carried.items():
+            setattr(survivor, column, value)
+        survivor.email = normalized
+        db.session.commit()
+        removed += len(duplicates)
+    return removed
+
+
+def backfill_normalized_emails(batch_size=1000):
+    """Lower-case and trim every stored email, one keyset batch per transaction.
+
+    Returns the number of rows rewritten.
+    """
+    updated = 0
+    after_id = 0
+    while True:
+        ids = db.session.execute(_BATCH_IDS_SQL, {'after_id': after_id, 'batch_size': batch_size}).scalars().all()
+        if not ids:
+            return updated
+        result = db.session.execute(_BACKFILL_SQL, {'first_id': ids[0], 'last_id': ids[-1]})
+        db.session.commit()
+        updated += result.rowcount
+        after_id = ids[-1]
+
+
+def create_email_index():
+    """Create the lower(email) unique index if it is missing."""
+    db.session.execute(_CREATE_INDEX_SQL)
+    db.session.commit()
+
+
+@migrations_cli.command('normalize-emails')
+@click.option('--batch-size', type=int, default=1000, show_default=True, help='Rows rewritten per transaction.')
+def normalize_emails_command(batch_size):
+    """Merge case-variant duplicate accounts, lower-case stored emails and add the lower(email) index."""
+    removed = merge_duplicate_emails()
+    click.echo(f'Merged {removed} duplicate account(s).')
+    updated = backfill_normalized_emails(batch_size)
+    click.echo(f'Normalized {updated} email(s).')
+    create_email_index()
+    click.echo('Index ix_users_email_lower is in place.')
+
+
+def create_listing_indexes():
+    """Require users.created_at and create the (created_at, id) indexes behind the admin user listing.
+
+    Returns the number of created_at values backfilled.
+    """
+    backfilled = db.session.execute(_BACKFILL_CREATED_AT_SQL).rowcount
+    # SQLite cannot add NOT NULL to an existing column; the backfill has to do there
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(_CREATED_AT_NOT_NULL_SQL)
+    for statement in _CREATE_LISTING_INDEXES_SQL:
+        db.session.execute(statement)
+    db.session.commit()
+    return backfilled
+
+
+@migrations_cli.command('listing-indexes')
+def listing_indexes_command():
+    """Require users.created_at and add the indexes used to page through and export users."""
+    backfilled = create_listing_indexes()
+    click.echo(f'Backfilled {backfilled} missing created_at value(s).')
+    click.echo('Listing indexes are in place.')
+
+
+def create_auth_events_table():
+    """Create the auth_events table and its indexes if they are missing."""
+    AuthEvent.__table__.create(db.engine, checkfirst=True)
+
+
+@migrations_cli.command('auth-events-table')
+def auth_events_table_command():
+    """Add the table behind the sign-in audit log."""
+    create_auth_events_table()
+    click.echo('Table auth_events is in place.')
+
+
+def create_token_tables():
+    """Create the refresh_tokens and revoked_tokens tables and their indexes if they are missing."""
+    for table in (RefreshToken.__table__, RevokedToken.__table__):
+        table.create(db.engine, checkfirst=True)
+        # Indexes added since the table was first created
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+@migrations_cli.command('token-tables')
+def token_tables_command():
+    """Add the tables behind refresh token rotation and revocation."""
+    create_token_tables()
+    click.echo('Tables refresh_tokens and revoked_tokens are in place.')
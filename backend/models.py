@@ -0,0 +1,109 @@
+import re
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
+
+from backend import hashing
+
+db = SQLAlchemy()
+
+# Basic regex for email validation
+_EMAIL_RE = re.compile(r"[^@]+@[^@]+\.[^@]+")
+
+def is_valid_email(email):
+    """Basic email validation."""
+    if not email:
+        return False
+    return _EMAIL_RE.match(email) is not None
+
+def normalize_email(email):
+    """Canonical stored form of an email address: trimmed and lower-cased."""
+    return email.strip().lower() if email else email
+
+# --- Database Model ---
+class User(db.Model):
+    __tablename__ = 'users'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    username = db.Column(db.String(255), unique=True, nullable=True)
+    email = db.Column(db.String(255), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=True)
+    google_id = db.Column(db.String(255), unique=True, nullable=True)
+    github_id = db.Column(db.String(255), unique=True, nullable=True)
+    # NOT NULL: the admin listing pages on (created_at, id)
+    created_at = db.Column(db.TIMESTAMP, nullable=False, server_default=db.func.current_timestamp())
+    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    @validates('email')
+    def _normalize_email(self, key, email):
+        return normalize_email(email)
+
+    @classmethod
+    def find_by_email(cls, email):
+        """Case-insensitive lookup served by the ix_users_email_lower index."""
+        return cls.query.filter(db.func.lower(cls.email) == normalize_email(email)).first()
+
+    # These hash on the calling thread. Request handlers go through
+    # get_hashing_executor() instead so bcrypt runs in the hashing pool.
+    def set_password(self, password):
+        self.password_hash = hashing.hash_password(password)
+
+    def check_password(self, password):
+        return hashing.check_password(password, self.password_hash)
+
+    def __repr__(self):
+        return f'<User {self.email}>'
+
+# Emails are stored normalized; this index makes case-insensitive lookups
+# (lower(email) = ...) an index probe and keeps Foo@x.com / foo@x.com from
+# becoming separate accounts.
+db.Index('ix_users_email_lower', db.func.lower(User.email), unique=True)
+
+# Keyset pagination of the admin user listing walks (created_at, id); the
+# partial indexes serve the same walk filtered to accounts linked to a provider.
+db.Index('ix_users_created_at_id', User.created_at, User.id)
+db.Index('ix_users_google_created_at_id', User.created_at, User.id,
+         postgresql_where=User.google_id.isnot(None), sqlite_where=User.google_id.isnot(None))
+db.Index('ix_users_github_created_at_id', User.created_at, User.id,
+         postgresql_where=User.github_id.isnot(None), sqlite_where=User.github_id.isnot(None))
+
+class RefreshToken(db.Model):
+    __tablename__ = 'refresh_tokens'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # Only the SHA-256 of the token is stored
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    # All tokens rotated from one sign-in share a family; it is the access tokens' 'sid'
+    family_id = db.Column(db.String(32), nullable=False, index=True)
+    expires_at = db.Column(db.TIMESTAMP, nullable=False)
+    revoked_at = db.Column(db.TIMESTAMP, nullable=True)
+    created_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+
+    # Append-only feed that every process replays into its in-memory RevocationList
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    token_id = db.Column(db.String(64), nullable=False)
+    expires_at = db.Column(db.TIMESTAMP, nullable=False)
+    # Synced on; see RevocationList in backend/tokens.py
+    revoked_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), index=True)
+
+class AuthEvent(db.Model):
+    __tablename__ = 'auth_events'
+
+    # Append-only audit trail of sign-ins, written in batches by backend/auth_events.py
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    event_type = db.Column(db.String(32), nullable=False)
+    # No foreign key: rows are written after the fact, and outlive the accounts they mention
+    user_id = db.Column(db.Integer, nullable=True)
+    email = db.Column(db.String(255), nullable=True)
+    provider = db.Column(db.String(32), nullable=True)
+    ip_address = db.Column(db.String(45), nullable=True)
+    user_agent = db.Column(db.String(255), nullable=True)
+    # When the event happened, not when its batch was written
+    created_at = db.Column(db.TIMESTAMP, nullable=False)
+
+db.Index('ix_auth_events_user_id_created_at', AuthEvent.user_id, AuthEvent.created_at)
+db.Index('ix_auth_events_created_at', AuthEvent.created_at)
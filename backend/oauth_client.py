@@ -0,0 +1,74 @@
+import threading
+import time
+
+from backend.http_client import build_session
+
+
+class CallStats:
+    """Running latency totals for each named upstream call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def record(self, name, elapsed_ms, ok):
+        with self._lock:
+            stats = self._calls.setdefault(name, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['count'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            if not ok:
+                stats['errors'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._calls.items()}
+
+
+class OAuthClient:
+    """OAuth 2.0 authorization-code exchange over a pooled keep-alive session.
+
+    One instance is reused for every sign-in with a provider. Every call
+    carries a (connect, read) timeout so a slow provider cannot pin a worker
+    indefinitely, and each call's latency is recorded in ``stats`` (and
+    passed to ``on_call`` if given).
+    """
+
+    def __init__(self, client_id, client_secret, redirect_uri, token_url, session=None,
+                 connect_timeout=3.05, read_timeout=10, on_call=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.token_url = token_url
+        self.session = session or build_session()
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats = CallStats()
+        self.on_call = on_call
+
+    def _call(self, name, method, url, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = getattr(self.session, method)(url, timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+            ok = True
+            return response.json()
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.stats.record(name, elapsed_ms, ok)
+            if self.on_call is not None:
+                self.on_call(name, elapsed_ms, ok)
+
+    def exchange_code(self, code):
+        """Exchange an authorization code; returns the provider's token response JSON."""
+        return self._call(
+            'token', 'post', self.token_url,
+            data={
+                'grant_type': 'authorization_code',
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'code': code,
+                'redirect_uri': self.redirect_uri
+            },
+            headers={'Accept': 'application/json'}
+        )
@@ -0,0 +1,172 @@
+"""Signed OAuth ``state`` values, verifiable by any node without shared storage.
+
+The state sent to the provider is a compact token: a base64url JSON payload
+and a truncated HMAC-SHA256 of it under a key derived from ``SECRET_KEY``.
+
+    eyJwIjoiZ2l0aHViIiwibiI6IlpiM2txMXhKbThRdzlQZVIiLCJlIjoxNzAwMDAwNjAwfQ.HXkPQu0P3tY1sWJ7Ga_Gxw
+
+The payload holds the provider, a random nonce, an expiry
+(``OAUTH_STATE_TTL_SECONDS`` after issue) and, optionally, the frontend path
+to return to. The callback checks the signature, provider and expiry. Any
+node holding the same SECRET_KEY can do that, so sign-ins need neither
+sticky sessions nor a session store.
+
+With ``OAUTH_STATE_COOKIE`` on, the authorize redirect also sets the nonce in
+a short-lived cookie scoped to the provider's routes. The callback only
+accepts the state from the browser that started the flow, which stops
+login CSRF.
+
+Each process also remembers the nonces it has accepted until they expire,
+and rejects a state seen twice. This replay guard is per process: a replay
+to another node is only stopped by the state's expiry, the cookie, and the
+provider's single-use authorization codes.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+
+# Holds the nonce of the sign-in this browser started, see OAUTH_STATE_COOKIE
+NONCE_COOKIE = 'oauth_nonce'
+SIGNATURE_BYTES = 16
+
+
+class InvalidOAuthState(ValueError):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def is_safe_return_path(path):
+    """Only paths on the frontend itself; ``//host`` and ``/\\host`` would leave it."""
+    return (isinstance(path, str) and path.startswith('/') and not path.startswith(('//', '/\\'))
+            and len(path) <= 512)
+
+
+class SeenNonces:
+    """Expiring set of accepted nonces, bounded to ``maxsize`` entries."""
+
+    def __init__(self, maxsize=100000, clock=time.time):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._expires = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, nonce, expires_at):
+        """Record ``nonce``; False if it was already recorded and has not expired."""
+        now = self.clock()
+        with self._lock:
+            # Insertion order is close to expiry order, so expired entries sit at the front
+            while self._expires and next(iter(self._expires.values())) <= now:
+                self._expires.popitem(last=False)
+            seen = self._expires.get(nonce)
+            if seen is not None and seen > now:
+                return False
+            self._expires[nonce] = expires_at
+            while len(self._expires) > self.maxsize:
+                self._expires.popitem(last=False)
+            return True
+
+    def __len__(self):
+        return len(self._expires)
+
+
+class OAuthStateSigner:
+    def __init__(self, secret, ttl=600, bind_to_cookie=True, seen=None, clock=time.time):
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        # Its own key, so these MACs are never valid for anything else signed with SECRET_KEY
+        self._key = hmac.new(secret, b'oauth-state', hashlib.sha256).digest()
+        self.ttl = ttl
+        self.bind_to_cookie = bind_to_cookie
+        self.seen = seen if seen is not None else SeenNonces(clock=clock)
+        self.clock = clock
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['SECRET_KEY'], ttl=config['OAUTH_STATE_TTL_SECONDS'],
+                   bind_to_cookie=config['OAUTH_STATE_COOKIE'],
+                   seen=SeenNonces(maxsize=config['OAUTH_STATE_REPLAY_CACHE_SIZE']))
+
+    def _sign(self, payload):
+        return _b64encode(hmac.new(self._key, payload.encode('utf-8'), hashlib.sha256).digest()[:SIGNATURE_BYTES])
+
+    def issue(self, provider, return_to=None):
+        """Return ``(state, nonce)`` for a sign-in with ``provider``."""
+        nonce = secrets.token_urlsafe(12)
+        claims = {'p': provider, 'n': nonce, 'e': int(self.clock() + self.ttl)}
+        if return_to:
+            claims['r'] = return_to
+        payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+        return f'{payload}.{self._sign(payload)}', nonce
+
+    def verify(self, state, provider, cookie_nonce=None):
+        """Check a callback's state; returns the return path it carries, if any.
+
+        ``cookie_nonce`` is the browser's nonce cookie, which must match the
+        state's when ``bind_to_cookie`` is set.
+        """
+        if not state or not isinstance(state, str) or state.count('.') != 1:
+            raise InvalidOAuthState('malformed')
+        payload, signature = state.split('.')
+        if not hmac.compare_digest(signature.encode('utf-8'), self._sign(payload).encode('ascii')):
+            raise InvalidOAuthState('bad signature')
+        claims = json.loads(_b64decode(payload))
+        if claims.get('p') != provider:
+            raise InvalidOAuthState('issued for another provider')
+        if claims['e'] <= self.clock():
+            raise InvalidOAuthState('expired')
+        if self.bind_to_cookie and not hmac.compare_digest((cookie_nonce or '').encode('utf-8'),
+                                                           claims['n'].encode('ascii')):
+            raise InvalidOAuthState('not started by this browser')
+        # Last, so only states that are otherwise valid take up room in the set
+        if not self.seen.add(claims['n'], claims['e']):
+            raise InvalidOAuthState('replayed')
+        return claims.get('r')
+
+
+def get_state_signer():
+    """Return the state signer for the current app, creating it on first use."""
+    signer = current_app.extensions.get('oauth_state')
+    if signer is None:
+        signer = OAuthStateSigner.from_config(current_app.config)
+        current_app.extensions['oauth_state'] = signer
+    return signer
+
+
+def cookie_path(provider):
+    # Covers /api/auth/<provider> and /api/auth/<provider>/callback only
+    return f'/api/auth/{provider}'
+
+
+def start_sign_in(response, provider, nonce):
+    """Bind the flow to this browser: set the nonce cookie on the authorize redirect."""
+    if current_app.config['OAUTH_STATE_COOKIE']:
+        response.set_cookie(NONCE_COOKIE, nonce, max_age=int(current_app.config['OAUTH_STATE_TTL_SECONDS']),
+                            path=cookie_path(provider), secure=request.is_secure, httponly=True, samesite='Lax')
+    return response
+
+
+def verify_callback_state(provider):
+    """Verify the current callback request's state; returns its return path, if any."""
+    return get_state_signer().verify(request.args.get('state'), provider, request.cookies.get(NONCE_COOKIE))
+
+
+def finish_sign_in(response, provider):
+    """Drop the nonce cookie; it has been used."""
+    if current_app.config['OAUTH_STATE_COOKIE']:
+        response.delete_cookie(NONCE_COOKIE, path=cookie_path(provider), secure=request.is_secure,
+                               httponly=True, samesite='Lax')
+    return response
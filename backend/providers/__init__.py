@@ -0,0 +1,149 @@
+"""OAuth provider registry and lazily loaded provider routes.
+
+Each provider is described by a spec: which config keys hold its client
+credentials and endpoints, its scopes, the client class that performs the
+code exchange and the function that turns a token response into an
+identity. ``get_provider`` builds an ``OAuthProvider`` from the spec once
+per app; requests then only append ``state`` to a pre-encoded authorize URL
+and reuse the provider's client.
+
+The routes are registered up front but point at ``LazyView`` stand-ins, so
+the views and the client libraries they need (google-auth, requests) are
+only imported when a provider route is first hit.
+
+Another provider is one more entry in ``OAUTH_PROVIDERS`` in the app config
+(merged over ``PROVIDERS``) plus a ``<name>_id`` column on users, see
+``backend.services.PROVIDER_COLUMNS``.
+"""
+import secrets
+from types import MappingProxyType
+from urllib.parse import quote, urlencode
+
+from flask import current_app
+from werkzeug.utils import cached_property, import_string
+
+from backend.metrics import provider_call_observer
+
+PROVIDERS = {
+    'google': {
+        'label': 'Google',
+        # OAuthProvider setting -> app config key
+        'settings': {
+            'client_id': 'GOOGLE_CLIENT_ID',
+            'client_secret': 'GOOGLE_CLIENT_SECRET',
+            'redirect_uri': 'GOOGLE_REDIRECT_URI',
+            'authorize_url': 'GOOGLE_AUTH_URI',
+            'token_url': 'GOOGLE_TOKEN_URI',
+            'certs_url': 'GOOGLE_CERTS_URL',
+        },
+        'scopes': [
+            'openid',
+            'https://www.googleapis.com/auth/userinfo.email',
+            'https://www.googleapis.com/auth/userinfo.profile',
+        ],
+        'authorize_params': {'access_type': 'offline', 'include_granted_scopes': 'true'},
+        'issuers': ['accounts.google.com', 'https://accounts.google.com'],
+        'client': 'backend.oauth_client.OAuthClient',
+        'identity': 'backend.providers.oidc.load_identity',
+        'missing_email_message': 'Email not provided by Google.',
+    },
+    'github': {
+        'label': 'GitHub',
+        'settings': {
+            'client_id': 'GITHUB_CLIENT_ID',
+            'client_secret': 'GITHUB_CLIENT_SECRET',
+            'redirect_uri': 'GITHUB_REDIRECT_URI',
+            'token_url': 'GITHUB_TOKEN_URL',
+            'api_url': 'GITHUB_API_URL',
+        },
+        'authorize_url': 'https://github.com/login/oauth/authorize',
+        # user:email for private emails, read:user for profile
+        'scopes': ['user:email', 'read:user'],
+        'client': 'backend.github_client.GitHubClient',
+        'client_settings': ['api_url'],
+        'identity': 'backend.providers.github.load_identity',
+        'missing_email_message': 'Could not retrieve a verified email from GitHub. Please ensure you have a primary, verified email set on GitHub.',
+    },
+}
+
+
+class OAuthProvider:
+    """Immutable settings of one provider, plus its reusable token-exchange client."""
+
+    def __init__(self, name, spec, config):
+        options = {key: value for key, value in spec.items() if key != 'settings'}
+        options.update((setting, config[key]) for setting, key in spec.get('settings', {}).items())
+        self.name = name
+        self.label = options.get('label', name.title())
+        self.options = MappingProxyType(options)
+        self.timeouts = (config['OAUTH_CONNECT_TIMEOUT'], config['OAUTH_READ_TIMEOUT'])
+        # Everything but the per-request state, encoded once
+        query = urlencode({
+            'response_type': 'code',
+            'client_id': options['client_id'],
+            'redirect_uri': options['redirect_uri'],
+            'scope': ' '.join(options.get('scopes', ())),
+            **options.get('authorize_params', {}),
+        })
+        self._authorize_base = f"{options['authorize_url']}?{query}&state="
+
+    def authorize_url(self, state=None):
+        return self._authorize_base + quote(state or secrets.token_urlsafe(16))
+
+    @cached_property
+    def client(self):
+        client_class = import_string(self.options['client'])
+        extra = {setting: self.options[setting] for setting in self.options.get('client_settings', ())}
+        return client_class(
+            self.options['client_id'], self.options['client_secret'], self.options['redirect_uri'],
+            token_url=self.options['token_url'],
+            connect_timeout=self.timeouts[0], read_timeout=self.timeouts[1],
+            on_call=provider_call_observer(self.name),
+            **extra
+        )
+
+    @cached_property
+    def load_identity(self):
+        """``load_identity(provider, token_json)`` -> ``(provider_id, email, username or None)``."""
+        return import_string(self.options['identity'])
+
+
+def provider_specs(config):
+    return {**PROVIDERS, **config.get('OAUTH_PROVIDERS', {})}
+
+
+def get_provider(name):
+    """Return the provider ``name`` for the current app, building the registry on first use."""
+    registry = current_app.extensions.get('oauth_providers')
+    if registry is None:
+        registry = {
+            provider_name: OAuthProvider(provider_name, spec, current_app.config)
+            for provider_name, spec in provider_specs(current_app.config).items()
+        }
+        current_app.extensions['oauth_providers'] = registry
+    return registry[name]
+
+
+class LazyView:
+    """A view function that imports the real one on its first call."""
+
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def register_provider_routes(app):
+    for name in provider_specs(app.config):
+        app.add_url_rule(f'/api/auth/{name}', endpoint=f'auth_{name}',
+                         view_func=LazyView('backend.providers.views.authorize'),
+                         methods=['GET'], defaults={'provider': name})
+        app.add_url_rule(f'/api/auth/{name}/callback', endpoint=f'auth_{name}_callback',
+                         view_func=LazyView('backend.providers.views.callback'),
+                         methods=['GET'], defaults={'provider': name})
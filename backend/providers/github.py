@@ -0,0 +1,8 @@
+"""Identity from GitHub's REST API."""
+
+def load_identity(provider, token_json):
+    """Fetch the GitHub user; returns ``(github_id, email, login)``."""
+    # Fetch user info and emails from GitHub API (concurrently)
+    user_info, email = provider.client.fetch_user(token_json['access_token'])
+    github_id = str(user_info.get('id')) # Ensure github_id is stored as string
+    return github_id, email, user_info.get('login')
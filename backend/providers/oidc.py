@@ -0,0 +1,32 @@
+"""Identity from an OpenID Connect ID token (Google)."""
+from google.oauth2 import id_token
+from backend.google_certs import CachingRequest
+from backend.http_client import build_session
+
+# certs URL -> transport that caches the provider's signing certs per their
+# Cache-Control max-age over a pooled keep-alive session, so verifying an ID
+# token does not cost an outbound round trip.
+_cert_requests = {}
+
+def cert_request(certs_url):
+    request = _cert_requests.get(certs_url)
+    if request is None:
+        request = _cert_requests.setdefault(
+            certs_url, CachingRequest(session=build_session(), cacheable_urls=[certs_url]))
+    return request
+
+def load_identity(provider, token_json):
+    """Verify the ID token in a token response; returns ``(sub, email, None)``."""
+    token = token_json.get('id_token')
+    if not token:
+        raise ValueError(f'No ID token in the {provider.label} token response.')
+
+    certs_url = provider.options['certs_url']
+    id_info = id_token.verify_token(token, cert_request(certs_url),
+                                    audience=provider.options['client_id'], certs_url=certs_url)
+    issuers = provider.options.get('issuers')
+    if issuers and id_info.get('iss') not in issuers:
+        raise ValueError(f"Wrong issuer. 'iss' should be one of the following: {issuers}")
+
+    # The username defaults to the email's local part
+    return id_info.get('sub'), id_info.get('email'), None
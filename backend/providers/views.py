@@ -0,0 +1,73 @@
+"""Sign-in views shared by every OAuth provider. Imported on first use."""
+from flask import request, jsonify, redirect
+import requests
+from backend.app import (app, db, issue_tokens, frontend_token_redirect_url, frontend_error_redirect_url,
+                         set_refresh_cookie)
+from backend.auth_events import OAUTH_EVENTS, record_auth_event
+from backend.oauth_state import (InvalidOAuthState, finish_sign_in, get_state_signer, is_safe_return_path,
+                                 start_sign_in, verify_callback_state)
+from backend.providers import get_provider
+from backend.user_cache import resolve_oauth_user_cached
+
+
+def authorize(provider):
+    # ``next`` is where the frontend goes after signing in; it travels in the signed state
+    return_to = request.args.get('next')
+    if return_to is not None and not is_safe_return_path(return_to):
+        return jsonify({'message': 'Invalid return path.'}), 400
+    state, nonce = get_state_signer().issue(provider, return_to)
+    return start_sign_in(redirect(get_provider(provider).authorize_url(state)), provider, nonce)
+
+
+def callback(provider):
+    provider = get_provider(provider)
+    code = request.args.get('code')
+
+    if not code:
+        return jsonify({'message': 'Authorization code not found.'}), 400
+
+    try:
+        return_to = verify_callback_state(provider.name)
+    except InvalidOAuthState as e:
+        app.logger.warning(f"Rejected {provider.label} OAuth callback: {e}")
+        return jsonify({'message': 'Invalid or expired sign-in attempt. Please sign in again.'}), 400
+
+    try:
+        # Exchange code for token
+        token_json = provider.client.exchange_code(code)
+        if not token_json.get('access_token'):
+            error_description = token_json.get('error_description', f'{provider.label} token exchange failed.')
+            return jsonify({'message': error_description}), 500
+
+        provider_id, email, username = provider.load_identity(provider, token_json)
+        if not email:
+            message = provider.options.get('missing_email_message', f'Email not provided by {provider.label}.')
+            return jsonify({'message': message}), 400
+
+        # Look up by provider ID, else link by email, else create (one statement on Postgres).
+        # Returning users are usually answered from the user cache.
+        user = resolve_oauth_user_cached(provider.name, provider_id, email, username or email.split('@')[0])
+
+        # Redirect to frontend with the access token in the URL hash/fragment and
+        # the refresh token in its cookie
+        app_access_token, refresh_token = issue_tokens(user)
+        # Cached users are returning ones
+        record_auth_event(OAUTH_EVENTS[getattr(user, 'outcome', 'existing')], user_id=user.id, email=user.email,
+                          provider=provider.name)
+        response = redirect(frontend_token_redirect_url(app_access_token, return_to))
+        return finish_sign_in(set_refresh_cookie(response, refresh_token), provider.name)
+
+    except requests.exceptions.RequestException as re:
+        app.logger.error(f"{provider.label} OAuth request failed: {re}")
+        return jsonify({'message': f'Communication error with {provider.label}: {str(re)}'}), 502 # Bad Gateway
+    except ValueError as ve: # ID token verification errors
+        app.logger.error(f"{provider.label} ID token verification failed: {ve}")
+        return jsonify({'message': f'{provider.label} authentication failed: {str(ve)}'}), 401
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error during {provider.label} OAuth callback: {e}")
+        # Be careful not to expose too much error detail to the client
+        error_message = f'An error occurred during {provider.label} authentication.'
+        if app.debug:
+            error_message = f'An error occurred during {provider.label} authentication: {str(e)}'
+        return redirect(frontend_error_redirect_url(error_message))
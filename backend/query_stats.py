@@ -0,0 +1,105 @@
+"""Per-request SQL statement counts and timings.
+
+Engine events feed every statement, with its duration, to the recorders
+open on the current thread. ``record_queries()`` opens one around any
+block of code. When ``QUERY_STATS_HEADERS`` is on (by default, whenever the
+app runs in debug mode), each request is recorded and the response carries
+
+    X-Query-Count: 3
+    Server-Timing: db;dur=1.84;desc="3 queries"
+
+The same numbers go to the debug log. backend/tests/query_budget.py builds
+on ``record_queries`` to fail tests that go over an endpoint's query budget.
+"""
+import contextlib
+import threading
+import time
+
+from flask import current_app, g, request
+
+_local = threading.local()
+
+
+class QueryRecorder:
+    """Statement count and total time; the statements too if ``keep_statements``."""
+
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = [] if keep_statements else None
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if self.statements is not None:
+            self.statements.append(statement)
+
+
+def _start(recorder):
+    _local.__dict__.setdefault('recorders', []).append(recorder)
+    return recorder
+
+
+def _stop(recorder):
+    _local.recorders.remove(recorder)
+
+
+@contextlib.contextmanager
+def record_queries(keep_statements=False):
+    """Record the statements this thread executes inside the block."""
+    recorder = _start(QueryRecorder(keep_statements))
+    try:
+        yield recorder
+    finally:
+        _stop(recorder)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'recorders', None):
+        context._query_stats_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_stats_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        for recorder in _local.recorders:
+            recorder.record(statement, elapsed)
+
+
+def _headers_enabled():
+    enabled = current_app.config.get('QUERY_STATS_HEADERS')
+    return current_app.debug if enabled is None else enabled
+
+
+def _start_recording():
+    if _headers_enabled():
+        g._query_recorder = _start(QueryRecorder())
+
+
+def _add_headers(response):
+    recorder = g.get('_query_recorder')
+    if recorder is not None:
+        elapsed_ms = recorder.seconds * 1000
+        response.headers['X-Query-Count'] = str(recorder.count)
+        response.headers.add('Server-Timing', f'db;dur={elapsed_ms:.2f};desc="{recorder.count} queries"')
+        current_app.logger.debug(f'{request.method} {request.path}: {recorder.count} queries in {elapsed_ms:.1f} ms')
+    return response
+
+
+def _stop_recording(error=None):
+    # Runs even when the view raised, so no recorder outlives its request
+    recorder = g.pop('_query_recorder', None)
+    if recorder is not None:
+        _stop(recorder)
+
+
+def init_query_stats(app, db):
+    """Count statements per thread on ``db``'s engine and add the debug response headers."""
+    from sqlalchemy import event
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_recording)
+    app.after_request(_add_headers)
+    app.teardown_request(_stop_recording)
@@ -0,0 +1,306 @@
+"""Sliding-window rate limiting for the login endpoint.
+
+Attempts are counted per client IP and per email. Each key keeps a counter
+per fixed window; the sliding-window estimate weights the previous window's
+count by how much of it still overlaps the last ``window`` seconds. A key
+of a ``progressive`` scope that goes over its limit is blocked for
+``backoff_base`` seconds, doubling with every further violation up to
+``backoff_max`` (progressive backoff). Other scopes are only throttled while
+they are over the limit: the login limiter keeps emails there, since anyone
+can fail logins for someone else's email and must not lock its owner out.
+
+Counters live in a pluggable backend:
+- ``MemoryBackend``: this process only.
+- ``SharedMemoryBackend``: a fixed-size table in a memory-mapped file,
+  shared by every gunicorn worker on the host.
+- ``RedisBackend``: any Redis-compatible store, shared across hosts.
+"""
+import contextlib
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+
+from backend.metrics import count_login_rate_limit
+
+try:
+    import fcntl
+except ImportError: # Not available on Windows
+    fcntl = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+Decision = namedtuple('Decision', ['allowed', 'retry_after', 'scope'])
+
+
+class MemoryBackend:
+    """Counters in a dict; only this process sees them."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._values.get(key)
+        if entry is not None and entry[1] <= now:
+            del self._values[key]
+            return None
+        return entry
+
+    def get_many(self, keys):
+        now = self.clock()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._live(key, now)
+                values.append(entry[0] if entry else None)
+        return values
+
+    def incr(self, key, ttl):
+        now = self.clock()
+        with self._lock:
+            entry = self._live(key, now)
+            value = (entry[0] if entry else 0) + 1
+            # Like Redis INCR + EXPIRE: the expiry moves with every increment
+            self._values[key] = (value, now + ttl)
+            if len(self._values) > 100000:
+                for stale in [k for k, (_, expires) in self._values.items() if expires <= now]:
+                    del self._values[stale]
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._values[key] = (value, self.clock() + ttl)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+
+class SharedMemoryBackend:
+    """Counters in a memory-mapped file shared by all processes on the host.
+
+    The file is a fixed table of ``slots`` entries of (key hash, value,
+    expiry), addressed by open hashing over ``probe`` neighbouring slots. When
+    all of a key's slots are live, the one closest to expiry is evicted, so
+    the table degrades by forgetting the oldest counters rather than failing.
+    Access is serialized with ``flock`` across processes and a lock across
+    threads.
+    """
+
+    SLOT = struct.Struct('=Qdd')
+
+    def __init__(self, path=None, slots=65536, probe=16, clock=time.time):
+        if fcntl is None:
+            raise RuntimeError('SharedMemoryBackend needs fcntl (POSIX)')
+        self.path = path or os.path.join(
+            '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'loginauth-ratelimit')
+        self.slots = slots
+        self.probe = probe
+        self.clock = clock
+        size = slots * self.SLOT.size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size != size:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size != size:
+                    os.ftruncate(self._fd, size)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hash(key):
+        # 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _find(self, key_hash, now):
+        """Return ``(slot, value)`` for a live key, or ``(slot to claim, None)``."""
+        start = key_hash % self.slots
+        free = oldest = oldest_expires = None
+        for i in range(self.probe):
+            slot = (start + i) % self.slots
+            stored_hash, value, expires = self.SLOT.unpack_from(self._map, slot * self.SLOT.size)
+            if stored_hash == key_hash and expires > now:
+                return slot, value
+            if stored_hash == 0 or expires <= now:
+                if free is None:
+                    free = slot
+            elif oldest_expires is None or expires < oldest_expires:
+                oldest, oldest_expires = slot, expires
+        return (free if free is not None else oldest), None
+
+    def _write(self, slot, key_hash, value, expires):
+        self.SLOT.pack_into(self._map, slot * self.SLOT.size, key_hash, value, expires)
+
+    def get_many(self, keys):
+        now = self.clock()
+        with self._locked():
+            return [self._find(self._hash(key), now)[1] for key in keys]
+
+    def incr(self, key, ttl):
+        now = self.clock()
+        key_hash = self._hash(key)
+        with self._locked():
+            slot, value = self._find(key_hash, now)
+            value = (value or 0) + 1
+            self._write(slot, key_hash, value, now + ttl)
+            return value
+
+    def set(self, key, value, ttl):
+        now = self.clock()
+        key_hash = self._hash(key)
+        with self._locked():
+            slot, _ = self._find(key_hash, now)
+            self._write(slot, key_hash, value, now + ttl)
+
+    def delete(self, *keys):
+        now = self.clock()
+        with self._locked():
+            for key in keys:
+                slot, value = self._find(self._hash(key), now)
+                if value is not None:
+                    self._write(slot, 0, 0, 0)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class RedisBackend:
+    """Counters in Redis (or anything speaking its commands), shared across hosts."""
+
+    def __init__(self, client, prefix='ratelimit:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get_many(self, keys):
+        values = self.client.mget([self.prefix + key for key in keys])
+        return [float(value) if value is not None else None for value in values]
+
+    def incr(self, key, ttl):
+        pipe = self.client.pipeline()
+        pipe.incr(self.prefix + key)
+        pipe.expire(self.prefix + key, max(1, int(ttl + 0.999)))
+        return pipe.execute()[0]
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl + 0.999)))
+
+    def delete(self, *keys):
+        self.client.delete(*[self.prefix + key for key in keys])
+
+
+class RateLimiter:
+    """Sliding-window limits with progressive backoff over a counter backend.
+
+    ``limits`` maps a scope (e.g. 'ip', 'email') to its allowed attempts per
+    ``window`` seconds. ``progressive`` names the scopes that are blocked with
+    backoff when over the limit; None means all of them.
+    """
+
+    def __init__(self, backend, limits, window=60, backoff_base=30, backoff_max=900, clock=time.time,
+                 progressive=None):
+        self.backend = backend
+        self.limits = limits
+        self.progressive = set(limits if progressive is None else progressive)
+        self.window = window
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+
+    def hit(self, **identities):
+        """Count one attempt for each ``scope=value`` and decide whether it may proceed."""
+        now = self.clock()
+        current = int(now // self.window)
+        overlap = 1 - (now % self.window) / self.window
+        keys = {scope: f'{scope}:{value}' for scope, value in identities.items() if value}
+
+        # One read for every key's block and previous window
+        scopes = list(keys)
+        reads = self.backend.get_many(
+            [f'{keys[s]}:blocked' for s in scopes] + [f'{keys[s]}:{current - 1}' for s in scopes])
+        blocked, previous = reads[:len(scopes)], reads[len(scopes):]
+
+        for scope, until in zip(scopes, blocked):
+            if until is not None and until > now:
+                return self._decide(Decision(False, until - now, scope))
+
+        for scope, prev_count in zip(scopes, previous):
+            count = self.backend.incr(f'{keys[scope]}:{current}', ttl=2 * self.window)
+            estimate = (prev_count or 0) * overlap + count
+            if estimate > self.limits[scope]:
+                if scope in self.progressive:
+                    retry_after = self._block(keys[scope], now)
+                else:
+                    retry_after = self.window - now % self.window # When this window's count starts fading
+                return self._decide(Decision(False, retry_after, scope))
+        return self._decide(Decision(True, 0, None))
+
+    def _block(self, key, now):
+        strikes = self.backend.incr(f'{key}:strikes', ttl=2 * self.backoff_max)
+        backoff = min(self.backoff_max, self.backoff_base * 2 ** (strikes - 1))
+        self.backend.set(f'{key}:blocked', now + backoff, ttl=backoff)
+        return backoff
+
+    def _decide(self, decision):
+        if decision.allowed:
+            count_login_rate_limit('allowed', 'none')
+        else:
+            count_login_rate_limit('throttled', decision.scope)
+        return decision
+
+    def reset(self, scope, value):
+        """Forget a key's block and backoff."""
+        self.backend.delete(f'{scope}:{value}:blocked', f'{scope}:{value}:strikes')
+
+
+def build_backend(config):
+    name = config['RATE_LIMIT_BACKEND']
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'shared':
+        return SharedMemoryBackend(path=config.get('RATE_LIMIT_SHARED_PATH'))
+    if name == 'redis':
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND='redis' needs the redis package")
+        return RedisBackend(redis.Redis.from_url(config['RATE_LIMIT_REDIS_URL']))
+    raise ValueError(f'Unknown RATE_LIMIT_BACKEND: {name}')
+
+
+def get_login_limiter():
+    """Return the login rate limiter for the current app, creating it on first use."""
+    limiter = current_app.extensions.get('login_limiter')
+    if limiter is None:
+        config = current_app.config
+        limiter = RateLimiter(
+            build_backend(config),
+            limits={'ip': config['LOGIN_LIMIT_PER_IP'], 'email': config['LOGIN_LIMIT_PER_EMAIL']},
+            window=config['LOGIN_LIMIT_WINDOW'],
+            backoff_base=config['LOGIN_BACKOFF_SECONDS'],
+            backoff_max=config['LOGIN_BACKOFF_MAX_SECONDS'],
+            progressive=('ip',),
+        )
+        current_app.extensions['login_limiter'] = limiter
+    return limiter
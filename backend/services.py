@@ -0,0 +1,146 @@
+from collections import namedtuple
+
+from sqlalchemy import text
+
+from backend.models import db, normalize_email
+
+# OAuth provider -> users column holding that provider's account ID
+PROVIDER_COLUMNS = {
+    'google': 'google_id',
+    'github': 'github_id',
+}
+
+# How far "<name>_<n>" is searched for a free username
+MAX_USERNAME_SUFFIX = 1000
+
+# How often a create that lost a race to a concurrent sign-in is retried
+MAX_RESOLVE_ATTEMPTS = 3
+
+# password_hash comes along so the row can fill the user cache (backend/user_cache.py);
+# replaced_id is the provider ID a link overwrote, whose cache entry is now stale
+ResolvedUser = namedtuple('ResolvedUser', ['id', 'email', 'outcome', 'password_hash', 'replaced_id'])
+
+# First free username among "<name>", "<name>_1", "<name>_2", ...; each probe
+# is a lookup on the users.username unique index. There is deliberately no
+# ORDER BY: both Postgres and SQLite produce recursive CTE rows in generation
+# order on demand, so LIMIT 1 stops at the first free name instead of
+# materializing every suffix.
+_FREE_USERNAME_CTES = '''
+suffixes(n) AS (
+    SELECT 0 UNION ALL SELECT n + 1 FROM suffixes WHERE n < :max_suffix
+),
+free_username AS (
+    SELECT candidate AS username FROM (
+        SELECT CASE WHEN n = 0 THEN CAST(:username AS VARCHAR(255))
+                       ELSE CAST(:username AS VARCHAR(255)) || '_' || CAST(n AS VARCHAR(16)) END AS candidate
+        FROM suffixes
+    ) candidates
+    WHERE NOT EXISTS (SELECT 1 FROM users WHERE users.username = candidates.candidate)
+    LIMIT 1
+)'''
+
+# Postgres: lookup, link-by-email and create as one statement
+_UPSERT_SQL = '''
+WITH RECURSIVE {free_username_ctes},
+by_provider AS (
+    SELECT id, email, password_hash FROM users WHERE {column} = :provider_id
+),
+previous AS (
+    SELECT id, {column} AS replaced_id FROM users WHERE lower(email) = :email
+),
+linked AS (
+    UPDATE users SET {column} = :provider_id FROM previous
+    WHERE users.id = previous.id AND NOT EXISTS (SELECT 1 FROM by_provider)
+    RETURNING users.id, users.email, users.password_hash, previous.replaced_id
+),
+created AS (
+    INSERT INTO users (email, username, {column})
+    SELECT :email, (SELECT username FROM free_username), :provider_id
+    WHERE NOT EXISTS (SELECT 1 FROM by_provider)
+      AND NOT EXISTS (SELECT 1 FROM users WHERE lower(email) = :email)
+    ON CONFLICT DO NOTHING
+    RETURNING id, email, password_hash
+)
+SELECT id, email, 'existing' AS outcome, password_hash, NULL AS replaced_id FROM by_provider
+UNION ALL SELECT id, email, 'linked', password_hash, replaced_id FROM linked
+UNION ALL SELECT id, email, 'created', password_hash, NULL FROM created
+'''
+
+# Other databases (SQLite has no data-modifying CTEs): the same steps as
+# separate statements, stopping at the first that yields the user. RETURNING
+# sees the updated row, so the link reads the replaced ID from a CTE that the
+# WHERE clause materializes before the update.
+_LOOKUP_SQL = ('SELECT id, email, \'existing\' AS outcome, password_hash, NULL AS replaced_id '
+               'FROM users WHERE {column} = :provider_id')
+_LINK_SQL = '''
+WITH previous AS MATERIALIZED (
+    SELECT id, {column} AS replaced_id FROM users WHERE lower(email) = :email
+)
+UPDATE users SET {column} = :provider_id WHERE id IN (SELECT id FROM previous)
+RETURNING id, email, 'linked' AS outcome, password_hash,
+          (SELECT replaced_id FROM previous WHERE previous.id = users.id) AS replaced_id
+'''
+_CREATE_SQL = '''
+WITH RECURSIVE {free_username_ctes}
+INSERT INTO users (email, username, {column})
+SELECT :email, (SELECT username FROM free_username), :provider_id
+WHERE NOT EXISTS (SELECT 1 FROM users WHERE lower(email) = :email)
+ON CONFLICT DO NOTHING
+RETURNING id, email, 'created' AS outcome, password_hash, NULL AS replaced_id
+'''
+
+
+def _statements(dialect_name, provider):
+    if provider not in PROVIDER_COLUMNS:
+        raise ValueError(f'Unknown OAuth provider: {provider}')
+    fmt = {'column': PROVIDER_COLUMNS[provider], 'free_username_ctes': _FREE_USERNAME_CTES}
+    if dialect_name == 'postgresql':
+        return [text(_UPSERT_SQL.format(**fmt))]
+    return [text(sql.format(**fmt)) for sql in (_LOOKUP_SQL, _LINK_SQL, _CREATE_SQL)]
+
+
+def _params(provider_id, email, preferred_username):
+    # Emails are matched through the lower(email) index and stored normalized
+    email = normalize_email(email)
+    return {
+        'provider_id': provider_id,
+        'email': email,
+        'username': preferred_username or email.split('@')[0],
+        'max_suffix': MAX_USERNAME_SUFFIX,
+    }
+
+
+def resolve_oauth_user(provider, provider_id, email, preferred_username, session=None):
+    """Find the user for an OAuth sign-in, linking or creating the account as needed.
+
+    Looks the user up by provider ID, else links the provider ID to the
+    account with the same email, else creates an account with the first free
+    username derived from ``preferred_username``. On Postgres this is a single
+    statement. Returns a ``ResolvedUser(id, email, outcome, password_hash,
+    replaced_id)`` where outcome is 'existing', 'linked' or 'created'; the
+    caller commits.
+    """
+    session = session or db.session
+    statements = _statements(session.get_bind().dialect.name, provider)
+    params = _params(provider_id, email, preferred_username)
+    for _ in range(MAX_RESOLVE_ATTEMPTS):
+        for statement in statements:
+            row = session.execute(statement, params).first()
+            if row:
+                return ResolvedUser(*row)
+        # Nothing returned: a concurrent sign-in created a conflicting row
+        # (same email, provider ID or username) after our snapshot. Retry
+        # against the now-visible row.
+    raise RuntimeError(f'Could not resolve {provider} user {provider_id}')
+
+
+async def resolve_oauth_user_async(session, provider, provider_id, email, preferred_username):
+    """``resolve_oauth_user`` for an ``AsyncSession``."""
+    statements = _statements(session.bind.dialect.name, provider)
+    params = _params(provider_id, email, preferred_username)
+    for _ in range(MAX_RESOLVE_ATTEMPTS):
+        for statement in statements:
+            row = (await session.execute(statement, params)).first()
+            if row:
+                return ResolvedUser(*row)
+    raise RuntimeError(f'Could not resolve {provider} user {provider_id}')
@@ -0,0 +1,137 @@
+"""Asymmetric signing keys for access tokens, and the JWKS document that publishes them.
+
+Keys are PEM private keys, RSA (signs RS256) or Ed25519 (signs EdDSA), each
+under a key ID (``kid``). They come from ``JWT_KEYS_DIR`` (one ``<kid>.pem``
+per key) and/or ``JWT_PRIVATE_KEYS`` ({kid: pem}). Every loaded key is
+published at ``/.well-known/jwks.json`` and accepted when verifying. One key,
+``JWT_ACTIVE_KID`` (default: the last kid in sort order), signs new tokens
+and names itself in their ``kid`` header. Other services can then verify
+tokens locally against the cached JWKS; no shared secret is needed.
+
+Rotation, with two keys overlapping:
+1. ``flask keys generate`` adds a key. Deploy with ``JWT_ACTIVE_KID`` still
+   naming the old key, so the new key is published before anything is
+   signed with it.
+2. Once ``JWKS_MAX_AGE`` has passed, point ``JWT_ACTIVE_KID`` at the new key.
+3. Once ``ACCESS_TOKEN_TTL_MINUTES`` has passed, remove the old key.
+
+With no keys configured, tokens are signed HS256 with ``SECRET_KEY`` as before.
+"""
+import datetime
+import hashlib
+import json
+import os
+import secrets
+
+import click
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from flask import current_app
+from flask.cli import AppGroup
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+keys_cli = AppGroup('keys', help='Access token signing keys.')
+
+
+class SigningKey:
+    def __init__(self, kid, private_key):
+        if isinstance(private_key, rsa.RSAPrivateKey):
+            self.algorithm, jwk_algorithm = 'RS256', RSAAlgorithm
+        elif isinstance(private_key, ed25519.Ed25519PrivateKey):
+            self.algorithm, jwk_algorithm = 'EdDSA', OKPAlgorithm
+        else:
+            raise ValueError(f'Signing key {kid} must be an RSA or Ed25519 private key')
+        self.kid = kid
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        self.jwk = {**jwk_algorithm.to_jwk(self.public_key, as_dict=True),
+                    'kid': kid, 'alg': self.algorithm, 'use': 'sig'}
+
+    @classmethod
+    def from_pem(cls, kid, pem):
+        if isinstance(pem, str):
+            pem = pem.encode('utf-8')
+        return cls(kid, serialization.load_pem_private_key(pem, password=None))
+
+
+class KeySet:
+    """The loaded signing keys, the active one and the serialized JWKS."""
+
+    def __init__(self, keys, active_kid=None):
+        self.keys = {key.kid: key for key in keys}
+        if active_kid is None and self.keys:
+            active_kid = max(self.keys)
+        if active_kid is not None and active_kid not in self.keys:
+            raise ValueError(f'JWT_ACTIVE_KID {active_kid} is not among the loaded keys')
+        self.active = self.keys.get(active_kid)
+        # Serialized once; every JWKS response is these bytes
+        self.jwks_body = json.dumps({'keys': [self.keys[kid].jwk for kid in sorted(self.keys)]}).encode('utf-8')
+        self.jwks_etag = hashlib.sha256(self.jwks_body).hexdigest()[:32]
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def get(self, kid):
+        return self.keys.get(kid)
+
+
+def load_keys(config):
+    keys = []
+    keys_dir = config.get('JWT_KEYS_DIR')
+    if keys_dir:
+        for name in sorted(os.listdir(keys_dir)):
+            if name.endswith('.pem'):
+                with open(os.path.join(keys_dir, name), 'rb') as f:
+                    keys.append(SigningKey.from_pem(name[:-len('.pem')], f.read()))
+    for kid, pem in (config.get('JWT_PRIVATE_KEYS') or {}).items():
+        keys.append(SigningKey.from_pem(kid, pem))
+    return KeySet(keys, config.get('JWT_ACTIVE_KID'))
+
+
+def get_key_set():
+    """Return the signing keys for the current app, loading them on first use."""
+    key_set = current_app.extensions.get('signing_keys')
+    if key_set is None:
+        key_set = load_keys(current_app.config)
+        current_app.extensions['signing_keys'] = key_set
+    return key_set
+
+
+def generate_private_key(key_type):
+    if key_type == 'rsa':
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return ed25519.Ed25519PrivateKey.generate()
+
+
+def private_key_pem(private_key):
+    return private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                     serialization.NoEncryption())
+
+
+@keys_cli.command('generate')
+@click.option('--type', 'key_type', type=click.Choice(['ed25519', 'rsa']), default='ed25519', show_default=True)
+@click.option('--kid', default=None, help='Key ID (default: today\'s date plus a random suffix, so IDs sort by age).')
+def generate_command(key_type, kid):
+    """Write a new private key to JWT_KEYS_DIR."""
+    keys_dir = current_app.config.get('JWT_KEYS_DIR')
+    if not keys_dir:
+        raise click.UsageError('Set JWT_KEYS_DIR to the directory holding the signing keys.')
+    kid = kid or f'{datetime.date.today():%Y%m%d}-{secrets.token_hex(3)}'
+    os.makedirs(keys_dir, exist_ok=True)
+    path = os.path.join(keys_dir, f'{kid}.pem')
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(private_key_pem(generate_private_key(key_type)))
+    click.echo(f'Wrote {path}. It is published once loaded; it signs once JWT_ACTIVE_KID={kid} '
+               f'(or it is the newest key and JWT_ACTIVE_KID is unset).')
+
+
+@keys_cli.command('list')
+def list_command():
+    """List the loaded keys and which one signs."""
+    key_set = load_keys(current_app.config)
+    if not key_set:
+        click.echo('No signing keys; tokens are signed HS256 with SECRET_KEY.')
+    for kid in sorted(key_set.keys):
+        key = key_set.keys[kid]
+        click.echo(f"{kid}  {key.algorithm}{'  (signing)' if key is key_set.active else ''}")
@@ -0,0 +1,23 @@
+"""Query budgets for endpoint tests.
+
+    class MyTestCase(QueryBudgetMixin, unittest.TestCase):
+        def test_login(self):
+            with self.assertMaxQueries(3):
+                self.client.post('/api/login', json=...)
+
+Fails with the statements that ran when the block executes more than its
+budget, so an added lookup or an N+1 loop shows up as a test failure.
+"""
+import contextlib
+
+from backend.query_stats import record_queries
+
+
+class QueryBudgetMixin:
+    @contextlib.contextmanager
+    def assertMaxQueries(self, budget):
+        with record_queries(keep_statements=True) as recorder:
+            yield recorder
+        if recorder.count > budget:
+            statements = '\n'.join(f'  {i}. {s}' for i, s in enumerate(recorder.statements, 1))
+            self.fail(f'{recorder.count} queries, over the budget of {budget}:\n{statements}')
@@ -0,0 +1,236 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlencode
+import jwt
+from google.auth import crypt, jwt as google_jwt
+from sqlalchemy import create_engine
+from backend.app import app, db, User
+from backend.auth_events import AuthEventWriter
+from backend.oauth_state import get_state_signer
+try:
+    import httpx
+    from backend.asgi import AsyncAuthApp, async_database_url
+except ImportError: # requirements-async.txt not installed
+    httpx = None
+from backend.tests.test_config import TestConfig
+from backend.user_cache import CachedUser, MemoryBackend, UserCache
+from backend.tests.test_github_client import StandInGitHub, StandInHTTPServer
+from backend.tests.test_google_certs import make_key_and_cert
+
+KEY_ID = 'stand-in-key'
+
+
+class StandInGoogle:
+    """Local stand-in for Google's token and certificate endpoints."""
+
+    def __init__(self, client_id, email='async_google_user@example.com', sub='async_google_id'):
+        key_pem, cert_pem = make_key_and_cert()
+        signer = crypt.RSASigner.from_string(key_pem, key_id=KEY_ID)
+        self.cert_hits = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, payload, headers=()):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                now = int(time.time())
+                id_token = google_jwt.encode(signer, {
+                    'iss': 'https://accounts.google.com', 'aud': client_id, 'sub': sub,
+                    'email': email, 'iat': now, 'exp': now + 300,
+                }).decode()
+                self._send({'access_token': 'stand-in', 'id_token': id_token})
+
+            def do_GET(self):
+                server.cert_hits += 1
+                self._send({KEY_ID: cert_pem}, [('Cache-Control', 'public, max-age=3600')])
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = StandInHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@unittest.skipIf(httpx is None, 'async serving dependencies are not installed')
+class AsyncServingTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        self.google = StandInGoogle(TestConfig.GOOGLE_CLIENT_ID)
+        self.github = StandInGitHub()
+        app.config['GOOGLE_TOKEN_URI'] = f'{self.google.url}/token'
+        app.config['GOOGLE_CERTS_URL'] = f'{self.google.url}/certs'
+        app.config['GITHUB_TOKEN_URL'] = f'{self.github.url}/login/oauth/access_token'
+        app.config['GITHUB_API_URL'] = self.github.url
+
+        # The async engine needs a database file it can share with this sync setup code
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.sync_engine = create_engine(f'sqlite:///{self.db_path}')
+        db.metadata.create_all(self.sync_engine)
+        self.asgi_app = AsyncAuthApp(database_url=async_database_url(f'sqlite:///{self.db_path}'))
+
+    def tearDown(self):
+        asyncio.run(self.asgi_app.aclose())
+        self.sync_engine.dispose()
+        os.unlink(self.db_path)
+        self.google.close()
+        self.github.close()
+        app.config.from_object(TestConfig)
+        app.extensions.pop('oauth_providers', None) # Built with the stand-in endpoints
+        app.extensions.pop('oauth_state', None)
+
+    def get(self, *requests):
+        """GET each of ``requests`` concurrently: a path, or ``(path, headers)``."""
+        async def run():
+            transport = httpx.ASGITransport(app=self.asgi_app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                return await asyncio.gather(*(
+                    client.get(request[0], headers=request[1]) if isinstance(request, tuple) else client.get(request)
+                    for request in requests
+                ))
+        return asyncio.run(run())
+
+    def callback(self, provider, code, signer=None, return_to=None):
+        """A callback request carrying a fresh state and its nonce cookie, as a browser would send it."""
+        state, nonce = (signer or self.asgi_app.state_signer).issue(provider, return_to)
+        return (f'/api/auth/{provider}/callback?{urlencode({"code": code, "state": state})}',
+                {'Cookie': f'oauth_nonce={nonce}'})
+
+    def user_by_email(self, email):
+        with self.sync_engine.connect() as conn:
+            return conn.execute(User.__table__.select().where(User.email == email)).first()
+
+    def test_async_database_url(self):
+        self.assertEqual(async_database_url('postgresql://u:p@localhost/db').drivername, 'postgresql+asyncpg')
+        self.assertEqual(async_database_url('sqlite:///:memory:').drivername, 'sqlite+aiosqlite')
+
+    def test_google_callback_new_user(self):
+        (response,) = self.get(self.callback('google', 'dummy_code'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('frontend/handle_token.html#token=', response.headers['location'])
+
+        user = self.user_by_email('async_google_user@example.com')
+        self.assertEqual(user.google_id, 'async_google_id')
+        token = response.headers['location'].split('#token=')[1].split('&')[0]
+        decoded_token = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        self.assertEqual(decoded_token['user_id'], user.id)
+        self.assertNotIn('refresh_token', response.headers['location'])
+        cookie = next(value for value in response.headers.get_list('set-cookie') if value.startswith('refresh_token='))
+        self.assertIn('HttpOnly', cookie)
+        self.assertIn('Secure', cookie)
+        self.assertIn('Path=/api/token', cookie)
+
+    def test_google_transport_failure_is_502(self):
+        down = set()
+
+        def transport(request):
+            if request.method in down:
+                raise httpx.ConnectError('connection refused', request=request)
+            return httpx.Response(200, json={'id_token': 'not-checked-before-the-certs'})
+        asyncio.run(self.asgi_app.aclose())
+        self.asgi_app = AsyncAuthApp(database_url=async_database_url(f'sqlite:///{self.db_path}'),
+                                     http=httpx.AsyncClient(transport=httpx.MockTransport(transport)))
+        for method in ('POST', 'GET'): # The token exchange, then the cert fetch
+            down.add(method)
+            (response,) = self.get(self.callback('google', 'dummy_code'))
+            self.assertEqual(response.status_code, 502, method)
+            self.assertEqual(response.json()['message'], 'Communication error with Google: connection refused')
+            down.clear()
+
+    def test_google_certs_fetched_once(self):
+        self.get(self.callback('google', 'one'))
+        self.get(self.callback('google', 'two'))
+        self.assertEqual(self.google.cert_hits, 1)
+
+    def test_github_callback_new_user(self):
+        (response,) = self.get(self.callback('github', 'dummy_github_code'))
+        self.assertEqual(response.status_code, 302)
+        user = self.user_by_email('octocat@example.com')
+        self.assertEqual(user.github_id, '42')
+        self.assertEqual(user.username, 'octocat')
+
+    def test_missing_code(self):
+        (response,) = self.get('/api/auth/github/callback')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Authorization code not found.')
+
+    def test_state_is_verified(self):
+        (response,) = self.get('/api/auth/github/callback?code=c&state=forged.state')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Invalid or expired sign-in attempt. Please sign in again.')
+        request = self.callback('github', 'c')
+        self.assertEqual(self.get(request)[0].status_code, 302)
+        self.assertEqual(self.get(request)[0].status_code, 400) # Replayed
+
+    def test_state_issued_by_the_flask_app(self):
+        with app.app_context():
+            signer = get_state_signer()
+        (response,) = self.get(self.callback('github', 'c', signer=signer, return_to='/frontend/settings.html'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.headers['location'].endswith('&next=/frontend/settings.html'))
+        self.assertIn('oauth_nonce=;', response.headers['set-cookie'])
+
+    def test_sign_in_is_audited(self):
+        events = []
+        app.config['AUTH_EVENTS_ENABLED'] = True
+        app.extensions['auth_events'] = AuthEventWriter(events.extend, flush_interval=60)
+        self.addCleanup(app.extensions.pop, 'auth_events', None)
+        path, headers = self.callback('github', 'c')
+        self.get((path, dict(headers, **{'User-Agent': 'asgi-test'})))
+        app.extensions['auth_events'].flush()
+        self.assertEqual([(e['event_type'], e['email'], e['provider'], e['ip_address'], e['user_agent']) for e in events],
+                         [('oauth_register', 'octocat@example.com', 'github', '127.0.0.1', 'asgi-test')])
+
+    def test_link_invalidates_the_user_cache(self):
+        with self.sync_engine.begin() as conn:
+            user_id = conn.execute(User.__table__.insert().values(email='octocat@example.com', github_id='old-id')
+                                   ).inserted_primary_key[0]
+        app.config['USER_CACHE_ENABLED'] = True
+        cache = app.extensions['user_cache'] = UserCache(MemoryBackend())
+        self.addCleanup(app.extensions.pop, 'user_cache', None)
+        for key in (f'id:{user_id}', 'email:octocat@example.com', 'github:old-id'): # As a sync worker filled them
+            cache.backend.set(key, CachedUser(user_id, 'octocat@example.com', None), ttl=60)
+
+        self.assertEqual(self.get(self.callback('github', 'c'))[0].status_code, 302)
+        self.assertEqual(self.user_by_email('octocat@example.com').github_id, '42')
+        self.assertEqual(len(cache.backend), 0)
+
+    def test_concurrent_callbacks_overlap(self):
+        """Test that in-flight handshakes wait on the provider concurrently."""
+        with self.sync_engine.begin() as conn:
+            conn.execute(User.__table__.insert().values(email='octocat@example.com', github_id='42'))
+        self.github.delay = 0.2
+        started = time.perf_counter()
+        responses = self.get(*[self.callback('github', str(i)) for i in range(20)])
+        elapsed = time.perf_counter() - started
+        self.assertTrue(all(r.status_code == 302 for r in responses))
+        # Served one after another this would take 20 * 2 * 0.2s = 8s
+        self.assertLess(elapsed, 3)
+
+    def test_other_routes_go_to_flask(self):
+        (response,) = self.get('/api/auth/github')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('client_id=test_github_client_id', response.headers['location'])
+
+if __name__ == '__main__':
+    unittest.main()
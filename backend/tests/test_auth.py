@@ -52,6 +52,47 @@ class AuthTestCase(unittest.TestCase):
         data = json.loads(response.data)
         self.assertIn('Email already registered', data['message'])
 
+    def test_user_registration_duplicate_username(self):
+        """Test registration with a duplicate username."""
+        payload1 = {'email': 'first@example.com', 'password': 'password123', 'username': 'taken'}
+        self.client.post('/api/register', data=json.dumps(payload1), content_type='application/json')
+
+        payload2 = {'email': 'second@example.com', 'password': 'password123', 'username': 'taken'}
+        response = self.client.post('/api/register', data=json.dumps(payload2), content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        data = json.loads(response.data)
+        self.assertIn('Username already taken', data['message'])
+
+    def test_user_registration_single_statement(self):
+        """Test that registration issues one INSERT and no lookups."""
+        from sqlalchemy import event
+        statements = []
+        with app.app_context():
+            engine = db.engine
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            payload = {'email': 'single@example.com', 'password': 'password123', 'username': 'single'}
+            response = self.client.post('/api/register', data=json.dumps(payload), content_type='application/json')
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([s.split()[0] for s in statements], ['INSERT'])
+
+    def test_user_registration_duplicate_email_case(self):
+        """Test that emails differing only by case count as the same account."""
+        payload1 = {'email': 'Case@Example.com', 'password': 'password123'}
+        response = self.client.post('/api/register', data=json.dumps(payload1), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        with app.app_context():
+            self.assertEqual(User.query.one().email, 'case@example.com')
+
+        payload2 = {'email': ' case@EXAMPLE.com', 'password': 'password456'}
+        response = self.client.post('/api/register', data=json.dumps(payload2), content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        data = json.loads(response.data)
+        self.assertIn('Email already registered', data['message'])
+
     def test_user_registration_invalid_payload(self):
         """Test registration with missing email or password."""
         # Missing password
@@ -96,6 +137,15 @@ class AuthTestCase(unittest.TestCase):
         self.assertEqual(decoded_token['email'], 'login_success@example.com')
         self.assertIn('user_id', decoded_token)
 
+    def test_user_login_email_case_insensitive(self):
+        """Test that login matches the email regardless of case."""
+        reg_payload = {'email': 'mixed@example.com', 'password': 'password123'}
+        self.client.post('/api/register', data=json.dumps(reg_payload), content_type='application/json')
+
+        login_payload = {'email': 'MIXED@Example.COM', 'password': 'password123'}
+        response = self.client.post('/api/login', data=json.dumps(login_payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
     def test_user_login_invalid_credentials(self):
         """Test user login with incorrect password or non-existent email."""
         # Register user first
@@ -0,0 +1,187 @@
+import datetime
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import create_engine, text
+
+from backend.app import app, db, User
+from backend.auth_events import MAX_ATTEMPTS, AuthEventWriter, get_auth_event_writer, write_events
+from backend.models import AuthEvent
+from backend.query_stats import record_queries
+from backend.tests.test_config import TestConfig
+from backend.tests.test_github_client import StandInGitHub
+from backend.tests.test_oauth_state import callback_url
+
+
+def event(n=0):
+    return {'event_type': 'login', 'user_id': n, 'email': None, 'provider': None, 'ip_address': None,
+            'user_agent': None, 'created_at': datetime.datetime(2025, 1, 1)}
+
+
+class AuthEventWriterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.written = threading.Event()
+
+    def sink(self, batch):
+        self.batches.append([e['user_id'] for e in batch])
+        self.written.set()
+
+    def writer(self, **kwargs):
+        writer = AuthEventWriter(self.sink, **kwargs)
+        self.addCleanup(writer.close, 1)
+        return writer
+
+    def test_full_batch_is_written_right_away(self):
+        writer = self.writer(batch_size=3, flush_interval=60)
+        for n in range(3):
+            writer.record(event(n))
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [[0, 1, 2]])
+
+    def test_partial_batch_is_written_after_the_interval(self):
+        writer = self.writer(batch_size=100, flush_interval=0.05)
+        writer.record(event(7))
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [[7]])
+
+    def test_full_buffer_drops_new_events(self):
+        writer = self.writer(batch_size=100, flush_interval=60, max_pending=3)
+        accepted = [writer.record(event(n)) for n in range(5)]
+        self.assertEqual(accepted, [True, True, True, False, False])
+        self.assertEqual((len(writer), writer.dropped), (3, 2))
+        writer.flush()
+        self.assertEqual(self.batches, [[0, 1, 2]])
+
+    def test_failed_batch_is_retried_then_dropped(self):
+        attempts = []
+
+        def failing_sink(batch):
+            attempts.append(len(batch))
+            raise RuntimeError('database is down')
+        writer = AuthEventWriter(failing_sink, batch_size=2, flush_interval=60)
+        for n in range(3):
+            writer.record(event(n))
+        for _ in range(MAX_ATTEMPTS - 1):
+            self.assertEqual(writer.flush(), 0)
+            self.assertEqual(len(writer), 3) # Kept, to be retried
+        writer.sink = self.sink
+        writer.flush()
+        self.assertEqual(self.batches, [[0, 1], [2]]) # Retried in order
+
+        writer.sink = failing_sink
+        writer.record(event(3))
+        for _ in range(MAX_ATTEMPTS):
+            writer.flush()
+        self.assertEqual((len(writer), writer.dropped, writer.failed_writes), (0, 1, 2 * MAX_ATTEMPTS - 1))
+
+    def test_close_writes_what_is_left(self):
+        writer = AuthEventWriter(self.sink, batch_size=100, flush_interval=60)
+        writer.record(event(1))
+        writer.close()
+        self.assertEqual(self.batches, [[1]])
+        self.assertFalse(writer.record(event(2)))
+
+
+class AuthEventsTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        app.config.update(AUTH_EVENTS_ENABLED=True, AUTH_EVENTS_FLUSH_SECONDS=60) # Written by flush() below
+        app.extensions.pop('auth_events', None)
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        app.extensions.pop('auth_events', None)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def events(self):
+        with app.app_context():
+            get_auth_event_writer().flush()
+            return [(e.event_type, e.user_id, e.email, e.provider)
+                    for e in AuthEvent.query.order_by(AuthEvent.id)]
+
+    def test_register_and_logins(self):
+        user_id = self.client.post('/api/register', json={'email': 'Audit@Example.com', 'password': 'password123'},
+                                   headers={'User-Agent': 'audit-test'}).get_json()['user_id']
+        with record_queries(keep_statements=True) as recorder:
+            self.client.post('/api/login', json={'email': 'audit@example.com', 'password': 'password123'})
+        # Written behind the request, not in it
+        self.assertFalse(any('auth_events' in statement for statement in recorder.statements))
+        self.client.post('/api/login', json={'email': 'audit@example.com', 'password': 'wrong-password'})
+        self.client.post('/api/login', json={'email': 'nobody@example.com', 'password': 'wrong-password'})
+
+        self.assertEqual(self.events(), [
+            ('register', user_id, 'audit@example.com', None),
+            ('login', user_id, 'audit@example.com', None),
+            ('login_failed', user_id, 'audit@example.com', None),
+            ('login_failed', None, 'nobody@example.com', None),
+        ])
+        with app.app_context():
+            first = AuthEvent.query.order_by(AuthEvent.id).first()
+            self.assertEqual((first.ip_address, first.user_agent), ('127.0.0.1', 'audit-test'))
+
+    def test_oauth_sign_ins(self):
+        github = StandInGitHub()
+        self.addCleanup(github.close)
+        app.config['GITHUB_TOKEN_URL'] = f'{github.url}/login/oauth/access_token'
+        app.config['GITHUB_API_URL'] = github.url
+        app.extensions.pop('oauth_providers', None)
+        self.addCleanup(app.extensions.pop, 'oauth_providers', None)
+        with app.app_context():
+            db.session.add(User(email='octocat@example.com'))
+            db.session.commit()
+            user_id = User.find_by_email('octocat@example.com').id
+
+        for _ in range(2):
+            self.assertEqual(self.client.get(callback_url(self.client, 'github', 'c')).status_code, 302)
+        self.assertEqual(self.events(), [
+            ('oauth_link', user_id, 'octocat@example.com', 'github'),
+            ('oauth_login', user_id, 'octocat@example.com', 'github'),
+        ])
+
+    def test_write_events(self):
+        # COPY when the tests run against Postgres, executemany on SQLite
+        rows = [dict(event(n), email=f'user{n}@example.com', ip_address='10.0.0.1') for n in range(3)]
+        rows[1]['user_agent'] = 'Mozilla/5.0 (X11; Linux x86_64) "quoted", comma'
+        with app.app_context():
+            write_events(db.engine, rows)
+            stored = [(e.user_id, e.email, e.user_agent, e.created_at)
+                      for e in AuthEvent.query.order_by(AuthEvent.id)]
+        self.assertEqual(stored, [(row['user_id'], row['email'], row['user_agent'], row['created_at']) for row in rows])
+
+
+# Runs in a child interpreter that exits with events still buffered
+_CHILD = '''
+from backend.app import app
+client = app.test_client()
+client.post('/api/register', json={'email': 'exit@example.com', 'password': 'password123'})
+client.post('/api/login', json={'email': 'exit@example.com', 'password': 'password123'})
+'''
+
+
+class ShutdownFlushTestCase(unittest.TestCase):
+    def test_exit_writes_buffered_events(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.addCleanup(os.unlink, db_path)
+        engine = create_engine(f'sqlite:///{db_path}')
+        self.addCleanup(engine.dispose)
+        db.metadata.create_all(engine)
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', AUTH_EVENTS_FLUSH_SECONDS='60',
+                   LOGIN_RATE_LIMIT='false', USER_CACHE_ENABLED='false')
+        subprocess.run([sys.executable, '-c', _CHILD], env=env, check=True)
+        with engine.connect() as conn:
+            types = conn.execute(text('SELECT event_type FROM auth_events ORDER BY id')).scalars().all()
+        self.assertEqual(types, ['register', 'login'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,11 @@ class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use in-memory SQLite for tests
     SECRET_KEY = 'test_secret_key' # Consistent secret key for tests
+    HASHING_WORKERS = 0 # Hash inline; the pool itself is covered in test_hashing.py
+    LOGIN_RATE_LIMIT = False # Covered in test_rate_limit.py
+    RATE_LIMIT_BACKEND = 'memory'
+    USER_CACHE_ENABLED = False # Covered in test_user_cache.py; ids repeat across tests
+    AUTH_EVENTS_ENABLED = False # Covered in test_auth_events.py
     WTF_CSRF_ENABLED = False  # Disable CSRF for forms if you use Flask-WTF (not used in this project but good practice)
 
     # Override OAuth credentials for testing - these won't be used if you mock API calls
@@ -0,0 +1,103 @@
+import unittest
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from backend.github_client import GitHubClient
+
+
+class StandInHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under concurrent load
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class StandInGitHub:
+    """Local stand-in for GitHub's token endpoint and REST API."""
+
+    def __init__(self, delay=0.0, user=None, emails=None):
+        self.delay = delay
+        self.user = user if user is not None else {'id': 42, 'login': 'octocat', 'email': None}
+        self.emails = emails if emails is not None else [
+            {'email': 'secondary@example.com', 'primary': False, 'verified': True},
+            {'email': 'octocat@example.com', 'primary': True, 'verified': True},
+        ]
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, payload):
+                time.sleep(server.delay)
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                self._send({'access_token': 'stand-in-token'})
+
+            def do_GET(self):
+                self._send(server.emails if self.path == '/user/emails' else server.user)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = StandInHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def client(self, **kwargs):
+        return GitHubClient('id', 'secret', 'http://localhost/callback', api_url=self.url,
+                            token_url=f'{self.url}/login/oauth/access_token', **kwargs)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class GitHubClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.github = StandInGitHub()
+
+    def tearDown(self):
+        self.github.close()
+
+    def test_exchange_and_fetch_primary_email(self):
+        client = self.github.client()
+        self.assertEqual(client.exchange_code('code')['access_token'], 'stand-in-token')
+        user_info, email = client.fetch_user('stand-in-token')
+        self.assertEqual(user_info['login'], 'octocat')
+        self.assertEqual(email, 'octocat@example.com')
+        stats = client.stats.snapshot()
+        self.assertEqual(set(stats), {'token', 'user', 'emails'})
+        self.assertTrue(all(s['count'] == 1 and s['errors'] == 0 for s in stats.values()))
+
+    def test_public_email_wins(self):
+        self.github.user = {'id': 42, 'login': 'octocat', 'email': 'public@example.com'}
+        _, email = self.github.client().fetch_user('stand-in-token')
+        self.assertEqual(email, 'public@example.com')
+
+    def test_user_and_emails_fetched_concurrently(self):
+        """Test that the two API calls overlap instead of running back to back."""
+        self.github.delay = 0.3
+        client = self.github.client()
+        started = time.perf_counter()
+        client.fetch_user('stand-in-token')
+        self.assertLess(time.perf_counter() - started, 0.55)
+
+    def test_read_timeout(self):
+        """Test that a slow upstream fails after the read timeout instead of hanging."""
+        self.github.delay = 1.0
+        calls = []
+        client = self.github.client(read_timeout=0.2, on_call=lambda *args: calls.append(args))
+        with self.assertRaises(requests.exceptions.Timeout):
+            client.exchange_code('code')
+        self.assertEqual(calls[0][0], 'token')
+        self.assertFalse(calls[0][2])
+        self.assertEqual(client.stats.snapshot()['token']['errors'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
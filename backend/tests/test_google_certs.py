@@ -0,0 +1,121 @@
+import unittest
+import json
+import threading
+import time
+import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt as google_jwt
+from google.oauth2 import id_token
+from backend.google_certs import CachingRequest, cache_max_age
+
+KEY_ID = 'test-key-1'
+AUDIENCE = 'test_google_client_id'
+
+
+def make_key_and_cert():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'stand-in')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    return key_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class StandInCertServer:
+    """Local stand-in for Google's cert endpoint that counts its hits."""
+
+    def __init__(self, certs, max_age):
+        self.hits = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.hits += 1
+                body = json.dumps(certs).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control', f'public, max-age={server.max_age}, must-revalidate')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.max_age = max_age
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/oauth2/v1/certs'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class GoogleCertCacheTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.key_pem, cls.cert_pem = make_key_and_cert()
+
+    def setUp(self):
+        self.server = StandInCertServer({KEY_ID: self.cert_pem}, max_age=3600)
+
+    def tearDown(self):
+        self.server.close()
+
+    def make_id_token(self, sub='12345'):
+        now = int(time.time())
+        payload = {'iss': 'https://accounts.google.com', 'aud': AUDIENCE, 'sub': sub,
+                   'email': 'certs@example.com', 'iat': now, 'exp': now + 300}
+        signer = crypt.RSASigner.from_string(self.key_pem, key_id=KEY_ID)
+        return google_jwt.encode(signer, payload)
+
+    def test_cache_max_age(self):
+        self.assertEqual(cache_max_age({'Cache-Control': 'public, max-age=19000, must-revalidate'}), 19000)
+        self.assertEqual(cache_max_age({'Cache-Control': 'no-store, max-age=60'}), 0)
+        self.assertEqual(cache_max_age({}), 0)
+
+    def test_verify_fetches_certs_once(self):
+        """Test that repeated verifications reuse the cached certificates."""
+        request = CachingRequest(cacheable_urls=[self.server.url])
+        for sub in ('1', '2', '3'):
+            id_info = id_token.verify_token(self.make_id_token(sub), request, audience=AUDIENCE,
+                                            certs_url=self.server.url)
+            self.assertEqual(id_info['sub'], sub)
+        self.assertEqual(self.server.hits, 1)
+
+    def test_uncacheable_response_is_refetched(self):
+        self.server.max_age = 0
+        request = CachingRequest(cacheable_urls=[self.server.url])
+        request(self.server.url)
+        request(self.server.url)
+        self.assertEqual(self.server.hits, 2)
+
+    def test_background_refresh_before_expiry(self):
+        """Test that a response near expiry is served from cache while refreshed in the background."""
+        self.server.max_age = 2
+        request = CachingRequest(cacheable_urls=[self.server.url], refresh_margin=2)
+        request(self.server.url)
+        time.sleep(1.1) # Past refresh_at (half the lifetime) but before expiry
+        response = request(self.server.url)
+        self.assertEqual(response.status, 200)
+        deadline = time.time() + 5
+        while self.server.hits < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.server.hits, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+import json
+import threading
+import time
+from backend.app import app, db, User
+from backend import hashing
+from backend.hashing import HashingExecutor, HashingPoolSaturated
+from backend.tests.test_config import TestConfig
+
+class HashingExecutorTestCase(unittest.TestCase):
+    def test_process_pool_hash_and_check(self):
+        """Test hashing and checking through a real process pool."""
+        executor = HashingExecutor(max_workers=1)
+        try:
+            password_hash = executor.hash_password('securepassword')
+            self.assertNotEqual(password_hash, 'securepassword')
+            self.assertTrue(executor.check_password('securepassword', password_hash))
+            self.assertFalse(executor.check_password('wrongpassword', password_hash))
+            self.assertFalse(executor.check_password('securepassword', None))
+        finally:
+            executor.shutdown()
+
+    def test_saturated_pool_fails_fast(self):
+        """Test that jobs beyond max_pending are rejected instead of queued."""
+        executor = HashingExecutor(max_workers=0, max_pending=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking_job():
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=executor.run, args=(blocking_job,))
+        worker.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(HashingPoolSaturated):
+                executor.hash_password('password123')
+        finally:
+            release.set()
+            worker.join()
+
+        # The slot is released once the blocking job finishes
+        self.assertTrue(executor.check_password('password123', executor.hash_password('password123')))
+
+    def test_timed_out_job_keeps_its_slot_until_it_finishes(self):
+        executor = HashingExecutor(max_workers=1, max_pending=1)
+        try:
+            executor.run(int, '1') # Start the worker, so the job below is picked up at once
+            executor.timeout = 0.05
+            with self.assertRaises(HashingPoolSaturated):
+                executor.run(time.sleep, 1)
+            # Still running in the worker, so the pool is still full
+            with self.assertRaises(HashingPoolSaturated):
+                executor.hash_password('password123')
+            time.sleep(1.5)
+            executor.timeout = None
+            self.assertTrue(executor.check_password('password123', executor.hash_password('password123')))
+        finally:
+            executor.shutdown()
+
+    def test_inline_failure_releases_the_slot(self):
+        executor = HashingExecutor(max_workers=0, max_pending=1)
+        with self.assertRaises(ValueError):
+            executor.run(int, 'not a number')
+        self.assertEqual(executor.run(int, '42'), 42)
+
+
+class HashingBackpressureTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        app.testing = True
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+        self.saved_executor = app.extensions.pop('hashing_executor', None)
+
+    def tearDown(self):
+        app.extensions.pop('hashing_executor', None)
+        if self.saved_executor is not None:
+            app.extensions['hashing_executor'] = self.saved_executor
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def saturate(self):
+        executor = HashingExecutor(max_workers=0, max_pending=1)
+        executor._slots.acquire()
+        app.extensions['hashing_executor'] = executor
+
+    def test_register_returns_503_when_saturated(self):
+        self.saturate()
+        payload = {'email': 'busy@example.com', 'password': 'password123'}
+        response = self.client.post('/api/register', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers.get('Retry-After'), '1')
+
+    def test_login_returns_503_when_saturated(self):
+        payload = {'email': 'busy_login@example.com', 'password': 'password123'}
+        self.client.post('/api/register', data=json.dumps(payload), content_type='application/json')
+        self.saturate()
+        response = self.client.post('/api/login', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+
+class HasherRegistryTestCase(unittest.TestCase):
+    def test_identify_by_prefix(self):
+        """Test that stored hashes are verified by the hasher matching their prefix."""
+        bcrypt_hash = hashing.hash_password('password123', 'bcrypt', 4)
+        argon2_hash = hashing.hash_password('password123', 'argon2id', 1)
+        self.assertTrue(bcrypt_hash.startswith('$2b$04$'))
+        self.assertTrue(argon2_hash.startswith('$argon2id$'))
+        for password_hash in (bcrypt_hash, argon2_hash):
+            self.assertTrue(hashing.check_password('password123', password_hash))
+            self.assertFalse(hashing.check_password('wrongpassword', password_hash))
+        self.assertFalse(hashing.check_password('password123', 'not-a-known-hash'))
+        # Past bcrypt's 72 bytes only the first 72 count, as with older bcrypt, rather than raising
+        self.assertFalse(hashing.check_password('p' * 100, bcrypt_hash))
+        self.assertTrue(hashing.check_password('p' * 100, hashing.hash_password('p' * 72, 'bcrypt', 4)))
+
+    def test_malformed_hashes_fail_safely(self):
+        bcrypt_hash = hashing.hash_password('password123', 'bcrypt', 4)
+        for password_hash in (bcrypt_hash[:-1], bcrypt_hash.replace('$04$', '$xx$'), '$2b$', '$argon2id$',
+                              '$argon2id$v=19$m=65536,t=1,p=4$!!$!!'):
+            self.assertFalse(hashing.check_password('password123', password_hash), password_hash)
+            self.assertTrue(hashing.needs_rehash(password_hash, 'bcrypt', 4), password_hash)
+        self.assertTrue(hashing.get_hasher('bcrypt', 4).needs_rehash(bcrypt_hash[:-1]))
+        self.assertTrue(hashing.get_hasher('argon2id', 1).needs_rehash('$argon2id$'))
+
+    def test_needs_rehash(self):
+        """Test that a different algorithm or cost marks a hash as outdated."""
+        password_hash = hashing.hash_password('password123', 'bcrypt', 4)
+        self.assertFalse(hashing.needs_rehash(password_hash, 'bcrypt', 4))
+        self.assertTrue(hashing.needs_rehash(password_hash, 'bcrypt', 5))
+        self.assertTrue(hashing.needs_rehash(password_hash, 'argon2id', 1))
+
+    def test_calibrate_respects_target(self):
+        """Test that calibration never exceeds the target once above the minimum cost."""
+        cost, elapsed_ms, timings = hashing.calibrate('bcrypt', target_ms=0, rounds=1)
+        self.assertEqual(cost, hashing.BcryptHasher.min_cost)
+        self.assertEqual(list(timings), [hashing.BcryptHasher.min_cost])
+
+
+class RehashOnLoginTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        app.testing = True
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+        self.saved_executor = app.extensions.pop('hashing_executor', None)
+
+    def tearDown(self):
+        app.extensions.pop('hashing_executor', None)
+        if self.saved_executor is not None:
+            app.extensions['hashing_executor'] = self.saved_executor
+        app.config.from_object(TestConfig)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_login_upgrades_outdated_hash(self):
+        """Test that a successful login rehashes with the configured algorithm."""
+        with app.app_context():
+            user = User(email='rehash@example.com', password_hash=hashing.hash_password('password123', 'bcrypt', 4))
+            db.session.add(user)
+            db.session.commit()
+
+        app.config['PASSWORD_HASHER'] = 'argon2id'
+        app.config['PASSWORD_HASH_COST'] = 1
+        payload = {'email': 'rehash@example.com', 'password': 'password123'}
+        response = self.client.post('/api/login', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        with app.app_context():
+            user = User.query.filter_by(email='rehash@example.com').first()
+            self.assertTrue(user.password_hash.startswith('$argon2id$'))
+            self.assertTrue(user.check_password('password123'))
+
+        # The upgraded hash keeps working
+        response = self.client.post('/api/login', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import datetime
+import jwt
+from backend.app import app, db
+from backend.tokens import get_token_cache
+from backend.tests.test_config import TestConfig
+
+class IntrospectTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        app.config['INTROSPECTION_SECRETS'] = ['gateway-secret']
+        app.extensions.pop('token_cache', None)
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+        body = {'email': 'introspect@example.com', 'password': 'password123'}
+        self.client.post('/api/register', json=body)
+        self.tokens = [self.client.post('/api/login', json=body).get_json() for _ in range(2)]
+
+    def tearDown(self):
+        app.extensions.pop('token_cache', None)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def introspect(self, tokens, secret='gateway-secret'):
+        return self.client.post('/api/token/introspect', json={'tokens': tokens},
+                                headers={'Authorization': f'Bearer {secret}'})
+
+    def test_batch(self):
+        expired = jwt.encode({'user_id': 1, 'exp': datetime.datetime.utcnow() - datetime.timedelta(minutes=1)},
+                             TestConfig.SECRET_KEY, algorithm='HS256')
+        forged = jwt.encode({'user_id': 1, 'exp': 2**31}, 'wrong-secret', algorithm='HS256')
+        first, second = self.tokens[0]['access_token'], self.tokens[1]['access_token']
+        # Revoke the second session
+        self.client.post('/api/token/revoke', json={'refresh_token': self.tokens[1]['refresh_token']})
+
+        response = self.introspect([first, expired, forged, 'garbage', second, first, 42])
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual([result['active'] for result in results], [True, False, False, False, False, True, False])
+        self.assertEqual(results[0]['email'], 'introspect@example.com')
+        self.assertEqual(results[0], results[5])
+        self.assertEqual(results[1], {'active': False})
+
+    def test_shares_cache_with_require_auth(self):
+        token = self.tokens[0]['access_token']
+        with app.app_context():
+            cache = get_token_cache()
+            self.introspect([token])
+            misses = cache.misses
+            self.client.get('/api/me', headers={'Authorization': f'Bearer {token}'})
+            self.assertEqual(cache.misses, misses) # Served from the entry introspection cached
+
+    def test_requires_client_secret(self):
+        token = self.tokens[0]['access_token']
+        self.assertEqual(self.introspect([token], secret='nope').status_code, 401)
+        # An access token is not an introspection credential
+        self.assertEqual(self.introspect([token], secret=token).status_code, 401)
+        app.config['INTROSPECTION_SECRETS'] = []
+        self.assertEqual(self.introspect([token]).status_code, 401)
+
+    def test_request_validation(self):
+        headers = {'Authorization': 'Bearer gateway-secret'}
+        self.assertEqual(self.client.post('/api/token/introspect', json={'tokens': 'x'}, headers=headers).status_code, 400)
+        self.assertEqual(self.client.post('/api/token/introspect', json={'tokens': []}, headers=headers).status_code, 400)
+        app.config['INTROSPECT_MAX_TOKENS'] = 2
+        self.assertEqual(self.introspect(['a', 'b', 'c']).status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
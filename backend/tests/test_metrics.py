@@ -0,0 +1,96 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+from backend.app import app, db
+from backend.metrics import prometheus_client
+from backend.tests.test_config import TestConfig
+from backend.tests.test_oauth_state import callback_url
+
+def sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+@unittest.skipIf(prometheus_client is None, 'prometheus_client is not installed')
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_request_and_stage_timings(self):
+        login_count = dict(name='http_request_duration_seconds_count', method='POST', route='/api/login', status='200')
+        before = {
+            'login': sample(**login_count),
+            'hash': sample('auth_stage_duration_seconds_count', stage='password_hash', operation='bcrypt'),
+            'verify': sample('auth_stage_duration_seconds_count', stage='password_verify', operation='bcrypt'),
+            'select': sample('auth_stage_duration_seconds_count', stage='db_query', operation='select'),
+            'jwt': sample('auth_stage_duration_seconds_count', stage='jwt_encode', operation='access'),
+        }
+        body = {'email': 'metrics@example.com', 'password': 'password123'}
+        self.client.post('/api/register', json=body)
+        self.assertEqual(self.client.post('/api/login', json=body).status_code, 200)
+
+        self.assertEqual(sample(**login_count), before['login'] + 1)
+        self.assertEqual(sample('auth_stage_duration_seconds_count', stage='password_hash', operation='bcrypt'),
+                         before['hash'] + 1)
+        self.assertEqual(sample('auth_stage_duration_seconds_count', stage='password_verify', operation='bcrypt'),
+                         before['verify'] + 1)
+        self.assertGreater(sample('auth_stage_duration_seconds_count', stage='db_query', operation='select'),
+                           before['select'])
+        self.assertEqual(sample('auth_stage_duration_seconds_count', stage='jwt_encode', operation='access'),
+                         before['jwt'] + 1)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn('http_request_duration_seconds_bucket{le="0.005",method="POST",route="/api/login",status="200"}',
+                      response.get_data(as_text=True))
+
+    def test_provider_calls_are_timed(self):
+        from backend.tests.test_github_client import StandInGitHub
+        github = StandInGitHub()
+        app.config['GITHUB_TOKEN_URL'] = f'{github.url}/login/oauth/access_token'
+        app.config['GITHUB_API_URL'] = github.url
+        app.extensions.pop('oauth_providers', None)
+        try:
+            before = sample('auth_stage_duration_seconds_count', stage='provider_http', operation='github:user')
+            response = self.client.get(callback_url(self.client, 'github', 'test'))
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(sample('auth_stage_duration_seconds_count', stage='provider_http', operation='github:user'),
+                             before + 1)
+        finally:
+            app.extensions.pop('oauth_providers', None)
+            github.close()
+
+# Runs in a child interpreter standing in for one gunicorn worker
+_WORKER = '''
+import sys
+from backend.app import app
+client = app.test_client()
+for _ in range(int(sys.argv[1])):
+    client.get('/api/me')
+if len(sys.argv) > 2:
+    print(client.get('/metrics').get_data(as_text=True))
+'''
+
+@unittest.skipIf(prometheus_client is None, 'prometheus_client is not installed')
+class MultiprocessMetricsTestCase(unittest.TestCase):
+    def test_scrape_sums_all_workers(self):
+        """Test that any one worker's /metrics counts the requests served by every worker."""
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            env = dict(os.environ, DATABASE_URL='sqlite:///:memory:', PROMETHEUS_MULTIPROC_DIR=metrics_dir)
+            for requests in (3, 4):
+                subprocess.run([sys.executable, '-c', _WORKER, str(requests)], env=env, check=True)
+            output = subprocess.run([sys.executable, '-c', _WORKER, '1', 'scrape'], env=env, check=True,
+                                    capture_output=True, text=True).stdout
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/api/me",status="401"} 8.0', output)
+
+if __name__ == '__main__':
+    unittest.main()
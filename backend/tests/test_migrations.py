@@ -0,0 +1,94 @@
+import unittest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from backend.app import app, db, User, RefreshToken
+from backend.migrations import backfill_normalized_emails, create_email_index, merge_duplicate_emails
+from backend.tests.test_config import TestConfig
+
+class NormalizeEmailsTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        # Start from a pre-migration table: no lower(email) index, mixed-case emails
+        db.session.execute(text('DROP INDEX ix_users_email_lower'))
+        db.session.execute(text('''
+            INSERT INTO users (id, email, username, password_hash, github_id) VALUES
+            (1, 'Dup@Example.com', 'dup', NULL, NULL),
+            (2, 'dup@example.com ', 'dup2', 'hash', '42'),
+            (3, 'Solo@Example.com', 'solo', NULL, NULL),
+            (4, 'plain@example.com', 'plain', NULL, NULL)
+        '''))
+        db.session.add(RefreshToken(user_id=2, token_hash='a' * 64, family_id='f' * 32,
+                                    expires_at=db.func.current_timestamp()))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_merge_backfill_and_index(self):
+        self.assertEqual(merge_duplicate_emails(), 1)
+        self.assertEqual(backfill_normalized_emails(batch_size=2), 1)
+        create_email_index()
+
+        rows = db.session.execute(text('SELECT id, email, username, password_hash, github_id FROM users ORDER BY id')).all()
+        self.assertEqual([tuple(r) for r in rows], [
+            (1, 'dup@example.com', 'dup', 'hash', '42'),
+            (3, 'solo@example.com', 'solo', None, None),
+            (4, 'plain@example.com', 'plain', None, None),
+        ])
+        self.assertEqual(RefreshToken.query.one().user_id, 1)
+        self.assertEqual(User.find_by_email('SOLO@example.com').id, 3)
+
+        create_email_index() # Idempotent
+        with self.assertRaises(IntegrityError):
+            db.session.execute(text("INSERT INTO users (email) VALUES ('PLAIN@example.com')"))
+
+    def test_cli(self):
+        result = app.test_cli_runner().invoke(args=['migrations', 'normalize-emails', '--batch-size', '1'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Merged 1 duplicate account(s).', result.output)
+        self.assertIn('Normalized 1 email(s).', result.output)
+
+    def test_listing_indexes(self):
+        db.session.execute(text('DROP INDEX ix_users_created_at_id'))
+        if db.engine.dialect.name == 'postgresql': # SQLite cannot drop the constraint to set this up
+            db.session.execute(text('ALTER TABLE users ALTER COLUMN created_at DROP NOT NULL'))
+            db.session.execute(text('UPDATE users SET created_at = NULL WHERE id = 3'))
+        db.session.commit()
+        for _ in range(2): # Idempotent
+            result = app.test_cli_runner().invoke(args=['migrations', 'listing-indexes'])
+            self.assertEqual(result.exit_code, 0, result.output)
+        inspector = db.inspect(db.engine)
+        indexes = {index['name'] for index in inspector.get_indexes('users')}
+        self.assertTrue({'ix_users_created_at_id', 'ix_users_google_created_at_id',
+                         'ix_users_github_created_at_id'} <= indexes)
+        self.assertFalse(next(c for c in inspector.get_columns('users') if c['name'] == 'created_at')['nullable'])
+        self.assertEqual(db.session.execute(text('SELECT count(*) FROM users WHERE created_at IS NULL')).scalar(), 0)
+
+    def test_auth_events_table(self):
+        db.session.execute(text('DROP TABLE auth_events'))
+        db.session.commit()
+        for _ in range(2): # Idempotent
+            result = app.test_cli_runner().invoke(args=['migrations', 'auth-events-table'])
+            self.assertEqual(result.exit_code, 0, result.output)
+        indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('auth_events')}
+        self.assertEqual(indexes, {'ix_auth_events_user_id_created_at', 'ix_auth_events_created_at'})
+
+    def test_token_tables(self):
+        db.session.execute(text('DROP TABLE refresh_tokens'))
+        db.session.execute(text('DROP TABLE revoked_tokens'))
+        db.session.commit()
+        for _ in range(2): # Idempotent
+            result = app.test_cli_runner().invoke(args=['migrations', 'token-tables'])
+            self.assertEqual(result.exit_code, 0, result.output)
+        inspector = db.inspect(db.engine)
+        self.assertTrue(inspector.has_table('revoked_tokens'))
+        indexes = {index['name'] for index in inspector.get_indexes('refresh_tokens')}
+        self.assertIn('ix_refresh_tokens_family_id', indexes)
+
+if __name__ == '__main__':
+    unittest.main()
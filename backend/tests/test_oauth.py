@@ -3,11 +3,14 @@ import json
 from unittest.mock import patch, MagicMock # For mocking external API calls
 from backend.app import app, db, User # Assuming app, db, User are in backend.app
 from backend.tests.test_config import TestConfig
+from backend.tests.test_oauth_state import callback_url
 
 class OAuthTestCase(unittest.TestCase):
     def setUp(self):
         """Set up test variables."""
         app.config.from_object(TestConfig)
+        app.extensions.pop('oauth_providers', None) # Rebuilt from TestConfig on first use
+        app.extensions.pop('oauth_state', None)
         self.client = app.test_client()
 
         # Propagate the exceptions to the test client
@@ -22,15 +25,14 @@ class OAuthTestCase(unittest.TestCase):
             db.session.remove()
             db.drop_all()
 
-    @patch('backend.app.GoogleFlow.from_client_config') # Path to Flow in your app.py
-    @patch('backend.app.id_token.verify_oauth2_token') # Path to id_token in your app.py
-    def test_google_oauth_new_user(self, mock_verify_id_token, mock_google_flow_from_config):
+    @patch('requests.Session.post') # Mock the pooled session's post call for token exchange
+    @patch('backend.providers.oidc.id_token.verify_token') # Path to id_token in the OIDC identity module
+    def test_google_oauth_new_user(self, mock_verify_id_token, mock_requests_post):
         """Test Google OAuth callback with a new user."""
-        # Mock Google Flow
-        mock_flow_instance = MagicMock()
-        mock_flow_instance.credentials = MagicMock()
-        mock_flow_instance.credentials.id_token = "dummy_google_id_token"
-        mock_google_flow_from_config.return_value = mock_flow_instance
+        # Mock Google token exchange
+        mock_token_response = MagicMock()
+        mock_token_response.json.return_value = {'access_token': 'dummy', 'id_token': 'dummy_google_id_token'}
+        mock_requests_post.return_value = mock_token_response
 
         # Mock id_token verification
         mock_verify_id_token.return_value = {
@@ -42,7 +44,7 @@ class OAuthTestCase(unittest.TestCase):
         }
 
         # Simulate the callback from Google
-        response = self.client.get('/api/auth/google/callback?code=dummy_code&state=dummy_state')
+        response = self.client.get(callback_url(self.client, 'google', 'dummy_code'))
         
         self.assertEqual(response.status_code, 302) # Expecting a redirect
         self.assertIn('frontend/handle_token.html#token=', response.location)
@@ -54,16 +56,23 @@ class OAuthTestCase(unittest.TestCase):
             self.assertIsNone(user.password_hash) # Social login users might not have a password
 
         # Check token in redirect URL
-        token = response.location.split('#token=')[1]
+        token = response.location.split('#token=')[1].split('&')[0]
         import jwt
         decoded_token = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
         self.assertEqual(decoded_token['email'], 'new_google_user@example.com')
         self.assertEqual(decoded_token['user_id'], user.id)
 
+        # The refresh token is only in an HttpOnly cookie for the token endpoints
+        self.assertNotIn('refresh_token', response.location)
+        cookie = self.client.get_cookie('refresh_token', path='/api/token')
+        self.assertEqual((cookie.http_only, cookie.secure, cookie.same_site), (True, True, 'Strict'))
+        refreshed = self.client.post('/api/token/refresh')
+        self.assertEqual(refreshed.status_code, 200)
+
 
-    @patch('backend.app.GoogleFlow.from_client_config')
-    @patch('backend.app.id_token.verify_oauth2_token')
-    def test_google_oauth_existing_user_link_account(self, mock_verify_id_token, mock_google_flow_from_config):
+    @patch('requests.Session.post')
+    @patch('backend.providers.oidc.id_token.verify_token')
+    def test_google_oauth_existing_user_link_account(self, mock_verify_id_token, mock_requests_post):
         """Test Google OAuth linking to an existing user by email."""
         # Create an existing user
         with app.app_context():
@@ -73,18 +82,18 @@ class OAuthTestCase(unittest.TestCase):
             db.session.commit()
             user_id_before_link = existing_user.id
 
-        mock_flow_instance = MagicMock()
-        mock_flow_instance.credentials = MagicMock()
-        mock_flow_instance.credentials.id_token = "dummy_google_id_token_link"
-        mock_google_flow_from_config.return_value = mock_flow_instance
+        mock_token_response = MagicMock()
+        mock_token_response.json.return_value = {'access_token': 'dummy', 'id_token': 'dummy_google_id_token_link'}
+        mock_requests_post.return_value = mock_token_response
 
         mock_verify_id_token.return_value = {
+            'iss': 'https://accounts.google.com',
             'sub': 'test_google_id_456',
             'email': 'existing_google_user@example.com', # Same email as existing user
             'email_verified': True
         }
 
-        response = self.client.get('/api/auth/google/callback?code=dummy_auth_code')
+        response = self.client.get(callback_url(self.client, 'google', 'dummy_auth_code'))
         self.assertEqual(response.status_code, 302)
         self.assertIn('frontend/handle_token.html#token=', response.location)
 
@@ -96,8 +105,8 @@ class OAuthTestCase(unittest.TestCase):
             self.assertTrue(linked_user.check_password('password123')) # Original password should still work
 
 
-    @patch('requests.post') # Mock the requests.post call for token exchange
-    @patch('requests.get')  # Mock the requests.get call for user info
+    @patch('requests.Session.post') # Mock the pooled session's post call for token exchange
+    @patch('requests.Session.get')  # Mock the pooled session's get call for user info
     def test_github_oauth_new_user(self, mock_requests_get, mock_requests_post):
         """Test GitHub OAuth callback with a new user."""
         # Mock GitHub token exchange
@@ -121,7 +130,7 @@ class OAuthTestCase(unittest.TestCase):
             {'email': 'new_github_user@example.com', 'primary': True, 'verified': True}
         ]
         # Configure mock_requests_get to return different values based on URL
-        def side_effect_get(url, headers):
+        def side_effect_get(url, headers, **kwargs):
             if 'api.github.com/user/emails' in url:
                 return mock_emails_response
             elif 'api.github.com/user' in url:
@@ -130,7 +139,7 @@ class OAuthTestCase(unittest.TestCase):
         mock_requests_get.side_effect = side_effect_get
 
 
-        response = self.client.get('/api/auth/github/callback?code=dummy_github_code')
+        response = self.client.get(callback_url(self.client, 'github', 'dummy_github_code'))
         self.assertEqual(response.status_code, 302) # Expecting redirect
         self.assertIn('frontend/handle_token.html#token=', response.location)
 
@@ -140,7 +149,7 @@ class OAuthTestCase(unittest.TestCase):
             self.assertEqual(user.github_id, '78910')
             self.assertEqual(user.username, 'newgithubuser')
 
-        token = response.location.split('#token=')[1]
+        token = response.location.split('#token=')[1].split('&')[0]
         import jwt
         decoded_token = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
         self.assertEqual(decoded_token['email'], 'new_github_user@example.com')
@@ -0,0 +1,195 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import requests
+from sqlalchemy import create_engine
+
+from backend.app import app, db
+from backend.oauth_state import InvalidOAuthState, OAuthStateSigner, SeenNonces, is_safe_return_path
+from backend.tests.test_config import TestConfig
+from backend.tests.test_github_client import StandInGitHub
+
+
+def callback_url(client, provider, code, next=None):
+    """Start a sign-in on ``client`` (which keeps the nonce cookie); return the provider's callback URL."""
+    response = client.get(f'/api/auth/{provider}' + (f'?{urlencode({"next": next})}' if next else ''))
+    state = parse_qs(urlsplit(response.location).query)['state'][0]
+    return f'/api/auth/{provider}/callback?{urlencode({"code": code, "state": state})}'
+
+
+class OAuthStateSignerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = [1000.0]
+        self.signer = OAuthStateSigner('secret', ttl=600, clock=lambda: self.now[0])
+
+    def assertRejected(self, reason, state, provider='github', nonce=None, signer=None):
+        with self.assertRaises(InvalidOAuthState) as rejected:
+            (signer or self.signer).verify(state, provider, nonce)
+        self.assertEqual(str(rejected.exception), reason)
+
+    def test_round_trip(self):
+        state, nonce = self.signer.issue('github', '/frontend/settings.html')
+        self.assertEqual(self.signer.verify(state, 'github', nonce), '/frontend/settings.html')
+
+    def test_tampered_or_malformed(self):
+        state, nonce = self.signer.issue('github')
+        payload, signature = state.split('.')
+        self.assertRejected('bad signature', f'{payload}x.{signature}', nonce=nonce)
+        self.assertRejected('bad signature', state, signer=OAuthStateSigner('other secret'), nonce=nonce)
+        for state in (None, '', 'no-dot', 'a.b.c'):
+            self.assertRejected('malformed', state, nonce=nonce)
+
+    def test_provider_expiry_and_cookie(self):
+        state, nonce = self.signer.issue('github')
+        self.assertRejected('issued for another provider', state, provider='google', nonce=nonce)
+        self.assertRejected('not started by this browser', state, nonce='someone-else')
+        self.assertRejected('not started by this browser', state)
+        self.now[0] += 600
+        self.assertRejected('expired', state, nonce=nonce)
+
+    def test_cookie_binding_can_be_turned_off(self):
+        signer = OAuthStateSigner('secret', bind_to_cookie=False)
+        state, _ = signer.issue('github')
+        self.assertIsNone(signer.verify(state, 'github'))
+
+    def test_replay(self):
+        state, nonce = self.signer.issue('github')
+        self.signer.verify(state, 'github', nonce)
+        self.assertRejected('replayed', state, nonce=nonce)
+
+    def test_any_node_with_the_secret_verifies(self):
+        other_node = OAuthStateSigner('secret', clock=lambda: self.now[0])
+        state, nonce = self.signer.issue('google', '/frontend/dashboard.html')
+        self.assertEqual(other_node.verify(state, 'google', nonce), '/frontend/dashboard.html')
+        # Replays are caught by the node that saw the state
+        self.assertRejected('replayed', state, provider='google', nonce=nonce, signer=other_node)
+
+    def test_seen_nonces_expire_and_stay_bounded(self):
+        now = [0.0]
+        seen = SeenNonces(maxsize=2, clock=lambda: now[0])
+        self.assertTrue(seen.add('a', 10))
+        self.assertFalse(seen.add('a', 10))
+        self.assertTrue(seen.add('b', 20))
+        self.assertTrue(seen.add('c', 20))
+        self.assertEqual(len(seen), 2)
+        now[0] = 10
+        self.assertTrue(seen.add('d', 30))
+        self.assertEqual(len(seen), 2) # 'a' expired, 'b' dropped for room
+
+    def test_safe_return_paths(self):
+        self.assertTrue(is_safe_return_path('/frontend/dashboard.html?tab=1'))
+        for path in ('https://evil.example/', '//evil.example/', '/\\evil.example', 'dashboard.html', '/' * 513):
+            self.assertFalse(is_safe_return_path(path), path)
+
+
+class OAuthStateViewsTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        self.github = StandInGitHub()
+        app.config['GITHUB_TOKEN_URL'] = f'{self.github.url}/login/oauth/access_token'
+        app.config['GITHUB_API_URL'] = self.github.url
+        app.extensions.pop('oauth_providers', None)
+        app.extensions.pop('oauth_state', None)
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        app.extensions.pop('oauth_providers', None)
+        app.extensions.pop('oauth_state', None)
+        self.github.close()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_authorize_sets_the_nonce_cookie(self):
+        response = self.client.get('/api/auth/github')
+        cookie = response.headers['Set-Cookie']
+        self.assertIn('oauth_nonce=', cookie)
+        self.assertIn('Path=/api/auth/github', cookie)
+        self.assertIn('HttpOnly', cookie)
+
+    def test_callback_returns_to_next_and_drops_the_cookie(self):
+        response = self.client.get(callback_url(self.client, 'github', 'code', next='/frontend/settings.html'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith('&next=/frontend/settings.html'))
+        self.assertIsNone(self.client.get_cookie('oauth_nonce', path='/api/auth/github'))
+
+    def test_unsafe_next_is_refused(self):
+        response = self.client.get('/api/auth/github?next=//evil.example/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_callback_rejects_missing_forged_and_replayed_states(self):
+        url = callback_url(self.client, 'github', 'code')
+        for bad_url in ('/api/auth/github/callback?code=code', '/api/auth/github/callback?code=code&state=x.y'):
+            response = self.client.get(bad_url)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.get_json()['message'], 'Invalid or expired sign-in attempt. Please sign in again.')
+        nonce = self.client.get_cookie('oauth_nonce', path='/api/auth/github').value
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.set_cookie('oauth_nonce', nonce, path='/api/auth/github') # As a replaying attacker would
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_callback_from_another_browser_is_rejected(self):
+        url = callback_url(self.client, 'github', 'code')
+        self.assertEqual(app.test_client().get(url).status_code, 400)
+
+
+# Runs in a child interpreter standing in for one app node behind a load balancer
+_NODE = '''
+from werkzeug.serving import make_server
+from backend.app import app
+server = make_server('127.0.0.1', 0, app, threaded=True)
+print(server.server_port, flush=True)
+server.serve_forever()
+'''
+
+
+class MultiNodeOAuthStateTestCase(unittest.TestCase):
+    """Two app processes sharing SECRET_KEY and a database, but nothing else."""
+
+    def setUp(self):
+        self.github = StandInGitHub()
+        self.addCleanup(self.github.close)
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.addCleanup(os.unlink, db_path)
+        engine = create_engine(f'sqlite:///{db_path}')
+        db.metadata.create_all(engine)
+        engine.dispose()
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', SECRET_KEY='shared-node-secret',
+                   GITHUB_TOKEN_URL=f'{self.github.url}/login/oauth/access_token', GITHUB_API_URL=self.github.url,
+                   FRONTEND_BASE_URL='http://frontend.example')
+        self.nodes = [self.start_node(env) for _ in range(2)]
+
+    def start_node(self, env):
+        process = subprocess.Popen([sys.executable, '-c', _NODE], env=env, stdout=subprocess.PIPE, text=True)
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        return f'http://127.0.0.1:{process.stdout.readline().strip()}'
+
+    def test_callback_on_another_node(self):
+        browser = requests.Session()
+        response = browser.get(f'{self.nodes[0]}/api/auth/github?next=/frontend/settings.html', allow_redirects=False)
+        self.assertEqual(response.status_code, 302)
+        state = parse_qs(urlsplit(response.headers['Location']).query)['state'][0]
+        # The balancer sends the callback to the other node; the cookie is for the same site
+        nonce = response.cookies['oauth_nonce']
+        browser.cookies.set('oauth_nonce', nonce, path='/api/auth/github')
+
+        callback = f'{self.nodes[1]}/api/auth/github/callback?{urlencode({"code": "c", "state": state})}'
+        response = browser.get(callback, allow_redirects=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.headers['Location'].startswith('http://frontend.example/frontend/handle_token.html#token='))
+        self.assertTrue(response.headers['Location'].endswith('&next=/frontend/settings.html'))
+
+        browser.cookies.set('oauth_nonce', nonce, path='/api/auth/github')
+        self.assertEqual(browser.get(callback, allow_redirects=False).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from urllib.parse import parse_qs, urlsplit
+from flask import Flask
+from backend.app import app, db, User
+from backend.providers import OAuthProvider, PROVIDERS, get_provider, register_provider_routes
+from backend.tests.test_config import TestConfig
+from backend.tests.test_asgi import StandInGoogle
+from backend.tests.test_oauth_state import callback_url
+
+class ProviderRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        app.extensions.pop('oauth_providers', None)
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        app.config.from_object(TestConfig)
+        app.extensions.pop('oauth_providers', None)
+
+    def test_authorize_url_only_varies_by_state(self):
+        with app.app_context():
+            github = get_provider('github')
+            first, second = github.authorize_url('a b'), github.authorize_url('c')
+            self.assertIs(get_provider('github'), github)
+            self.assertIs(github.client, github.client)
+        self.assertTrue(first.endswith('&state=a%20b'))
+        self.assertEqual(first.rsplit('&state=', 1)[0], second.rsplit('&state=', 1)[0])
+        query = parse_qs(urlsplit(first).query)
+        self.assertEqual(query['client_id'], ['test_github_client_id'])
+        self.assertEqual(query['scope'], ['user:email read:user'])
+        with self.assertRaises(TypeError):
+            github.options['client_id'] = 'changed'
+
+    def test_google_redirect(self):
+        response = self.client.get('/api/auth/google')
+        self.assertEqual(response.status_code, 302)
+        query = parse_qs(urlsplit(response.location).query)
+        self.assertEqual(query['client_id'], ['test_google_client_id'])
+        self.assertEqual(query['access_type'], ['offline'])
+        self.assertIn('state', query)
+
+    def test_google_callback_verifies_id_token(self):
+        """Test the code exchange and ID token verification against a stand-in Google."""
+        google = StandInGoogle(TestConfig.GOOGLE_CLIENT_ID, email='Verified@Example.com', sub='g-verified')
+        self.addCleanup(google.close)
+        app.config['GOOGLE_TOKEN_URI'] = f'{google.url}/token'
+        app.config['GOOGLE_CERTS_URL'] = f'{google.url}/certs'
+
+        for _ in range(2):
+            response = self.client.get(callback_url(self.client, 'google', 'dummy'))
+            self.assertEqual(response.status_code, 302)
+            self.assertIn('#token=', response.location)
+        self.assertEqual(google.cert_hits, 1)
+        with app.app_context():
+            self.assertEqual(User.find_by_email('verified@example.com').google_id, 'g-verified')
+
+    def test_third_provider_is_configuration(self):
+        spec = dict(PROVIDERS['google'], label='GitLab', settings={}, client_id='gl-id', client_secret='gl-secret',
+                    redirect_uri='http://localhost/cb', authorize_url='https://gitlab.example/oauth/authorize',
+                    token_url='https://gitlab.example/oauth/token', certs_url='https://gitlab.example/oauth/discovery/keys',
+                    scopes=['openid', 'email'], authorize_params={}, issuers=['https://gitlab.example'])
+        other = Flask(__name__)
+        other.config.from_object(TestConfig)
+        other.config['OAUTH_PROVIDERS'] = {'gitlab': spec}
+        register_provider_routes(other)
+        self.assertIn('/api/auth/gitlab/callback', {rule.rule for rule in other.url_map.iter_rules()})
+
+        provider = OAuthProvider('gitlab', spec, other.config)
+        self.assertTrue(provider.authorize_url('s').startswith(
+            'https://gitlab.example/oauth/authorize?response_type=code&client_id=gl-id'))
+        self.assertEqual(provider.client.token_url, 'https://gitlab.example/oauth/token')
+
+if __name__ == '__main__':
+    unittest.main()
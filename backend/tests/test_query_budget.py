@@ -0,0 +1,107 @@
+import unittest
+from backend.app import app, db, User
+from backend.tests.query_budget import QueryBudgetMixin
+from backend.tests.test_asgi import StandInGoogle
+from backend.tests.test_config import TestConfig
+from backend.tests.test_github_client import StandInGitHub
+from backend.tests.test_oauth_state import callback_url
+
+# Statements each endpoint may run. Lower these when an endpoint gets cheaper;
+# raising one should come with a reason in the commit.
+QUERY_BUDGETS = {
+    'register': 1,
+    'login': 2,
+    'refresh': 4,
+    'google_callback_new_user': 2,
+    'google_callback_returning': 2,
+    'github_callback_new_user': 2,
+    'me': 1, # At most the periodic revocation sync
+}
+# Without ON CONFLICT upserts, a new OAuth user takes a lookup, a link attempt and an insert
+SQLITE_QUERY_BUDGETS = {
+    'google_callback_new_user': 4,
+    'github_callback_new_user': 4,
+}
+
+class QueryBudgetTestCase(QueryBudgetMixin, unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        self.google = StandInGoogle(TestConfig.GOOGLE_CLIENT_ID, email='budget-google@example.com', sub='budget-sub')
+        self.github = StandInGitHub()
+        app.config['GOOGLE_TOKEN_URI'] = f'{self.google.url}/token'
+        app.config['GOOGLE_CERTS_URL'] = f'{self.google.url}/certs'
+        app.config['GITHUB_TOKEN_URL'] = f'{self.github.url}/login/oauth/access_token'
+        app.config['GITHUB_API_URL'] = self.github.url
+        app.extensions.pop('oauth_providers', None)
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        app.extensions.pop('oauth_providers', None)
+        self.google.close()
+        self.github.close()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def budget(self, name):
+        with app.app_context():
+            dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            return SQLITE_QUERY_BUDGETS.get(name, QUERY_BUDGETS[name])
+        return QUERY_BUDGETS[name]
+
+    def register_and_login(self):
+        body = {'email': 'budget@example.com', 'password': 'password123'}
+        with self.assertMaxQueries(self.budget('register')):
+            self.assertEqual(self.client.post('/api/register', json=body).status_code, 201)
+        with self.assertMaxQueries(self.budget('login')):
+            response = self.client.post('/api/login', json=body)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_password_endpoints(self):
+        tokens = self.register_and_login()
+        with self.assertMaxQueries(self.budget('refresh')):
+            response = self.client.post('/api/token/refresh', json={'refresh_token': tokens['refresh_token']})
+        self.assertEqual(response.status_code, 200)
+        with self.assertMaxQueries(self.budget('me')):
+            response = self.client.get('/api/me', headers={'Authorization': f"Bearer {tokens['access_token']}"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_oauth_callbacks(self):
+        # Each sign-in starts at the authorize route (callback_url), which runs no queries
+        url = callback_url(self.client, 'google', 'c')
+        with self.assertMaxQueries(self.budget('google_callback_new_user')):
+            self.assertEqual(self.client.get(url).status_code, 302)
+        url = callback_url(self.client, 'google', 'c')
+        with self.assertMaxQueries(self.budget('google_callback_returning')):
+            self.assertEqual(self.client.get(url).status_code, 302)
+        url = callback_url(self.client, 'github', 'c')
+        with self.assertMaxQueries(self.budget('github_callback_new_user')):
+            self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_budget_failure_lists_statements(self):
+        with app.app_context():
+            with self.assertRaises(AssertionError) as failure:
+                with self.assertMaxQueries(1):
+                    User.query.count()
+                    User.query.count()
+        self.assertIn('2 queries, over the budget of 1', str(failure.exception))
+        self.assertIn('count(*)', str(failure.exception))
+
+    def test_debug_headers(self):
+        app.config['QUERY_STATS_HEADERS'] = True
+        try:
+            response = self.client.post('/api/register', json={'email': 'h@example.com', 'password': 'password123'})
+        finally:
+            app.config['QUERY_STATS_HEADERS'] = None
+        self.assertEqual(response.headers['X-Query-Count'], '1')
+        self.assertRegex(response.headers['Server-Timing'], r'^db;dur=[0-9.]+;desc="1 queries"$')
+        # Off outside debug mode
+        response = self.client.get('/api/me')
+        self.assertNotIn('X-Query-Count', response.headers)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,301 @@
+import unittest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from sqlalchemy import create_engine, event
+from backend.app import app, db
+from backend.rate_limit import MemoryBackend, RateLimiter, RedisBackend, SharedMemoryBackend, get_login_limiter
+from backend.metrics import prometheus_client
+from backend.tests.test_config import TestConfig
+from backend.tests.test_metrics import sample
+
+
+class FakeClock:
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class StandInRedis:
+    """In-memory stand-in for the few Redis commands RedisBackend uses."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    def _get(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires <= self.clock():
+            del self.data[key]
+            return None
+        return value
+
+    def mget(self, keys):
+        return [self._get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (str(value).encode(), self.clock() + ex if ex else None)
+
+    def incr(self, key):
+        value = int(self._get(key) or 0) + 1
+        self.data[key] = (str(value).encode(), self.data.get(key, (None, None))[1])
+        return value
+
+    def expire(self, key, seconds):
+        if key in self.data:
+            self.data[key] = (self.data[key][0], self.clock() + seconds)
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+            def execute(self):
+                return [getattr(redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+        return Pipeline()
+
+
+class LimiterBehaviour:
+    """Limiter tests run against every backend."""
+
+    def make_backend(self, clock):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.backend = self.make_backend(self.clock)
+        self.limiter = RateLimiter(self.backend, limits={'ip': 10, 'email': 3}, window=60,
+                                   backoff_base=30, backoff_max=120, clock=self.clock, progressive=('ip',))
+
+    def test_blocks_ip_over_limit_with_progressive_backoff(self):
+        emails = [f'{i}@example.com' for i in range(11)] # None of them over its own limit
+        for email in emails[:10]:
+            self.assertTrue(self.limiter.hit(ip='1.1.1.1', email=email).allowed)
+        decision = self.limiter.hit(ip='1.1.1.1', email=emails[10])
+        self.assertEqual((decision.allowed, decision.scope, decision.retry_after), (False, 'ip', 30))
+        self.assertFalse(self.limiter.hit(ip='1.1.1.1', email='fresh@example.com').allowed)
+        self.assertTrue(self.limiter.hit(ip='2.2.2.2', email='fresh@example.com').allowed)
+
+        # The next violation after the block doubles it, up to the cap
+        backoffs = []
+        for _ in range(3):
+            self.clock.now += 200
+            for email in emails:
+                decision = self.limiter.hit(ip='1.1.1.1', email=email)
+            backoffs.append(decision.retry_after)
+        self.assertEqual(backoffs, [60, 120, 120])
+
+        self.limiter.reset('ip', '1.1.1.1')
+        self.clock.now += 200
+        for email in emails[:10]:
+            self.assertTrue(self.limiter.hit(ip='1.1.1.1', email=email).allowed)
+        self.assertEqual(self.limiter.hit(ip='1.1.1.1', email=emails[10]).retry_after, 30)
+
+    def test_email_over_limit_is_throttled_without_backoff(self):
+        for _ in range(3):
+            self.assertTrue(self.limiter.hit(ip='1.1.1.1', email='a@example.com').allowed)
+        decision = self.limiter.hit(ip='1.1.1.1', email='a@example.com')
+        # 40s into the window: throttled for the 20s left of it, not blocked
+        self.assertEqual((decision.allowed, decision.scope, decision.retry_after), (False, 'email', 20))
+
+        # Another IP hitting the same email is throttled too; other emails are not
+        self.assertFalse(self.limiter.hit(ip='2.2.2.2', email='a@example.com').allowed)
+        self.assertTrue(self.limiter.hit(ip='1.1.1.1', email='b@example.com').allowed)
+
+        # Repeat offences do not lengthen it, and the owner gets in once the count fades
+        for _ in range(3):
+            self.clock.now += 200
+            for _ in range(4):
+                decision = self.limiter.hit(ip='3.3.3.3', email='a@example.com')
+            self.assertLessEqual(decision.retry_after, 60)
+        self.assertEqual(self.backend.get_many(['email:a@example.com:blocked', 'email:a@example.com:strikes']),
+                         [None, None])
+        self.clock.now += 120
+        self.assertTrue(self.limiter.hit(ip='4.4.4.4', email='a@example.com').allowed)
+
+    def test_every_scope_is_progressive_by_default(self):
+        limiter = RateLimiter(self.backend, limits={'email': 1}, backoff_base=30, clock=self.clock)
+        limiter.hit(email='c@example.com')
+        self.assertEqual(limiter.hit(email='c@example.com').retry_after, 30)
+
+    @unittest.skipIf(prometheus_client is None, 'prometheus_client is not installed')
+    def test_decisions_are_counted(self):
+        labels = [('allowed', 'none'), ('throttled', 'email'), ('throttled', 'ip')]
+        before = [sample('login_rate_limit_total', result=r, scope=s) for r, s in labels]
+        for _ in range(4):
+            self.limiter.hit(ip='5.5.5.5', email='d@example.com')
+        self.limiter.hit(ip='5.5.5.5', email='e@example.com')
+        after = [sample('login_rate_limit_total', result=r, scope=s) for r, s in labels]
+        self.assertEqual([a - b for a, b in zip(after, before)], [4, 1, 0])
+
+    def test_sliding_window_counts_previous_window(self):
+        self.clock.now = 60 * 1000 + 50 # Late in a window
+        for _ in range(3):
+            self.assertTrue(self.limiter.hit(email='c@example.com').allowed)
+        # 15s into the next window, 3 * 0.75 of the previous window still counts
+        self.clock.now += 25
+        self.assertFalse(self.limiter.hit(email='c@example.com').allowed)
+
+        self.clock.now = 60 * 2000 + 50
+        for _ in range(3):
+            self.limiter.hit(email='d@example.com')
+        # 50s into the next window only 3 * 1/6 of it is left
+        self.clock.now += 60
+        self.assertTrue(self.limiter.hit(email='d@example.com').allowed)
+        self.assertTrue(self.limiter.hit(email='d@example.com').allowed)
+
+
+class MemoryBackendTestCase(LimiterBehaviour, unittest.TestCase):
+    def make_backend(self, clock):
+        return MemoryBackend(clock=clock)
+
+
+class RedisBackendTestCase(LimiterBehaviour, unittest.TestCase):
+    def make_backend(self, clock):
+        return RedisBackend(StandInRedis(clock))
+
+
+class SharedMemoryBackendTestCase(LimiterBehaviour, unittest.TestCase):
+    def make_backend(self, clock):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.unlink, self.path)
+        backend = SharedMemoryBackend(self.path, slots=1024, clock=clock)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_counters_shared_across_processes(self):
+        code = (
+            'import sys; from backend.rate_limit import SharedMemoryBackend; '
+            'backend = SharedMemoryBackend(sys.argv[1], slots=1024); '
+            '[backend.incr("shared-key", ttl=60) for _ in range(5)]'
+        )
+        subprocess.run([sys.executable, '-c', code, self.path], check=True)
+        local = SharedMemoryBackend(self.path, slots=1024)
+        self.addCleanup(local.close)
+        self.assertEqual(local.incr('shared-key', ttl=60), 6)
+
+    def test_full_table_evicts_instead_of_failing(self):
+        backend = SharedMemoryBackend(self.path, slots=4, probe=4, clock=self.clock)
+        self.addCleanup(backend.close)
+        for i in range(10):
+            backend.set(f'key-{i}', i, ttl=60 + i)
+        self.assertEqual(backend.get_many(['key-9'])[0], 9)
+
+
+class LoginRateLimitTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        app.config.update(LOGIN_RATE_LIMIT=True, LOGIN_LIMIT_PER_EMAIL=2, LOGIN_LIMIT_PER_IP=100)
+        app.extensions.pop('login_limiter', None)
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+        self.client.post('/api/register', json={'email': 'limited@example.com', 'password': 'password123'})
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        app.config.from_object(TestConfig)
+        app.extensions.pop('login_limiter', None)
+
+    def login(self, password, email='limited@example.com'):
+        return self.client.post('/api/login', data=json.dumps({'email': email, 'password': password}),
+                                content_type='application/json')
+
+    def test_throttled_before_lookup_and_hash(self):
+        self.assertEqual(self.login('wrong-password').status_code, 401)
+        self.assertEqual(self.login('wrong-password').status_code, 401)
+
+        statements = []
+        with app.app_context():
+            engine = db.engine
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            response = self.login('password123', email='LIMITED@example.com')
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+        self.assertEqual(response.status_code, 429)
+        self.assertLessEqual(int(response.headers['Retry-After']), TestConfig.LOGIN_LIMIT_WINDOW)
+        self.assertEqual(statements, [])
+
+        # Other accounts from the same IP are unaffected
+        self.assertEqual(self.login('password123', email='other@example.com').status_code, 401)
+
+    def test_failed_logins_for_an_email_do_not_lock_its_owner_out(self):
+        clock = FakeClock()
+        backend = MemoryBackend(clock=clock)
+        with app.app_context():
+            limiter = get_login_limiter() # As configured, on a clock the test controls
+        limiter.backend, limiter.clock = backend, clock
+        # Someone else's failures count against the normalized email
+        for _ in range(2):
+            self.assertEqual(self.login('wrong-password', email='Limited@Example.com').status_code, 401)
+        for _ in range(5):
+            self.assertEqual(self.login('password123', email=' LIMITED@example.com ').status_code, 429)
+        keys = ['email:limited@example.com:blocked', 'email:limited@example.com:strikes']
+        self.assertEqual(backend.get_many(keys), [None, None])
+
+        clock.now += 120 # Past both counting windows
+        self.assertEqual(self.login('password123', email='limited@example.com').status_code, 200)
+
+    def test_fails_open_when_store_is_down(self):
+        class BrokenBackend:
+            def __getattr__(self, name):
+                raise ConnectionError('store is down')
+        app.extensions['login_limiter'] = RateLimiter(BrokenBackend(), limits={'ip': 1, 'email': 1})
+        for _ in range(3):
+            self.assertEqual(self.login('password123').status_code, 200)
+
+
+# Runs in a child interpreter, since the proxy setting is applied when the app is created
+_BEHIND_PROXY = '''
+from backend.app import app
+client = app.test_client()
+for address in ('198.51.100.1', '198.51.100.1', '198.51.100.2'):
+    response = client.post('/api/login', json={'email': 'nobody@example.com', 'password': 'password123'},
+                           headers={'X-Forwarded-For': address})
+    print(response.status_code)
+'''
+
+
+class TrustedProxyTestCase(unittest.TestCase):
+    def statuses(self, hops):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.addCleanup(os.unlink, db_path)
+        engine = create_engine(f'sqlite:///{db_path}')
+        db.metadata.create_all(engine)
+        engine.dispose()
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', TRUSTED_PROXY_HOPS=str(hops),
+                   RATE_LIMIT_BACKEND='memory', LOGIN_LIMIT_PER_IP='1', LOGIN_LIMIT_PER_EMAIL='100',
+                   USER_CACHE_ENABLED='false', AUTH_EVENTS_ENABLED='false')
+        output = subprocess.run([sys.executable, '-c', _BEHIND_PROXY], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        return [int(line) for line in output.split()]
+
+    def test_clients_behind_the_proxy_get_their_own_limit(self):
+        self.assertEqual(self.statuses(hops=1), [401, 429, 401])
+
+    def test_forwarded_header_is_ignored_without_trusted_proxies(self):
+        self.assertEqual(self.statuses(hops=0), [401, 429, 429])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import datetime
+import decimal
+import json
+import unittest
+
+from flask.json.provider import DefaultJSONProvider
+
+from backend import hashing, schemas
+from backend.app import app, db, User
+from backend.json_provider import OrjsonProvider, json_provider_class, orjson
+from backend.tests.test_config import TestConfig
+
+
+class SchemaTestCase(unittest.TestCase):
+    def test_valid_body(self):
+        values, errors = schemas.REGISTER.validate({'email': 'a@example.com', 'password': 'password123',
+                                                    'extra': 'ignored'})
+        self.assertEqual(errors, [])
+        self.assertEqual(values, {'email': 'a@example.com', 'password': 'password123', 'username': None})
+
+    def test_errors_in_field_order(self):
+        values, errors = schemas.REGISTER.validate({'email': 'not-an-email', 'password': 'short', 'username': 7})
+        self.assertEqual([(e['field'], e['code']) for e in errors],
+                         [('email', 'format'), ('password', 'min_length'), ('username', 'type')])
+        self.assertEqual(errors[0]['message'], 'Invalid email format')
+        self.assertEqual(errors[1]['message'], 'Password must be at least 8 characters long')
+        self.assertEqual(errors[2]['message'], 'Username must be a string')
+
+    def test_empty_values_are_missing(self):
+        _, errors = schemas.LOGIN.validate({'email': '', 'password': None})
+        self.assertEqual([e['message'] for e in errors], ['Email is required', 'Password is required'])
+
+    def test_optional_field_may_be_empty(self):
+        values, errors = schemas.REGISTER.validate({'email': 'a@example.com', 'password': 'password123',
+                                                    'username': ''})
+        self.assertEqual(errors, [])
+        self.assertIsNone(values['username'])
+
+    def test_bcrypt_password_byte_limit(self):
+        body = {'email': 'a@example.com', 'password': 'é' * 37} # 37 characters, 74 bytes
+        self.assertEqual(schemas.REGISTER.validate(body)[1], [])
+        _, errors = schemas.REGISTER_BCRYPT.validate(body)
+        self.assertEqual([(e['field'], e['code'], e['message']) for e in errors],
+                         [('password', 'max_bytes', 'Password must be at most 72 bytes long')])
+        self.assertEqual(schemas.REGISTER_BCRYPT.validate(dict(body, password='é' * 36))[1], [])
+        self.assertEqual(schemas.LOGIN.validate(body)[1], [])
+
+
+class ValidationResponseTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_first_error_is_the_message(self):
+        response = self.client.post('/api/register', json={'email': 'bad', 'password': 'x'})
+        self.assertEqual(response.status_code, 400)
+        data = response.get_json()
+        self.assertEqual(data['message'], 'Invalid email format')
+        self.assertEqual([e['field'] for e in data['errors']], ['email', 'password'])
+
+    def test_non_string_password_is_rejected(self):
+        # Used to reach bcrypt and fail with a 500
+        response = self.client.post('/api/login', json={'email': 'a@example.com', 'password': 12345678})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['errors'][0]['code'], 'type')
+
+    def test_password_over_bcrypt_limit_is_rejected(self):
+        # bcrypt 5 raises on it, which used to be a 500
+        body = {'email': 'long@example.com', 'password': 'p' * 100}
+        response = self.client.post('/api/register', json=body)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['errors'][0]['code'], 'max_bytes')
+
+    def test_long_password_of_an_older_account_still_logs_in(self):
+        # Registered before the limit, when bcrypt silently used the first 72 bytes
+        with app.app_context():
+            user = User(email='long@example.com', username='long')
+            user.password_hash = hashing.hash_password('p' * 72, 'bcrypt', 4)
+            db.session.add(user)
+            db.session.commit()
+        response = self.client.post('/api/login', json={'email': 'long@example.com', 'password': 'p' * 100})
+        self.assertEqual(response.status_code, 200)
+
+    @unittest.skipIf('argon2id' not in hashing.HASHERS, 'argon2-cffi is not installed')
+    def test_long_password_with_argon2id(self):
+        app.config.update(PASSWORD_HASHER='argon2id', PASSWORD_HASH_COST=1)
+        # The executor is built for the hasher configured when it was first used
+        self.addCleanup(app.extensions.__setitem__, 'hashing_executor', app.extensions.pop('hashing_executor', None))
+        body = {'email': 'long@example.com', 'password': 'p' * 100}
+        self.assertEqual(self.client.post('/api/register', json=body).status_code, 201)
+        self.assertEqual(self.client.post('/api/login', json=body).status_code, 200)
+
+    def test_non_object_and_malformed_bodies(self):
+        for body in ('[1, 2]', '{"email": ', 'null'):
+            response = self.client.post('/api/login', data=body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+            self.assertEqual(response.get_json()['message'], 'Request body must be JSON')
+
+    def test_refresh_token_type(self):
+        response = self.client.post('/api/token/refresh', json={'refresh_token': ['a']})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['message'], 'Refresh token must be a string')
+
+
+@unittest.skipIf(orjson is None, 'orjson is not installed')
+class OrjsonProviderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.orjson = OrjsonProvider(app)
+        self.stdlib = DefaultJSONProvider(app)
+
+    def test_output_matches_stdlib(self):
+        obj = {'b': 1, 'a': [True, None, 1.5], 'n': {3: 'x'}, 'when': datetime.datetime(2024, 1, 2, 3, 4, 5),
+               'amount': decimal.Decimal('1.10')}
+        with app.app_context():
+            self.assertEqual(self.orjson.response(obj).get_data(), self.stdlib.response(obj).get_data())
+
+    def test_loads(self):
+        self.assertEqual(self.orjson.loads(b'{"a": [1, "\\u00e9"]}'), {'a': [1, 'é']})
+        with self.assertRaises(ValueError):
+            self.orjson.loads('{')
+
+    def test_stdlib_arguments_fall_back(self):
+        self.assertEqual(self.orjson.dumps({'b': 1, 'a': 2}, indent=2), json.dumps({'a': 2, 'b': 1}, indent=2))
+
+    def test_provider_selection(self):
+        self.assertIs(json_provider_class('auto'), OrjsonProvider)
+        self.assertIs(json_provider_class('stdlib'), DefaultJSONProvider)
+        with self.assertRaises(ValueError):
+            json_provider_class('ujson')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from backend.app import app, db, User
+from backend.services import resolve_oauth_user
+from backend.tests.test_config import TestConfig
+
+class ResolveOAuthUserTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_create_then_existing(self):
+        created = resolve_oauth_user('github', '100', 'octo@example.com', 'octo')
+        db.session.commit()
+        self.assertEqual(created.outcome, 'created')
+        user = db.session.get(User, created.id)
+        self.assertEqual((user.email, user.username, user.github_id), ('octo@example.com', 'octo', '100'))
+
+        existing = resolve_oauth_user('github', '100', 'octo@example.com', 'octo')
+        self.assertEqual((existing.id, existing.outcome), (created.id, 'existing'))
+
+    def test_link_by_email(self):
+        db.session.add(User(email='linked@example.com', username='linked'))
+        db.session.commit()
+        resolved = resolve_oauth_user('google', 'g-1', 'linked@example.com', 'linked')
+        db.session.commit()
+        self.assertEqual(resolved.outcome, 'linked')
+        self.assertEqual(db.session.get(User, resolved.id).google_id, 'g-1')
+        self.assertEqual(User.query.count(), 1)
+        self.assertIsNone(resolved.replaced_id)
+
+    def test_link_reports_the_replaced_provider_id(self):
+        db.session.add(User(email='relinked@example.com', username='relinked', github_id='old'))
+        db.session.commit()
+        resolved = resolve_oauth_user('github', 'new', 'relinked@example.com', 'relinked')
+        db.session.commit()
+        self.assertEqual((resolved.outcome, resolved.replaced_id), ('linked', 'old'))
+        self.assertEqual(db.session.get(User, resolved.id).github_id, 'new')
+
+    def test_username_collisions_get_free_suffix(self):
+        """Test that taken usernames fall through to the first free numbered suffix."""
+        db.session.add_all([User(email='a@example.com', username='octo'),
+                            User(email='b@example.com', username='octo_1')])
+        db.session.commit()
+        resolved = resolve_oauth_user('github', '200', 'c@example.com', 'octo')
+        db.session.commit()
+        self.assertEqual(db.session.get(User, resolved.id).username, 'octo_2')
+
+    def test_statement_count(self):
+        """Test that a sign-in creating an account is one statement on Postgres."""
+        from sqlalchemy import event
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            resolve_oauth_user('github', '300', 'count@example.com', 'count')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        expected = 1 if db.engine.dialect.name == 'postgresql' else 3
+        self.assertEqual(len(statements), expected)
+
+    def test_unknown_provider(self):
+        with self.assertRaises(ValueError):
+            resolve_oauth_user('myspace', '1', 'x@example.com', 'x')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import os
+import tempfile
+import jwt
+from backend.app import app, db
+from backend.signing_keys import generate_private_key, private_key_pem
+from backend.tests.test_config import TestConfig
+
+ED_KEY = private_key_pem(generate_private_key('ed25519')).decode()
+RSA_KEY = private_key_pem(generate_private_key('rsa')).decode()
+
+class SigningKeysTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        self.use_keys({'2026-a': RSA_KEY, '2026-b': ED_KEY})
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+        self.client.post('/api/register', json={'email': 'keys@example.com', 'password': 'password123'})
+
+    def tearDown(self):
+        self.use_keys({})
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def use_keys(self, keys, active_kid=None):
+        app.config['JWT_PRIVATE_KEYS'] = keys
+        app.config['JWT_ACTIVE_KID'] = active_kid
+        app.extensions.pop('signing_keys', None)
+        app.extensions.pop('token_cache', None)
+
+    def login(self):
+        response = self.client.post('/api/login', json={'email': 'keys@example.com', 'password': 'password123'})
+        return response.get_json()['access_token']
+
+    def me(self, token):
+        return self.client.get('/api/me', headers={'Authorization': f'Bearer {token}'})
+
+    def test_newest_key_signs(self):
+        token = self.login()
+        self.assertEqual(jwt.get_unverified_header(token), {'alg': 'EdDSA', 'kid': '2026-b', 'typ': 'JWT'})
+        self.assertEqual(self.me(token).status_code, 200)
+
+    def test_verifies_locally_with_jwks(self):
+        """Test that a service holding only the JWKS can verify tokens."""
+        jwks = jwt.PyJWKSet.from_dict(self.client.get('/.well-known/jwks.json').get_json())
+        for active_kid in ('2026-a', '2026-b'):
+            self.use_keys({'2026-a': RSA_KEY, '2026-b': ED_KEY}, active_kid)
+            token = self.login()
+            key = jwks[jwt.get_unverified_header(token)['kid']]
+            claims = jwt.decode(token, key.key, algorithms=[key.algorithm_name])
+            self.assertEqual(claims['email'], 'keys@example.com')
+
+    def test_rotation(self):
+        self.use_keys({'2026-a': RSA_KEY}, '2026-a')
+        old_token = self.login()
+        # The new key is published before it signs, then takes over
+        self.use_keys({'2026-a': RSA_KEY, '2026-b': ED_KEY}, '2026-a')
+        self.assertEqual(len(self.client.get('/.well-known/jwks.json').get_json()['keys']), 2)
+        self.use_keys({'2026-a': RSA_KEY, '2026-b': ED_KEY}, '2026-b')
+        new_token = self.login()
+        self.assertEqual(self.me(old_token).status_code, 200)
+        self.assertEqual(self.me(new_token).status_code, 200)
+        # Retiring the old key ends its tokens
+        self.use_keys({'2026-b': ED_KEY})
+        self.assertEqual(self.me(old_token).status_code, 401)
+        self.assertEqual(self.me(new_token).status_code, 200)
+
+    def test_hs256_tokens(self):
+        self.use_keys({})
+        hs256_token = self.login()
+        self.assertEqual(jwt.get_unverified_header(hs256_token)['alg'], 'HS256')
+        self.assertEqual(self.client.get('/.well-known/jwks.json').get_json(), {'keys': []})
+
+        self.use_keys({'2026-b': ED_KEY})
+        self.assertEqual(self.me(hs256_token).status_code, 401)
+        app.config['JWT_ACCEPT_HS256'] = True
+        self.assertEqual(self.me(hs256_token).status_code, 200)
+        # Not even the switch-over lets an HS256 token name a key
+        forged = jwt.encode({'user_id': 1, 'email': 'x@example.com', 'exp': 2**31}, 'guess',
+                            algorithm='HS256', headers={'kid': '2026-b'})
+        self.assertEqual(self.me(forged).status_code, 401)
+
+    def test_jwks_caching(self):
+        response = self.client.get('/.well-known/jwks.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cache_control.max_age, TestConfig.JWKS_MAX_AGE)
+        self.assertTrue(response.cache_control.public)
+        self.assertEqual([key['kid'] for key in response.get_json()['keys']], ['2026-a', '2026-b'])
+        self.assertNotIn('d', response.get_json()['keys'][1]) # No private parts
+        again = self.client.get('/.well-known/jwks.json', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as keys_dir:
+            app.config['JWT_KEYS_DIR'] = keys_dir
+            self.use_keys({})
+            try:
+                runner = app.test_cli_runner()
+                result = runner.invoke(args=['keys', 'generate', '--type', 'rsa', '--kid', 'k1'])
+                self.assertEqual(result.exit_code, 0, result.output)
+                self.assertEqual(os.listdir(keys_dir), ['k1.pem'])
+                result = runner.invoke(args=['keys', 'list'])
+                self.assertIn('k1  RS256  (signing)', result.output)
+                self.assertEqual(jwt.get_unverified_header(self.login())['kid'], 'k1')
+            finally:
+                app.config['JWT_KEYS_DIR'] = None
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+import unittest
+
+class LazyProviderImportTestCase(unittest.TestCase):
+    def test_app_import_skips_provider_libraries(self):
+        """Test that importing the app does not load the OAuth client libraries."""
+        code = (
+            'import sys; import backend.app; '
+            "print(','.join(m for m in ('google.auth', 'google.oauth2', 'requests') if m in sys.modules))"
+        )
+        env = dict(os.environ, DATABASE_URL='sqlite:///:memory:')
+        output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), '')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+import unittest
+import json
+import time
+import datetime
+import jwt
+from backend.app import app, db, RefreshToken, RevokedToken, revocation_list
+from backend.tokens import RevocationList, VerifiedTokenCache, get_token_cache
+from backend.tests.test_config import TestConfig
+
+def at(seconds):
+    """A revoked_at ``seconds`` after an arbitrary start."""
+    return datetime.datetime(2025, 1, 1) + datetime.timedelta(seconds=seconds)
+
+
+class VerifiedTokenCacheTestCase(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = VerifiedTokenCache(maxsize=2)
+        exp = time.time() + 60
+        cache.put('a', {'exp': exp})
+        cache.put('b', {'exp': exp})
+        cache.get('a') # 'b' is now least recently used
+        cache.put('c', {'exp': exp})
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_entries_expire_with_token(self):
+        cache = VerifiedTokenCache()
+        cache.put('expired', {'exp': time.time() - 1})
+        self.assertIsNone(cache.get('expired'))
+        self.assertEqual(len(cache), 0)
+
+
+class RevocationListTestCase(unittest.TestCase):
+    def test_sync_from_loader(self):
+        rows = [(at(0), 'sid-a', time.time() + 60), (at(1), 'sid-expired', time.time() - 1)]
+        seen_since = []
+
+        def loader(since):
+            seen_since.append(since)
+            return [row for row in rows if since is None or row[0] >= since]
+
+        revocations = RevocationList(loader=loader, sync_interval=0, overlap=30)
+        self.assertTrue(revocations.is_revoked('sid-a'))
+        self.assertFalse(revocations.is_revoked('sid-expired'))
+        rows.append((at(100), 'sid-b', time.time() + 60))
+        self.assertTrue(revocations.is_revoked(None, 'sid-b'))
+        self.assertEqual(seen_since[1], at(1 - 30)) # The newest seen, less the overlap
+        revocations.is_revoked('sid-a')
+        self.assertEqual(seen_since[-1], at(100 - 30))
+
+    def test_late_commit_within_the_overlap_is_synced(self):
+        rows = [(at(10), 'sid-b', time.time() + 60)]
+        revocations = RevocationList(loader=lambda since: [r for r in rows if since is None or r[0] >= since],
+                                     sync_interval=0, overlap=30)
+        self.assertTrue(revocations.is_revoked('sid-b'))
+        # Revoked (and timestamped) before sid-b, but committed after sid-b was synced
+        rows.append((at(5), 'sid-a', time.time() + 60))
+        self.assertTrue(revocations.is_revoked('sid-a'))
+
+    def test_sync_interval_limits_loader_calls(self):
+        calls = []
+        revocations = RevocationList(loader=lambda since: calls.append(since) or [], sync_interval=60)
+        for _ in range(5):
+            revocations.is_revoked('anything')
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_sync_keeps_the_last_synced_set(self):
+        rows = [(at(0), 'sid-a', time.time() + 60)]
+        failing = []
+
+        def loader(since):
+            if failing:
+                raise RuntimeError('database is down')
+            return [row for row in rows if since is None or row[0] >= since]
+
+        revocations = RevocationList(loader=loader, sync_interval=0)
+        self.assertTrue(revocations.is_revoked('sid-a'))
+        failing.append(True)
+        rows.append((at(1), 'sid-b', time.time() + 60))
+        with self.assertLogs('backend.tokens', 'ERROR'):
+            self.assertTrue(revocations.is_revoked('sid-a'))
+        self.assertFalse(revocations.is_revoked('sid-b'))
+        failing.clear()
+        self.assertTrue(revocations.is_revoked('sid-b'))
+
+
+class MeEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        app.testing = True
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+            get_token_cache().clear()
+        revocation_list.reset()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, full=False):
+        payload = {'email': 'me@example.com', 'password': 'password123'}
+        self.client.post('/api/register', data=json.dumps(payload), content_type='application/json')
+        response = self.client.post('/api/login', data=json.dumps(payload), content_type='application/json')
+        data = json.loads(response.data)
+        return data if full else data['access_token']
+
+    def refresh(self, refresh_token):
+        return self.client.post('/api/token/refresh', data=json.dumps({'refresh_token': refresh_token}),
+                                content_type='application/json')
+
+    def test_access_token_is_short_lived(self):
+        data = self.login(full=True)
+        self.assertEqual(data['expires_in'], TestConfig.ACCESS_TOKEN_TTL_MINUTES * 60)
+        claims = jwt.decode(data['access_token'], app.config['SECRET_KEY'], algorithms=['HS256'])
+        self.assertLessEqual(claims['exp'] - claims['iat'], 15 * 60)
+        self.assertIn('jti', claims)
+        self.assertIn('sid', claims)
+
+    def test_refresh_rotates_token(self):
+        data = self.login(full=True)
+        response = self.refresh(data['refresh_token'])
+        self.assertEqual(response.status_code, 200)
+        rotated = json.loads(response.data)
+        self.assertNotEqual(rotated['refresh_token'], data['refresh_token'])
+        old_claims = jwt.decode(data['access_token'], app.config['SECRET_KEY'], algorithms=['HS256'])
+        new_claims = jwt.decode(rotated['access_token'], app.config['SECRET_KEY'], algorithms=['HS256'])
+        self.assertEqual(old_claims['sid'], new_claims['sid'])
+
+        response = self.client.get('/api/me', headers={'Authorization': f"Bearer {rotated['access_token']}"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_refresh_token_reuse_revokes_session(self):
+        """Test that presenting a rotated-out refresh token ends the whole session."""
+        data = self.login(full=True)
+        rotated = json.loads(self.refresh(data['refresh_token']).data)
+
+        response = self.refresh(data['refresh_token'])
+        self.assertEqual(response.status_code, 401)
+        # The legitimate successor and the session's access tokens are revoked too
+        self.assertEqual(self.refresh(rotated['refresh_token']).status_code, 401)
+        response = self.client.get('/api/me', headers={'Authorization': f"Bearer {rotated['access_token']}"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_replays_add_a_single_revocation(self):
+        data = self.login(full=True)
+        self.refresh(data['refresh_token'])
+        for _ in range(3):
+            self.assertEqual(self.refresh(data['refresh_token']).status_code, 401)
+            response = self.client.post('/api/token/revoke', data=json.dumps({'refresh_token': data['refresh_token']}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        with app.app_context():
+            self.assertEqual(RevokedToken.query.count(), 1)
+
+    def test_refresh_for_a_deleted_user_is_rejected(self):
+        data = self.login(full=True)
+        with app.app_context():
+            db.session.execute(db.text("DELETE FROM users WHERE email = 'me@example.com'"))
+            db.session.commit()
+        self.assertEqual(self.refresh(data['refresh_token']).status_code, 401)
+        with app.app_context():
+            self.assertEqual(RefreshToken.query.filter_by(revoked_at=None).count(), 0)
+
+    def test_refresh_cookie_is_rotated_and_cleared(self):
+        refresh_token = self.login(full=True)['refresh_token'] # As an OAuth sign-in would have set it
+        self.client.set_cookie('refresh_token', refresh_token, path='/api/token')
+
+        response = self.client.post('/api/token/refresh')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('refresh_token', response.get_json()) # Only in the rotated cookie
+        rotated = self.client.get_cookie('refresh_token', path='/api/token').value
+        self.assertNotEqual(rotated, refresh_token)
+
+        self.assertEqual(self.client.post('/api/token/revoke').status_code, 200)
+        self.assertIsNone(self.client.get_cookie('refresh_token', path='/api/token'))
+        self.assertEqual(self.refresh(rotated).status_code, 401)
+
+    def test_revoke_denies_cached_access_token(self):
+        data = self.login(full=True)
+        headers = {'Authorization': f"Bearer {data['access_token']}"}
+        self.assertEqual(self.client.get('/api/me', headers=headers).status_code, 200) # Now cached
+
+        response = self.client.post('/api/token/revoke', data=json.dumps({'refresh_token': data['refresh_token']}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/me', headers=headers)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.refresh(data['refresh_token']).status_code, 401)
+
+    def test_revocation_from_another_process_is_synced(self):
+        data = self.login(full=True)
+        sid = jwt.decode(data['access_token'], app.config['SECRET_KEY'], algorithms=['HS256'])['sid']
+        with app.app_context():
+            # As written by another worker; this process only sees it through the sync
+            db.session.add(RevokedToken(token_id=sid, expires_at=datetime.datetime.utcnow() + datetime.timedelta(minutes=15)))
+            db.session.commit()
+        revocation_list.sync_interval = 0
+        try:
+            response = self.client.get('/api/me', headers={'Authorization': f"Bearer {data['access_token']}"})
+        finally:
+            revocation_list.sync_interval = TestConfig.REVOCATION_SYNC_SECONDS
+        self.assertEqual(response.status_code, 401)
+
+    def test_sync_rereads_the_overlap(self):
+        with app.app_context():
+            now = datetime.datetime.utcnow()
+            expires_at = now + datetime.timedelta(minutes=15)
+            db.session.add(RevokedToken(token_id='newer', expires_at=expires_at, revoked_at=now))
+            db.session.commit()
+            revocation_list.sync_interval = 0
+            try:
+                self.assertTrue(revocation_list.is_revoked('newer'))
+                # Committed after 'newer' was synced, with an earlier id and timestamp
+                db.session.add(RevokedToken(token_id='late', expires_at=expires_at,
+                                            revoked_at=now - datetime.timedelta(seconds=10)))
+                db.session.commit()
+                self.assertTrue(revocation_list.is_revoked('late'))
+            finally:
+                revocation_list.sync_interval = TestConfig.REVOCATION_SYNC_SECONDS
+
+    def test_invalid_refresh_token(self):
+        self.assertEqual(self.refresh('not-a-real-token').status_code, 401)
+
+    def test_me_returns_claims(self):
+        token = self.login()
+        for _ in range(2):
+            response = self.client.get('/api/me', headers={'Authorization': f'Bearer {token}'})
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertEqual(data['email'], 'me@example.com')
+            self.assertIn('user_id', data)
+        with app.app_context():
+            self.assertEqual(get_token_cache().hits, 1)
+
+    def test_me_rejects_missing_and_invalid_tokens(self):
+        response = self.client.get('/api/me')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('missing', json.loads(response.data)['message'])
+
+        forged = jwt.encode({'user_id': 1, 'email': 'x@example.com', 'exp': time.time() + 60},
+                            'not_the_secret_key_at_all_not_it', algorithm='HS256')
+        response = self.client.get('/api/me', headers={'Authorization': f'Bearer {forged}'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.data)['message'], 'Invalid token')
+
+    def test_me_rejects_expired_token(self):
+        expired = jwt.encode({'user_id': 1, 'email': 'x@example.com',
+                              'exp': datetime.datetime.utcnow() - datetime.timedelta(seconds=1)},
+                             app.config['SECRET_KEY'], algorithm='HS256')
+        response = self.client.get('/api/me', headers={'Authorization': f'Bearer {expired}'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.data)['message'], 'Token has expired')
+
+if __name__ == '__main__':
+    unittest.main()
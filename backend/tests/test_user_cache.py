@@ -0,0 +1,150 @@
+import unittest
+
+from backend.app import app, db, User
+from backend.query_stats import record_queries
+from backend.tests.test_config import TestConfig
+from backend.user_cache import (CachedUser, MemoryBackend, UserCache, get_user_cache, resolve_oauth_user_cached,
+                                user_by_email)
+
+
+class MemoryBackendTestCase(unittest.TestCase):
+    def test_lru_and_ttl(self):
+        now = [1000.0]
+        backend = MemoryBackend(maxsize=2, clock=lambda: now[0])
+        backend.set('a', CachedUser(1, 'a@example.com', None), ttl=10)
+        backend.set('b', CachedUser(2, 'b@example.com', None), ttl=10)
+        backend.get('a')
+        backend.set('c', CachedUser(3, 'c@example.com', None), ttl=10)
+        self.assertIsNone(backend.get('b')) # Least recently used
+        self.assertEqual(backend.get('a').id, 1)
+        now[0] += 10
+        self.assertIsNone(backend.get('a'))
+
+    def test_fill_racing_an_invalidation_is_dropped(self):
+        cache = UserCache(MemoryBackend())
+
+        def loader():
+            # The row changes and is invalidated while this (old) row is in flight
+            cache.invalidate(['email:a@example.com'])
+            return CachedUser(1, 'a@example.com', 'old-hash')
+        self.assertEqual(cache.get('email', 'a@example.com', loader).password_hash, 'old-hash')
+        self.assertEqual(len(cache.backend), 0)
+
+
+class UserCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        app.config['USER_CACHE_ENABLED'] = True
+        app.extensions.pop('user_cache', None)
+        self.client = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        user = User(email='cached@example.com', username='cached', github_id='gh-1')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+        db.session.remove()
+
+    def tearDown(self):
+        app.extensions.pop('user_cache', None)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def login(self, password='password123', email='cached@example.com'):
+        return self.client.post('/api/login', json={'email': email, 'password': password})
+
+    def test_login_is_answered_from_the_cache(self):
+        with record_queries() as first:
+            self.assertEqual(self.login().status_code, 200)
+        with record_queries(keep_statements=True) as second:
+            self.assertEqual(self.login(email='Cached@Example.com').status_code, 200)
+        self.assertEqual(second.count, first.count - 1)
+        self.assertFalse(any('FROM users' in statement for statement in second.statements))
+        stats = get_user_cache().stats.snapshot()
+        self.assertEqual((stats['hits_email'], stats['misses_email']), (1, 1))
+
+    def test_password_change_invalidates(self):
+        self.login()
+        user = db.session.get(User, self.user_id)
+        user.set_password('new-password')
+        db.session.commit()
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login('new-password').status_code, 200)
+
+    def test_email_change_invalidates_the_old_email(self):
+        self.login()
+        db.session.get(User, self.user_id).email = 'renamed@example.com'
+        db.session.commit()
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login(email='renamed@example.com').status_code, 200)
+
+    def test_expired_user_change_still_invalidates(self):
+        self.assertIsNotNone(user_by_email('cached@example.com'))
+        user = User.query.filter_by(id=self.user_id).one()
+        db.session.commit() # Expires ``user``: its email is no longer loaded
+        user.set_password('new-password')
+        db.session.commit()
+        self.assertEqual(self.login().status_code, 401)
+
+    def test_rollback_keeps_entries(self):
+        self.login()
+        db.session.get(User, self.user_id).set_password('never-committed')
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(get_user_cache().stats.snapshot()['invalidations'], 0)
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_bulk_update_clears_the_cache(self):
+        user_by_email('cached@example.com')
+        User.query.filter_by(id=self.user_id).update({'email': 'bulk@example.com'})
+        db.session.commit()
+        self.assertEqual(len(get_user_cache().backend), 0)
+
+    def test_oauth_returning_user(self):
+        # The first sign-in finds the linked account and fills the cache; the next ones read it
+        first = resolve_oauth_user_cached('github', 'gh-1', 'cached@example.com', 'cached')
+        self.assertEqual(first.id, self.user_id)
+        with record_queries() as recorder:
+            again = resolve_oauth_user_cached('github', 'gh-1', 'cached@example.com', 'cached')
+        self.assertEqual((again.id, again.email, recorder.count), (self.user_id, 'cached@example.com', 0))
+
+    def test_deleting_a_user_invalidates_its_provider_id(self):
+        resolve_oauth_user_cached('github', 'gh-1', 'cached@example.com', 'cached')
+        db.session.delete(db.session.get(User, self.user_id))
+        db.session.commit()
+        resolved = resolve_oauth_user_cached('github', 'gh-1', 'cached@example.com', 'cached')
+        db.session.commit()
+        # A stale hit would be a CachedUser, which has no outcome
+        self.assertEqual(getattr(resolved, 'outcome', None), 'created')
+
+    def test_link_over_a_provider_id_invalidates_the_old_one(self):
+        user_by_email('cached@example.com')
+        resolve_oauth_user_cached('github', 'gh-1', 'cached@example.com', 'cached')
+        # Another GitHub account with the same email takes over the link
+        linked = resolve_oauth_user_cached('github', 'gh-2', 'cached@example.com', 'cached')
+        self.assertEqual((linked.outcome, linked.replaced_id), ('linked', 'gh-1'))
+        self.assertEqual(len(get_user_cache().backend), 2) # Kept until the commit
+        db.session.commit()
+        self.assertEqual(len(get_user_cache().backend), 0)
+        # gh-1 no longer resolves to the account from the cache; it links again
+        self.assertEqual(getattr(resolve_oauth_user_cached('github', 'gh-1', 'cached@example.com', 'cached'),
+                                 'outcome', None), 'linked')
+
+    def test_rolled_back_link_keeps_entries(self):
+        resolve_oauth_user_cached('github', 'gh-1', 'cached@example.com', 'cached')
+        resolve_oauth_user_cached('github', 'gh-2', 'cached@example.com', 'cached')
+        db.session.rollback()
+        self.assertEqual(get_user_cache().stats.snapshot()['invalidations'], 0)
+
+    def test_refresh_reads_the_user_by_id(self):
+        refresh_token = self.login().get_json()['refresh_token']
+        response = self.client.post('/api/token/refresh', json={'refresh_token': refresh_token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_user_cache().stats.snapshot()['misses_id'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
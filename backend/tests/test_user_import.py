@@ -0,0 +1,115 @@
+import unittest
+import io
+import json
+import os
+import tempfile
+from backend.app import app, db, User
+from backend.hashing import check_password, hash_password
+from backend.user_import import import_users, read_csv, read_jsonl
+from backend.tests.test_config import TestConfig
+
+EXISTING_HASH = hash_password('existing-password', cost=4)
+
+CSV_INPUT = f'''email,username,password,password_hash,google_id,github_id
+One@Example.com,one,password123,,,
+two@example.com,,,{EXISTING_HASH},g-2,
+bad-email,,password123,,,
+three@example.com,,short,,,
+ONE@example.com,dupe,password123,,,
+taken@example.com,taken,password123,,,
+four@example.com,,,not-a-hash,,
+five@example.com,five,,,,55
+'''
+
+class UserImportTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(email='existing@example.com', username='taken'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def run_import(self, records, batch_size=3):
+        rejects = []
+        with db.engine.connect() as conn:
+            stats = import_users(records, conn, batch_size=batch_size,
+                                 hash_many=lambda passwords: [hash_password(p, cost=4) for p in passwords],
+                                 on_reject=lambda line, email, reason: rejects.append((line, reason)))
+        return stats, rejects
+
+    def test_csv_import(self):
+        stats, rejects = self.run_import(read_csv(io.StringIO(CSV_INPUT)))
+        self.assertEqual((stats.read, stats.imported, stats.hashed), (8, 3, 3))
+        self.assertEqual(rejects, [
+            (4, 'invalid email'), (5, 'password too short'), (6, 'email already registered'),
+            (7, 'username taken'), (8, 'unrecognized password hash'),
+        ])
+
+        one = User.query.filter_by(email='one@example.com').one()
+        self.assertTrue(check_password('password123', one.password_hash))
+        two = User.query.filter_by(email='two@example.com').one()
+        self.assertEqual((two.password_hash, two.google_id), (EXISTING_HASH, 'g-2'))
+        five = User.query.filter_by(email='five@example.com').one()
+        self.assertEqual((five.password_hash, five.github_id), (None, '55'))
+
+    def test_jsonl_duplicates_within_a_batch(self):
+        lines = '\n'.join([
+            json.dumps({'email': 'same@example.com', 'password': 'password123'}),
+            json.dumps({'email': 'Same@example.com', 'password': 'password456'}),
+            '{broken',
+            json.dumps({'email': 'user1@example.com', 'username': 'twin', 'password_hash': EXISTING_HASH}),
+            json.dumps({'email': 'user2@example.com', 'username': 'twin', 'password_hash': EXISTING_HASH}),
+        ])
+        stats, rejects = self.run_import(read_jsonl(io.StringIO(lines)), batch_size=100)
+        self.assertEqual(stats.imported, 2)
+        self.assertEqual([reason for _, reason in rejects][0], 'invalid JSON: Expecting property name enclosed in double quotes: line 1 column 2 (char 1)')
+        self.assertEqual(sorted(rejects[1:]), [(2, 'duplicate email in input'), (5, 'username taken')])
+
+    def test_values_too_long_for_the_columns_or_bcrypt(self):
+        lines = '\n'.join([
+            json.dumps({'email': 'a' * 250 + '@example.com', 'password': 'password123'}),
+            json.dumps({'email': 'long@example.com', 'password': 'p' * 100}),
+            json.dumps({'email': 'named@example.com', 'username': 'n' * 256, 'password': 'password123'}),
+            json.dumps({'email': 'fits@example.com', 'password': 'p' * 72}),
+        ])
+        stats, rejects = self.run_import(read_jsonl(io.StringIO(lines)))
+        self.assertEqual(rejects, [(1, 'email too long'), (2, 'password too long'), (3, 'username too long')])
+        self.assertEqual(stats.imported, 1)
+
+    def test_malformed_hashes_are_rejected(self):
+        malformed = [EXISTING_HASH[:-1], EXISTING_HASH.replace('$04$', '$xx$'), EXISTING_HASH.replace('$04$', '$99$'),
+                     '$2b$', '$argon2id$', '$argon2id$v=19$m=65536,t=3']
+        records = [(i, {'email': f'user{i}@example.com', 'password_hash': password_hash})
+                   for i, password_hash in enumerate(malformed, 1)]
+        stats, rejects = self.run_import(records)
+        self.assertEqual(rejects, [(i, 'unrecognized password hash') for i in range(1, len(malformed) + 1)])
+        self.assertEqual(stats.imported, 0)
+
+    def test_long_password_without_a_byte_limit(self):
+        records = [(1, {'email': 'long@example.com', 'password': 'p' * 100})]
+        with db.engine.connect() as conn:
+            stats = import_users(records, conn, hash_many=lambda passwords: ['hashed'] * len(passwords),
+                                 max_password_bytes=None)
+        self.assertEqual(stats.imported, 1)
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'users.csv')
+            rejects = os.path.join(tmp, 'rejects.jsonl')
+            with open(source, 'w') as f:
+                f.write(CSV_INPUT)
+            result = app.test_cli_runner().invoke(
+                args=['users', 'import', source, '--workers', '0', '--rejects', rejects])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn('8 read, 3 imported, 5 rejected, 3 hashed', result.output)
+            with open(rejects) as f:
+                self.assertEqual(json.loads(f.readline())['reason'], 'invalid email')
+
+if __name__ == '__main__':
+    unittest.main()
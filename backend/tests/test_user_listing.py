@@ -0,0 +1,116 @@
+import unittest
+import datetime
+import json
+from backend.app import app, db, User, create_access_token
+from backend.user_listing import list_users, decode_cursor, InvalidListing
+from backend.tests.test_config import TestConfig
+
+class UserListingTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config.from_object(TestConfig)
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+            # Server-default timestamps, so most rows share a created_at and order by id
+            admin = User(email='admin@example.com')
+            db.session.add(admin)
+            for i in range(7):
+                db.session.add(User(email=f'user{i}@example.com',
+                                    google_id=f'g{i}' if i % 2 == 0 else None,
+                                    github_id=f'h{i}' if i % 3 == 0 else None))
+            db.session.add(User(email='old@example.com', github_id='h-old',
+                                created_at=datetime.datetime(2020, 1, 1, 12, 0, 0, 500)))
+            db.session.commit()
+            app.config['ADMIN_USER_IDS'] = {admin.id}
+            self.admin_token = create_access_token(admin, 'session')
+            self.user_token = create_access_token(User.query.filter_by(email='user1@example.com').one(), 'session')
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def all_pages(self, **kwargs):
+        emails, after = [], None
+        while True:
+            users, after = list_users(after=after, **kwargs)
+            emails += [user['email'] for user in users]
+            if after is None:
+                return emails
+
+    def test_pages_cover_every_row_once_in_order(self):
+        with app.app_context():
+            emails = self.all_pages(limit=3)
+        self.assertEqual(emails, ['old@example.com', 'admin@example.com'] + [f'user{i}@example.com' for i in range(7)])
+
+    def test_provider_filter(self):
+        with app.app_context():
+            self.assertEqual(self.all_pages(provider='google', limit=2),
+                             ['user0@example.com', 'user2@example.com', 'user4@example.com', 'user6@example.com'])
+            self.assertEqual(self.all_pages(provider='github', limit=1),
+                             ['old@example.com', 'user0@example.com', 'user3@example.com', 'user6@example.com'])
+            with self.assertRaises(InvalidListing):
+                list_users(provider='myspace')
+            with self.assertRaises(InvalidListing):
+                decode_cursor('not-a-cursor')
+
+    def test_admin_endpoint(self):
+        headers = {'Authorization': f'Bearer {self.admin_token}'}
+        response = self.client.get('/api/admin/users?limit=4', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(len(data['users']), 4)
+        self.assertNotIn('password_hash', data['users'][0])
+
+        response = self.client.get(f"/api/admin/users?limit=4&after={data['next_cursor']}", headers=headers)
+        self.assertEqual(response.get_json()['users'][0]['email'], 'user2@example.com')
+        self.assertEqual(self.client.get('/api/admin/users?after=bogus', headers=headers).status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/users?limit=0', headers=headers).status_code, 400)
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get('/api/admin/users').status_code, 401)
+        response = self.client.get('/api/admin/users', headers={'Authorization': f'Bearer {self.user_token}'})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/api/admin/users/export', headers={'Authorization': f'Bearer {self.user_token}'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_admin_email_alone_is_not_enough(self):
+        # Anyone may register an address without proving they own it
+        body = {'email': 'boss@example.com', 'password': 'password123'}
+        self.client.post('/api/register', json=body)
+        token = self.client.post('/api/login', json=body).get_json()['access_token']
+        with app.app_context():
+            db.session.delete(User.query.filter_by(email='admin@example.com').one())
+            db.session.commit()
+        # Not even the email of a former admin whose id is still listed
+        body = {'email': 'admin@example.com', 'password': 'password123'}
+        self.client.post('/api/register', json=body)
+        squatter = self.client.post('/api/login', json=body).get_json()['access_token']
+        for token in (token, squatter):
+            response = self.client.get('/api/admin/users', headers={'Authorization': f'Bearer {token}'})
+            self.assertEqual(response.status_code, 403)
+
+    def test_export_streams_ndjson(self):
+        headers = {'Authorization': f'Bearer {self.admin_token}'}
+        response = self.client.get('/api/admin/users/export?provider=github', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([user['email'] for user in lines],
+                         ['old@example.com', 'user0@example.com', 'user3@example.com', 'user6@example.com'])
+        self.assertEqual(self.client.get('/api/admin/users/export?provider=x', headers=headers).status_code, 400)
+
+    def test_cli(self):
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['users', 'list', '--limit', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('old@example.com', result.output)
+        self.assertIn('Next page: --after ', result.output)
+
+        result = runner.invoke(args=['users', 'export', '--provider', 'google'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(len(result.output.splitlines()), 4)
+
+if __name__ == '__main__':
+    unittest.main()
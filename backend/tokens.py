@@ -0,0 +1,268 @@
+import datetime
+import functools
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from flask import current_app, g, jsonify, request
+
+from backend.signing_keys import get_key_set
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified token claims, keyed by the token's digest.
+
+    Verifying a token means a signature check plus JSON decoding and claim
+    checks; a hit here is a dict lookup. Entries are only served until the
+    token's own ``exp``, so caching never extends a token's lifetime.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, token, claims):
+        expires_at = claims.get('exp')
+        if expires_at is None:
+            return # Only cache tokens that expire
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RevocationList:
+    """In-process denylist of revoked token IDs (``jti``/``sid`` claims).
+
+    Checking a token is a set lookup, so revocation adds no per-request
+    database round trip. Revocations made by this process are visible
+    immediately; those made by other workers or nodes are pulled in by
+    ``loader(since)`` at most every ``sync_interval`` seconds, which returns
+    ``(revoked_at, token_id, expires_at)`` rows revoked at or after the
+    ``since`` datetime (every row when it is None).
+
+    ``since`` trails the latest ``revoked_at`` seen by ``overlap`` seconds,
+    so each sync reads the last stretch again. A row can become visible after
+    later ones: its id and timestamp are taken at INSERT but it shows up at
+    COMMIT. Reading only past the newest row would skip it for good. Rows read
+    twice just overwrite their entry.
+
+    Entries are dropped once the tokens they cover would have expired anyway.
+    If the loader fails (e.g. the database is down), the error is logged and
+    the last synced set is kept until the next sync.
+    """
+
+    def __init__(self, loader=None, sync_interval=5, overlap=60, logger=None):
+        self.loader = loader
+        self.sync_interval = sync_interval
+        self.overlap = datetime.timedelta(seconds=overlap)
+        self.logger = logger or logging.getLogger(__name__)
+        self._revoked = {}
+        self._latest = None # Newest revoked_at synced
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def add(self, token_id, expires_at):
+        with self._lock:
+            self._revoked[token_id] = expires_at
+
+    def is_revoked(self, *token_ids):
+        self.maybe_sync()
+        return any(token_id in self._revoked for token_id in token_ids if token_id)
+
+    def maybe_sync(self):
+        now = time.monotonic()
+        if self.loader is None or (self._synced_at is not None and now - self._synced_at < self.sync_interval):
+            return
+        with self._lock:
+            if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+                return # Another thread synced while we waited
+            self._synced_at = now
+            since = self._latest - self.overlap if self._latest is not None else None
+            try:
+                rows = list(self.loader(since))
+            except Exception as e:
+                self.logger.error(f"Syncing revoked tokens failed: {e}")
+                return
+            for revoked_at, token_id, expires_at in rows:
+                self._revoked[token_id] = max(expires_at, self._revoked.get(token_id, expires_at))
+                if self._latest is None or revoked_at > self._latest:
+                    self._latest = revoked_at
+            wall_now = time.time()
+            for token_id in [t for t, exp in self._revoked.items() if exp <= wall_now]:
+                del self._revoked[token_id]
+
+    def reset(self):
+        with self._lock:
+            self._revoked.clear()
+            self._latest = None
+            self._synced_at = None
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+def get_token_cache():
+    """Return the verified-token cache for the current app, creating it on first use."""
+    cache = current_app.extensions.get('token_cache')
+    if cache is None:
+        cache = VerifiedTokenCache(maxsize=current_app.config.get('TOKEN_CACHE_SIZE', 10000))
+        current_app.extensions['token_cache'] = cache
+    return cache
+
+
+def sign_access_token(payload):
+    """Sign with the active key from backend.signing_keys, or HS256 with SECRET_KEY if there is none."""
+    active = get_key_set().active
+    if active is None:
+        return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+    return jwt.encode(payload, active.private_key, algorithm=active.algorithm, headers={'kid': active.kid})
+
+
+class TokenVerifier:
+    """What verifying a token needs, looked up once: the cache, the keys and the revocation list.
+
+    ``verify_access_token`` makes one per token, ``introspect_tokens`` one per batch.
+    """
+
+    OPTIONS = {'require': ['exp']}
+
+    def __init__(self, cache, key_set, secret, accept_hs256=False, revocations=None):
+        self.cache = cache
+        self.key_set = key_set
+        self.secret = secret
+        self.accept_hs256 = accept_hs256
+        self.revocations = revocations
+
+    @classmethod
+    def for_app(cls):
+        config = current_app.config
+        return cls(get_token_cache(), get_key_set(), config['SECRET_KEY'], config.get('JWT_ACCEPT_HS256', False),
+                   current_app.extensions.get('revocation_list'))
+
+    def decode(self, token):
+        """Check the signature and expiry; the key (and with it the algorithm) is picked by ``kid``."""
+        if not self.key_set:
+            return jwt.decode(token, self.secret, algorithms=['HS256'], options=self.OPTIONS)
+        header = jwt.get_unverified_header(token)
+        key = self.key_set.get(header.get('kid'))
+        if key is not None:
+            return jwt.decode(token, key.public_key, algorithms=[key.algorithm], options=self.OPTIONS)
+        # Tokens signed before the switch to asymmetric keys, while JWT_ACCEPT_HS256 allows them
+        if header.get('alg') == 'HS256' and self.accept_hs256:
+            return jwt.decode(token, self.secret, algorithms=['HS256'], options=self.OPTIONS)
+        raise jwt.InvalidTokenError('Unknown signing key')
+
+    def verify(self, token):
+        """Return the claims of a valid access token, raising ``jwt.InvalidTokenError`` otherwise."""
+        claims = self.cache.get(token)
+        if claims is None:
+            claims = self.decode(token)
+            self.cache.put(token, claims)
+        # Checked on cache hits too: a token can be revoked after it was cached
+        if self.revocations is not None and self.revocations.is_revoked(claims.get('jti'), claims.get('sid')):
+            raise jwt.InvalidTokenError('Token has been revoked')
+        return claims
+
+
+def verify_access_token(token):
+    """Return the claims of a valid access token, raising ``jwt.InvalidTokenError`` otherwise."""
+    return TokenVerifier.for_app().verify(token)
+
+
+def introspect_tokens(tokens):
+    """Return ``{'active': True, **claims}`` or ``{'active': False}`` for each token, in order.
+
+    Shares the verification cache with ``require_auth``, and verifies a token
+    that appears several times in the batch only once.
+    """
+    verifier = TokenVerifier.for_app()
+    inactive = {'active': False}
+    results = {}
+    for token in tokens:
+        if isinstance(token, str) and token not in results:
+            try:
+                results[token] = {'active': True, **verifier.verify(token)}
+            except jwt.InvalidTokenError:
+                results[token] = inactive
+    return [results[token] if isinstance(token, str) else inactive for token in tokens]
+
+
+def require_introspection_client(view):
+    """Require ``Authorization: Bearer <secret>`` with one of ``INTROSPECTION_SECRETS``."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, presented = request.headers.get('Authorization', '').partition(' ')
+        secrets = current_app.config.get('INTROSPECTION_SECRETS') or ()
+        if scheme.lower() != 'bearer' or not any(
+                hmac.compare_digest(presented.strip().encode('utf-8'), secret.encode('utf-8')) for secret in secrets):
+            return jsonify({'message': 'Introspection client credentials are missing or invalid'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def require_auth(view):
+    """Require a valid ``Authorization: Bearer <token>`` header.
+
+    The verified claims are available to the view as ``g.token_claims``.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        auth_header = request.headers.get('Authorization', '')
+        scheme, _, token = auth_header.partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return jsonify({'message': 'Authorization token is missing'}), 401
+        try:
+            g.token_claims = verify_access_token(token.strip())
+        except jwt.ExpiredSignatureError:
+            return jsonify({'message': 'Token has expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'message': 'Invalid token'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def require_admin(view):
+    """Like ``require_auth``, and the token's user must be in ``ADMIN_USER_IDS``."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.token_claims.get('user_id') not in current_app.config['ADMIN_USER_IDS']:
+            return jsonify({'message': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return require_auth(wrapper)
@@ -0,0 +1,325 @@
+"""Read-through cache of the user rows that sign-ins look up.
+
+Logins look users up by email, OAuth callbacks by provider ID and token
+refreshes by id. Each lookup goes through ``UserCache.get``, which answers
+from the cache or runs the query and keeps the row for
+``USER_CACHE_TTL_SECONDS``. Only ``CachedUser(id, email, password_hash)`` is
+kept, which is what those endpoints read. Lookups that find no user are not
+cached, so a new account never has a cached entry to go stale.
+
+Entries are dropped when the user changes. The session events below collect
+the old id, email and provider IDs of every User that is updated or deleted
+through the ORM. A bulk ``query(User).update()/.delete()`` marks the
+whole cache stale. The entries go once the transaction commits; a rollback
+drops nothing. OAuth sign-ins that link or create an account with the raw
+SQL in backend/services.py bypass those events, so they queue the account's
+id, email and provider keys themselves, including the provider ID a link
+overwrote: its entry would otherwise keep resolving to this user. The async
+callbacks (backend/asgi.py) commit on their own session and drop the same
+keys right after their commit.
+
+USER_CACHE_BACKEND is 'memory' (a bounded LRU per process) or 'redis'
+(USER_CACHE_REDIS_URL, shared by every process, so invalidations reach them
+all). With the memory backend, other processes keep serving a changed
+user's old row until the TTL passes. Note that with the redis backend,
+password hashes are stored in Redis. Hits and misses per lookup are counted
+in ``stats`` and in the ``user_cache_lookups_total`` metric.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+
+from backend.metrics import count_user_cache_lookup
+from backend.models import User, db, normalize_email
+from backend.services import PROVIDER_COLUMNS, resolve_oauth_user
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CachedUser = namedtuple('CachedUser', ['id', 'email', 'password_hash'])
+
+
+def key_columns():
+    """Lookup kind -> users column it matches; every OAuth provider is a kind."""
+    return {'id': 'id', 'email': 'email', **PROVIDER_COLUMNS}
+
+
+def cache_key(kind, value):
+    return f'{kind}:{value}'
+
+
+class MemoryBackend:
+    """Bounded LRU in a dict; only this process sees it."""
+
+    def __init__(self, maxsize=10000, clock=time.time):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user, ttl):
+        with self._lock:
+            self._entries[key] = (user, self.clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Entries in Redis (or anything speaking its commands), shared across hosts."""
+
+    def __init__(self, client, prefix='usercache:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return CachedUser(*json.loads(value)) if value is not None else None
+
+    def set(self, key, user, ttl):
+        self.client.set(self.prefix + key, json.dumps(list(user)), ex=max(1, int(ttl + 0.999)))
+
+    def delete(self, keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class UserCacheStats:
+    """Hits and misses per lookup kind, plus entries filled and invalidated."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0, 'fills': 0, 'invalidations': 0}
+
+    def record(self, name, kind=None):
+        with self._lock:
+            self._counts[name] += 1
+            if kind is not None:
+                key = f'{name}_{kind}'
+                self._counts[key] = self._counts.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class UserCache:
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = UserCacheStats()
+        # Bumped by every invalidation. A fill whose query started before an
+        # invalidation may hold the old row, so it is not stored.
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, kind, value):
+        """Return ``(cached user or None, generation)``; a miss is filled with ``put(..., generation)``."""
+        generation = self.generation
+        user = self.backend.get(cache_key(kind, value))
+        result = 'hits' if user is not None else 'misses'
+        self.stats.record(result, kind)
+        count_user_cache_lookup(kind, result[:-1])
+        return user, generation
+
+    def get(self, kind, value, loader):
+        """Return the cached user for ``kind=value``, else ``loader()``'s, caching it if found."""
+        user, generation = self.lookup(kind, value)
+        if user is None:
+            user = loader()
+            if user is not None:
+                self.put(kind, value, user, generation)
+        return user
+
+    def put(self, kind, value, user, generation):
+        """Cache ``user`` unless the cache was invalidated since ``generation`` was read."""
+        with self._lock:
+            # Checked and stored under one lock, so an invalidation cannot land in between
+            if generation != self.generation:
+                return
+            self.backend.set(cache_key(kind, value), CachedUser(*user), self.ttl)
+        self.stats.record('fills')
+
+    def invalidate(self, keys):
+        with self._lock:
+            self.generation += 1
+        self.backend.delete(list(keys))
+        self.stats.record('invalidations')
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+        self.backend.clear()
+        self.stats.record('invalidations')
+
+
+def build_backend(config):
+    name = config['USER_CACHE_BACKEND']
+    if name == 'memory':
+        return MemoryBackend(maxsize=config['USER_CACHE_SIZE'])
+    if name == 'redis':
+        if redis is None:
+            raise RuntimeError("USER_CACHE_BACKEND='redis' needs the redis package")
+        return RedisBackend(redis.Redis.from_url(config['USER_CACHE_REDIS_URL']))
+    raise ValueError(f'Unknown USER_CACHE_BACKEND: {name}')
+
+
+def get_user_cache():
+    """Return the user cache for the current app, creating it on first use; None when disabled."""
+    if not current_app.config['USER_CACHE_ENABLED']:
+        return None
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = UserCache(build_backend(current_app.config), ttl=current_app.config['USER_CACHE_TTL_SECONDS'])
+        current_app.extensions['user_cache'] = cache
+    return cache
+
+
+def _cached_lookup(kind, value, loader):
+    cache = get_user_cache()
+    return cache.get(kind, value, loader) if cache is not None else loader()
+
+
+def _load_user(*criteria):
+    row = db.session.execute(select(User.id, User.email, User.password_hash).where(*criteria)).first()
+    return CachedUser(*row) if row else None
+
+
+def user_by_email(email):
+    email = normalize_email(email)
+    return _cached_lookup('email', email, lambda: _load_user(db.func.lower(User.email) == email))
+
+
+def user_by_id(user_id):
+    return _cached_lookup('id', user_id, lambda: _load_user(User.id == user_id))
+
+
+def resolve_oauth_user_cached(provider, provider_id, email, preferred_username):
+    """``resolve_oauth_user``, answered from the cache for returning users."""
+    cache = get_user_cache()
+    if cache is None:
+        return resolve_oauth_user(provider, provider_id, email, preferred_username)
+    user, generation = cache.lookup(provider, provider_id)
+    if user is not None:
+        return user
+    resolved = resolve_oauth_user(provider, provider_id, email, preferred_username)
+    if resolved.outcome == 'existing':
+        cache.put(provider, provider_id, (resolved.id, resolved.email, resolved.password_hash), generation)
+    else:
+        # Not committed yet: dropped by _after_commit, and cached on the next sign-in
+        db.session.info.setdefault('user_cache_stale', set()).update(
+            resolved_user_keys(provider, provider_id, resolved))
+    return resolved
+
+
+def resolved_user_keys(provider, provider_id, resolved):
+    """Cache keys a linked or created ``ResolvedUser`` may have stale entries under."""
+    keys = {cache_key('id', resolved.id), cache_key('email', normalize_email(resolved.email)),
+            cache_key(provider, provider_id)}
+    if resolved.replaced_id is not None:
+        keys.add(cache_key(provider, resolved.replaced_id))
+    return keys
+
+
+def invalidate_resolved_user(provider, provider_id, resolved):
+    """Drop the entries a committed OAuth link or create made stale; for sessions other than db.session."""
+    cache = get_user_cache()
+    if cache is not None and resolved.outcome != 'existing':
+        cache.invalidate(resolved_user_keys(provider, provider_id, resolved))
+
+
+# --- Invalidation ---
+def _stale_keys(user):
+    """Cache keys under which ``user`` may be cached, or None if they cannot be told."""
+    state = inspect(user)
+    columns = {kind: column for kind, column in key_columns().items() if column in state.attrs}
+    unloaded = state.unloaded & set(columns.values())
+    if unloaded:
+        state.session.refresh(user, attribute_names=list(unloaded))
+    keys = {cache_key('id', state.identity[0])}
+    for kind, column in columns.items():
+        history = state.attrs[column].history
+        if history.added and not history.deleted:
+            return None # Set without its old value ever being loaded
+        for value in (*history.unchanged, *history.deleted):
+            if value is not None:
+                keys.add(cache_key(kind, normalize_email(value) if kind == 'email' else value))
+    return keys
+
+
+def _before_flush(session, flush_context, instances):
+    # New users have no entries yet; misses are not cached
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, User) and inspect(obj).persistent:
+            keys = _stale_keys(obj)
+            if keys is None:
+                session.info['user_cache_clear'] = True
+            else:
+                session.info.setdefault('user_cache_stale', set()).update(keys)
+
+
+def _do_orm_execute(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is inspect(User):
+        orm_execute_state.session.info['user_cache_clear'] = True
+
+
+def _after_commit(session):
+    stale = session.info.pop('user_cache_stale', None)
+    clear = session.info.pop('user_cache_clear', False)
+    if not (stale or clear) or not has_app_context():
+        return
+    cache = get_user_cache()
+    if cache is None:
+        return
+    if clear:
+        cache.clear()
+    else:
+        cache.invalidate(stale)
+
+
+def _after_rollback(session):
+    session.info.pop('user_cache_stale', None)
+    session.info.pop('user_cache_clear', None)
+
+
+def init_user_cache(app, db):
+    """Invalidate cached users when ``db.session`` commits changes to them."""
+    event.listen(db.session, 'before_flush', _before_flush)
+    event.listen(db.session, 'do_orm_execute', _do_orm_execute)
+    event.listen(db.session, 'after_commit', _after_commit)
+    event.listen(db.session, 'after_rollback', _after_rollback)
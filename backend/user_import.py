@@ -0,0 +1,288 @@
+"""Bulk user import: ``flask users import accounts.csv``.
+
+Records are streamed from CSV or JSON Lines and processed ``--batch-size``
+at a time, so memory stays flat however large the file is. For each batch:
+
+1. Records are validated. Existing bcrypt/argon2id hashes are kept as-is;
+   plaintext passwords are hashed across a process pool.
+2. The batch is loaded into a temporary staging table, through COPY on
+   Postgres and a batched INSERT elsewhere.
+3. Staging rows that would collide with an existing account, or with an
+   earlier record of the same input, are marked rejected. The rest are
+   merged into users with one INSERT ... SELECT, and the batch is committed.
+
+Rejected records are counted by reason and can be written to ``--rejects``
+as JSON Lines.
+"""
+import csv
+import io
+import itertools
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+from backend import hashing
+from backend.models import db, is_valid_email, normalize_email
+
+users_cli = AppGroup('users', help='User account management.')
+
+FIELDS = ('email', 'username', 'password', 'password_hash', 'google_id', 'github_id')
+STAGED_COLUMNS = ('line_no', 'email', 'username', 'password_hash', 'google_id', 'github_id')
+MIN_PASSWORD_LENGTH = 8
+# The staging and users columns are VARCHAR(255); a longer value would fail the whole COPY
+MAX_COLUMN_LENGTH = 255
+
+_CREATE_STAGING_SQL = [
+    text('''
+    CREATE TEMPORARY TABLE users_import (
+        line_no INTEGER PRIMARY KEY,
+        email VARCHAR(255) NOT NULL,
+        username VARCHAR(255),
+        password_hash VARCHAR(255),
+        google_id VARCHAR(255),
+        github_id VARCHAR(255),
+        reason VARCHAR(64)
+    )'''),
+    text('CREATE INDEX users_import_email ON users_import (email)'),
+    text('CREATE INDEX users_import_username ON users_import (username)'),
+]
+_INSERT_STAGING_SQL = text(
+    'INSERT INTO users_import (line_no, email, username, password_hash, google_id, github_id) '
+    'VALUES (:line_no, :email, :username, :password_hash, :google_id, :github_id)'
+)
+_COPY_STAGING_SQL = f"COPY users_import ({', '.join(STAGED_COLUMNS)}) FROM STDIN"
+
+# First matching reason wins; earlier records of the input win over later ones
+_MARK_REJECTED_SQL = text('''
+UPDATE users_import SET reason = CASE
+    WHEN EXISTS (SELECT 1 FROM users_import d
+                 WHERE d.email = users_import.email AND d.line_no < users_import.line_no)
+        THEN 'duplicate email in input'
+    WHEN EXISTS (SELECT 1 FROM users u WHERE lower(u.email) = users_import.email)
+        THEN 'email already registered'
+    WHEN username IS NOT NULL AND (
+            EXISTS (SELECT 1 FROM users_import d
+                    WHERE d.username = users_import.username AND d.line_no < users_import.line_no)
+            OR EXISTS (SELECT 1 FROM users u WHERE u.username = users_import.username))
+        THEN 'username taken'
+    WHEN google_id IS NOT NULL AND EXISTS (SELECT 1 FROM users u WHERE u.google_id = users_import.google_id)
+        THEN 'google_id already linked'
+    WHEN github_id IS NOT NULL AND EXISTS (SELECT 1 FROM users u WHERE u.github_id = users_import.github_id)
+        THEN 'github_id already linked'
+END
+''')
+_REJECTED_SQL = text('SELECT line_no, email, reason FROM users_import WHERE reason IS NOT NULL ORDER BY line_no')
+# ON CONFLICT covers accounts created concurrently since the rows were marked
+_MERGE_SQL = text('''
+INSERT INTO users (email, username, password_hash, google_id, github_id)
+SELECT email, username, password_hash, google_id, github_id FROM users_import
+WHERE reason IS NULL
+ON CONFLICT DO NOTHING
+RETURNING email
+''')
+_UNMERGED_SQL = text('SELECT line_no, email FROM users_import WHERE reason IS NULL ORDER BY line_no')
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.hashed = 0
+        self.rejected = Counter()
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f'{self.read} read, {self.imported} imported, {sum(self.rejected.values())} rejected, '
+                f'{self.hashed} hashed in {self.elapsed:.1f}s ({self.rate:.0f} rows/s)')
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def read_csv(stream):
+    """Yield ``(line_no, record)`` from CSV with a header row."""
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_jsonl(stream):
+    """Yield ``(line_no, record)`` from JSON Lines; undecodable lines yield an error string."""
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            record = f'invalid JSON: {e}'
+        yield line_no, record if isinstance(record, (dict, str)) else 'not a JSON object'
+
+
+def validate(line_no, record, max_password_bytes=None):
+    """Return ``(row, password)`` for a usable record or ``(None, reason)``.
+
+    ``max_password_bytes`` is the hasher's limit on a plaintext password
+    (72 for bcrypt, which ignores the rest), or None.
+    """
+    if isinstance(record, str):
+        return None, record
+    values = {field: _clean(record.get(field)) for field in FIELDS}
+    if not is_valid_email(values['email']):
+        return None, 'invalid email'
+    if len(values['email']) > MAX_COLUMN_LENGTH:
+        return None, 'email too long'
+    if values['username'] is not None and len(values['username']) > MAX_COLUMN_LENGTH:
+        return None, 'username too long'
+    password, password_hash = values.pop('password'), values['password_hash']
+    if password_hash is not None:
+        if hashing.identify_hasher(password_hash) is None:
+            return None, 'unrecognized password hash'
+        password = None # An existing hash wins over a plaintext password
+    elif password is not None and len(password) < MIN_PASSWORD_LENGTH:
+        return None, 'password too short'
+    elif (password is not None and max_password_bytes is not None
+          and len(password.encode('utf-8')) > max_password_bytes):
+        return None, 'password too long'
+    values['email'] = normalize_email(values['email'])
+    values['line_no'] = line_no
+    return values, password
+
+
+def copy_rows(conn, rows):
+    """Load rows into the staging table, with COPY where the driver supports it."""
+    driver = conn.dialect.driver
+    if conn.dialect.name != 'postgresql' or driver not in ('psycopg', 'psycopg2'):
+        conn.execute(_INSERT_STAGING_SQL, rows)
+        return
+    raw = conn.connection.driver_connection
+    values = ([row[column] for column in STAGED_COLUMNS] for row in rows)
+    with raw.cursor() as cursor:
+        if driver == 'psycopg':
+            with cursor.copy(_COPY_STAGING_SQL) as copy:
+                for row in values:
+                    copy.write_row(row)
+        else:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(values) # None -> unquoted empty -> NULL
+            buffer.seek(0)
+            cursor.copy_expert(f'{_COPY_STAGING_SQL} WITH (FORMAT csv)', buffer)
+
+
+def import_batch(conn, batch, hash_many, stats, on_reject, max_password_bytes=None):
+    staged, passwords = [], []
+    for line_no, record in batch:
+        stats.read += 1
+        row, password_or_reason = validate(line_no, record, max_password_bytes)
+        if row is None:
+            stats.rejected[password_or_reason] += 1
+            on_reject(line_no, record.get('email') if isinstance(record, dict) else None, password_or_reason)
+            continue
+        staged.append(row)
+        passwords.append(password_or_reason)
+
+    to_hash = [i for i, password in enumerate(passwords) if password is not None]
+    for i, password_hash in zip(to_hash, hash_many([passwords[i] for i in to_hash])):
+        staged[i]['password_hash'] = password_hash
+    stats.hashed += len(to_hash)
+    if not staged:
+        return
+
+    conn.execute(text('DELETE FROM users_import'))
+    copy_rows(conn, staged)
+    conn.execute(_MARK_REJECTED_SQL)
+    for line_no, email, reason in conn.execute(_REJECTED_SQL):
+        stats.rejected[reason] += 1
+        on_reject(line_no, email, reason)
+    merged = {email for (email,) in conn.execute(_MERGE_SQL)}
+    stats.imported += len(merged)
+    for line_no, email in conn.execute(_UNMERGED_SQL):
+        if email not in merged:
+            stats.rejected['conflict'] += 1
+            on_reject(line_no, email, 'conflict')
+    conn.commit()
+
+
+def import_users(records, conn, batch_size=5000, hash_many=None, on_reject=None, on_batch=None,
+                 max_password_bytes=hashing.BcryptHasher.max_password_bytes):
+    """Import ``(line_no, record)`` pairs over ``conn``; returns ``ImportStats``.
+
+    The default ``hash_many`` and ``max_password_bytes`` are bcrypt's.
+    """
+    hash_many = hash_many or (lambda passwords: [hashing.hash_password(p) for p in passwords])
+    on_reject = on_reject or (lambda line_no, email, reason: None)
+    stats = ImportStats()
+    for statement in _CREATE_STAGING_SQL:
+        conn.execute(statement)
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            break
+        import_batch(conn, batch, hash_many, stats, on_reject, max_password_bytes)
+        if on_batch is not None:
+            on_batch(stats)
+    conn.execute(text('DROP TABLE users_import'))
+    conn.commit()
+    return stats
+
+
+@users_cli.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Input format (default: from the file extension).')
+@click.option('--batch-size', type=int, default=5000, show_default=True, help='Records per COPY and commit.')
+@click.option('--workers', type=int, default=None, help='Hashing processes (default: cores, 0 hashes inline).')
+@click.option('--rejects', type=click.File('w', encoding='utf-8'), default=None,
+              help='Write rejected records here as JSON Lines.')
+def import_command(source, fmt, batch_size, workers, rejects):
+    """Import users from CSV or JSON Lines (email, username, password or password_hash, google_id, github_id)."""
+    fmt = fmt or ('jsonl' if source.name.endswith(('.jsonl', '.ndjson')) else 'csv')
+    records = read_jsonl(source) if fmt == 'jsonl' else read_csv(source)
+
+    scheme = current_app.config['PASSWORD_HASHER']
+    cost = current_app.config['PASSWORD_HASH_COST']
+    workers = os.cpu_count() if workers is None else workers
+    pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+
+    def hash_many(passwords):
+        if pool is None:
+            return [hashing.hash_password(p, scheme, cost) for p in passwords]
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(pool.map(hashing.hash_password, passwords, itertools.repeat(scheme),
+                             itertools.repeat(cost), chunksize=chunksize))
+
+    def on_reject(line_no, email, reason):
+        if rejects is not None:
+            rejects.write(json.dumps({'line': line_no, 'email': email, 'reason': reason}) + '\n')
+
+    try:
+        with db.engine.connect() as conn:
+            stats = import_users(records, conn, batch_size, hash_many, on_reject,
+                                 on_batch=lambda stats: click.echo(stats.summary(), err=True),
+                                 max_password_bytes=hashing.HASHERS[scheme].max_password_bytes)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    click.echo(stats.summary())
+    for reason, count in stats.rejected.most_common():
+        click.echo(f'  rejected {count}: {reason}')
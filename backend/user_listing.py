@@ -0,0 +1,162 @@
+"""Admin listing and export of user accounts.
+
+Pages are keyset-paginated on ``(created_at, id)``: each page ends with an
+opaque cursor, and the next page starts strictly after that position. Every
+page is therefore one index range scan, however deep the client has paged.
+OFFSET would scan and discard every earlier row. Filtering by provider
+walks a partial index holding only the linked accounts (see the
+``ix_users_*created_at_id`` indexes in backend/models.py).
+
+The export walks the same order on a server-side cursor and yields NDJSON
+in chunks of ``yield_per`` rows, so memory stays flat at any table size.
+
+    GET /api/admin/users?provider=github&limit=100&after=<cursor>
+    GET /api/admin/users/export?provider=google
+    flask users list --provider github
+    flask users export -o users.ndjson
+"""
+import base64
+import datetime
+import json
+
+import click
+from flask import Response, jsonify, request, stream_with_context
+from sqlalchemy import select, tuple_
+
+from backend.models import db, User
+from backend.tokens import require_admin
+from backend.user_import import users_cli
+
+# Never password_hash
+LISTED_COLUMNS = (User.id, User.email, User.username, User.google_id, User.github_id,
+                  User.created_at, User.updated_at)
+PROVIDER_COLUMNS = {'google': User.google_id, 'github': User.github_id}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK_ROWS = 1000
+
+
+class InvalidListing(ValueError):
+    """A bad cursor, provider or page size."""
+
+
+def encode_cursor(created_at, user_id):
+    raw = json.dumps([created_at.isoformat(), user_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, user_id = json.loads(raw)
+        return datetime.datetime.fromisoformat(created_at), int(user_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidListing('Invalid cursor') from e
+
+
+def _created_at_param(value):
+    # SQLite compares timestamps as text, and CURRENT_TIMESTAMP defaults are
+    # stored without the fractional part the datetime bind would add
+    if db.engine.dialect.name == 'sqlite' and not value.microsecond:
+        return db.literal(value.strftime('%Y-%m-%d %H:%M:%S'))
+    return value
+
+
+def users_query(provider=None, after=None):
+    """SELECT of the listed columns in keyset order, optionally after a cursor."""
+    query = select(*LISTED_COLUMNS).order_by(User.created_at, User.id)
+    if provider is not None:
+        if provider not in PROVIDER_COLUMNS:
+            raise InvalidListing(f'Unknown provider: {provider}')
+        query = query.where(PROVIDER_COLUMNS[provider].isnot(None))
+    if after is not None:
+        created_at, user_id = decode_cursor(after)
+        query = query.where(tuple_(User.created_at, User.id) > tuple_(_created_at_param(created_at), user_id))
+    return query
+
+
+def serialize(row):
+    user = dict(row._mapping)
+    for key in ('created_at', 'updated_at'):
+        if user[key] is not None:
+            user[key] = user[key].isoformat()
+    return user
+
+
+def list_users(provider=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """Return one page as ``(users, next_cursor)``; ``next_cursor`` is None on the last page."""
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidListing(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    # One extra row tells whether another page follows
+    rows = db.session.execute(users_query(provider, after).limit(limit + 1)).all()
+    next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    return [serialize(row) for row in rows[:limit]], next_cursor
+
+
+def iter_ndjson(provider=None, yield_per=EXPORT_CHUNK_ROWS):
+    """Yield the export as NDJSON text, ``yield_per`` rows per chunk, from a server-side cursor."""
+    query = users_query(provider)
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=yield_per).execute(query)
+        for rows in result.partitions():
+            yield ''.join(json.dumps(serialize(row)) + '\n' for row in rows)
+
+
+def _invalid(error):
+    return jsonify({'message': str(error)}), 400
+
+
+@require_admin
+def admin_list_users():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        users, next_cursor = list_users(request.args.get('provider'), request.args.get('after'), limit)
+    except ValueError as e: # InvalidListing, or a non-numeric limit
+        return _invalid(e)
+    return jsonify({'users': users, 'next_cursor': next_cursor}), 200
+
+
+@require_admin
+def admin_export_users():
+    provider = request.args.get('provider')
+    try:
+        users_query(provider) # Reject a bad provider before the 200 goes out
+    except InvalidListing as e:
+        return _invalid(e)
+    return Response(stream_with_context(iter_ndjson(provider)), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=users.ndjson'})
+
+
+def register_admin_routes(app):
+    app.add_url_rule('/api/admin/users', view_func=admin_list_users, methods=['GET'])
+    app.add_url_rule('/api/admin/users/export', view_func=admin_export_users, methods=['GET'])
+
+
+_provider_option = click.option('--provider', type=click.Choice(sorted(PROVIDER_COLUMNS)), default=None,
+                                help='Only accounts linked to this provider.')
+
+
+@users_cli.command('list')
+@_provider_option
+@click.option('--limit', type=click.IntRange(1, MAX_PAGE_SIZE), default=DEFAULT_PAGE_SIZE, show_default=True)
+@click.option('--after', default=None, help='Cursor printed at the end of the previous page.')
+def list_command(provider, limit, after):
+    """Print one page of users."""
+    try:
+        users, next_cursor = list_users(provider, after, limit)
+    except InvalidListing as e:
+        raise click.BadParameter(str(e), param_hint='--after')
+    for user in users:
+        click.echo(f"{user['id']:>8}  {user['created_at'] or '-':<26}  {user['email']}")
+    if next_cursor:
+        click.echo(f'Next page: --after {next_cursor}')
+
+
+@users_cli.command('export')
+@_provider_option
+@click.option('-o', '--output', type=click.File('w', encoding='utf-8'), default='-',
+              help='NDJSON output file (default: stdout).')
+def export_command(provider, output):
+    """Export users as NDJSON."""
+    for chunk in iter_ndjson(provider):
+        output.write(chunk)
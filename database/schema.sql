@@ -5,10 +5,19 @@ CREATE TABLE users (
     password_hash VARCHAR(255),
     google_id VARCHAR(255) UNIQUE,
     github_id VARCHAR(255) UNIQUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Emails are stored lower-cased; this index serves case-insensitive lookups and
+-- rejects case variants of an existing address.
+CREATE UNIQUE INDEX ix_users_email_lower ON users (lower(email));
+
+-- Keyset pagination of the admin user listing, overall and per linked provider
+CREATE INDEX ix_users_created_at_id ON users (created_at, id);
+CREATE INDEX ix_users_google_created_at_id ON users (created_at, id) WHERE google_id IS NOT NULL;
+CREATE INDEX ix_users_github_created_at_id ON users (created_at, id) WHERE github_id IS NOT NULL;
+
 -- Trigger to update updated_at timestamp on row modification
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -22,3 +31,46 @@ CREATE TRIGGER update_users_updated_at
 BEFORE UPDATE ON users
 FOR EACH ROW
 EXECUTE FUNCTION update_updated_at_column();
+
+-- Rotating refresh tokens (stored as SHA-256 hashes). Every token rotated from one
+-- sign-in shares a family_id, which access tokens carry as their 'sid' claim.
+-- Existing databases: flask migrations token-tables.
+CREATE TABLE refresh_tokens (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token_hash VARCHAR(64) UNIQUE NOT NULL,
+    family_id VARCHAR(32) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX ix_refresh_tokens_family_id ON refresh_tokens (family_id);
+
+-- Append-only feed of revoked token IDs; each app process replays it into an
+-- in-memory denylist so checking a token never needs a query.
+CREATE TABLE revoked_tokens (
+    id SERIAL PRIMARY KEY,
+    token_id VARCHAR(64) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX ix_revoked_tokens_revoked_at ON revoked_tokens (revoked_at);
+
+-- Audit trail of logins, failed logins, registrations and OAuth sign-ins. Rows
+-- are buffered by each app process and inserted in batches, so a crash can lose
+-- the last second or so of events (see backend/auth_events.py).
+CREATE TABLE auth_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR(32) NOT NULL,
+    user_id INTEGER,
+    email VARCHAR(255),
+    provider VARCHAR(32),
+    ip_address VARCHAR(45),
+    user_agent VARCHAR(255),
+    created_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX ix_auth_events_user_id_created_at ON auth_events (user_id, created_at);
+CREATE INDEX ix_auth_events_created_at ON auth_events (created_at);
@@ -15,49 +15,91 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
     // Check for token on page load
-    const token = localStorage.getItem('accessToken');
+    let token = localStorage.getItem('accessToken');
 
     if (!token) {
         redirectToSignIn('Your session has expired or you are not logged in. Please sign in.');
         return; // Stop further execution
     }
 
-    // Attempt to parse the token (assuming it's a JWT)
-    try {
-        const payloadBase64 = token.split('.')[1];
-        if (!payloadBase64) {
-            throw new Error("Invalid token format: Missing payload.");
+    const clearSession = () => {
+        localStorage.removeItem('accessToken');
+        localStorage.removeItem('refreshToken');
+    };
+
+    // Password sign-ins keep the refresh token in localStorage; OAuth sign-ins
+    // keep it in an HttpOnly cookie, which a request without a body sends instead
+    const refreshTokenRequest = () => {
+        const refreshToken = localStorage.getItem('refreshToken');
+        if (!refreshToken) {
+            return { method: 'POST', credentials: 'same-origin' };
         }
-        const decodedPayload = JSON.parse(atob(payloadBase64));
+        return {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken }),
+        };
+    };
 
-        if (decodedPayload && decodedPayload.exp && decodedPayload.exp * 1000 < Date.now()) {
-            localStorage.removeItem('accessToken');
-            redirectToSignIn('Your session has expired. Please sign in again.');
-            return;
+    // Access tokens are short-lived; trade the refresh token for a new pair
+    const refreshAccessToken = async () => {
+        const response = await fetch('/api/token/refresh', refreshTokenRequest());
+        if (!response.ok) {
+            return false;
         }
+        const data = await response.json();
+        localStorage.setItem('accessToken', data.access_token);
+        if (data.refresh_token) { // Otherwise the cookie was rotated
+            localStorage.setItem('refreshToken', data.refresh_token);
+        }
+        token = data.access_token;
+        return true;
+    };
+
+    // Ask the backend to verify the token and return the user it belongs to
+    const loadUserInfo = async () => {
+        try {
+            const fetchMe = () => fetch('/api/me', {
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+            let response = await fetchMe();
+            if (response.status === 401 && await refreshAccessToken()) {
+                response = await fetchMe();
+            }
 
-        // Display user info if available in token
-        if (userInfoDiv && userIdSpan && userEmailSpan) {
-            if (decodedPayload.user_id && decodedPayload.email) {
-                userIdSpan.textContent = decodedPayload.user_id;
-                userEmailSpan.textContent = decodedPayload.email;
+            if (response.status === 401) {
+                const data = await response.json().catch(() => ({}));
+                clearSession();
+                redirectToSignIn(data.message === 'Token has expired'
+                    ? 'Your session has expired. Please sign in again.'
+                    : 'Invalid session token. Please sign in again.');
+                return;
+            }
+            if (!response.ok) {
+                throw new Error(`Unexpected response from /api/me: ${response.status}`);
+            }
+
+            const user = await response.json();
+            if (userInfoDiv && userIdSpan && userEmailSpan) {
+                userIdSpan.textContent = user.user_id;
+                userEmailSpan.textContent = user.email;
                 userInfoDiv.style.display = 'block';
-            } else {
-                console.warn("User ID or Email not found in token payload.");
+            }
+        } catch (error) {
+            console.error("Error loading user info:", error);
+            if (userInfoDiv) {
                 userInfoDiv.style.display = 'none';
             }
         }
-    } catch (error) {
-        console.error("Error decoding token or token is invalid:", error);
-        localStorage.removeItem('accessToken');
-        redirectToSignIn('Invalid session token. Please sign in again.');
-        return;
-    }
+    };
+    loadUserInfo();
 
     // Logout Button Handler
     if (logoutButton) {
-        logoutButton.addEventListener('click', () => {
-            localStorage.removeItem('accessToken');
+        logoutButton.addEventListener('click', async () => {
+            // Revoke the session server-side; log out locally even if this fails
+            await fetch('/api/token/revoke', refreshTokenRequest()).catch(() => {});
+            clearSession();
             // Optionally, display a "Logged out" message on the sign-in page
             // For now, just redirect. signin.js can check for a 'message' query param.
             redirectToSignIn('You have been logged out successfully.');
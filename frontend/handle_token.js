@@ -30,12 +30,16 @@ document.addEventListener('DOMContentLoaded', () => {
         displayStatusMessage('Processing your authentication...', 'loading'); // Initial loading message
 
         let token = null;
+        let nextPath = null;
         let error = null;
         let errorMessageForSignIn = 'An unknown authentication error occurred.'; // Default error
 
-        // Try to get token from URL hash (#token=...)
+        // Try to get the access token from URL hash (#token=...). The refresh token
+        // was set as an HttpOnly cookie that only /api/token/* receives.
         if (window.location.hash && window.location.hash.startsWith('#token=')) {
-            token = window.location.hash.substring(7); // Length of '#token='
+            const hashParams = new URLSearchParams(window.location.hash.substring(1));
+            token = hashParams.get('token');
+            nextPath = hashParams.get('next'); // The page sign-in started from, if any
         }
         // If not in hash, try to get from URL query parameter (?token=...)
         else {
@@ -67,16 +71,21 @@ document.addEventListener('DOMContentLoaded', () => {
             // Basic validation: JWTs have three parts separated by dots.
             if (token.split('.').length === 3) {
                 localStorage.setItem('accessToken', token);
+                // A refresh token left by an earlier password sign-in belongs to another session
+                localStorage.removeItem('refreshToken');
+                // Only paths on this site; the backend checks this too
+                const destination = nextPath && nextPath.startsWith('/') && !nextPath.startsWith('//') && !nextPath.startsWith('/\\')
+                    ? nextPath : 'dashboard.html';
                 displayStatusMessage('Authentication successful! Redirecting to your dashboard...', 'success');
 
                 // Clean the URL (remove token from address bar) and redirect
                 if (window.history.replaceState) {
                     const cleanURLBase = window.location.protocol + "//" + window.location.host + window.location.pathname.replace('handle_token.html', '');
                     window.history.replaceState({ path: cleanURLBase + 'dashboard.html' }, '', cleanURLBase + 'handle_token.html'); // Clean URL first
-                    window.location.href = 'dashboard.html'; // Then redirect
+                    window.location.href = destination; // Then redirect
                 } else {
                     // Fallback for older browsers
-                    window.location.href = 'dashboard.html';
+                    window.location.href = destination;
                 }
             } else {
                 console.error('Invalid token format received.');
@@ -56,6 +56,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
                 if (response.ok) {
                     localStorage.setItem('accessToken', data.access_token);
+                    localStorage.setItem('refreshToken', data.refresh_token);
                     displayMessage('Sign-in successful! Redirecting...', 'success');
                     setTimeout(() => { // Give time for message to be seen
                         window.location.href = 'dashboard.html';